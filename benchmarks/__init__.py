@@ -0,0 +1 @@
+"""Benchmark suite over synthetic WDI-shaped panels (see `benchmarks.suite`)."""
@@ -0,0 +1,277 @@
+"""
+Benchmark suite for the import, preprocessing and modelling hot paths.
+
+Each case runs against synthetic panels (see `benchmarks.synthetic`) at one or
+more scales. A case prepares its inputs untimed and returns the callable that is
+timed; it is repeated and the median and minimum wall times are recorded.
+
+Cases:
+    import_orm      `import_data` of the panel CSV into an empty database
+    import_bulk     `bulk_import_data` (columnar upsert) of the same CSV
+    interpolate     `fill_panel` over a raw WDI frame with blank cells
+    load_panel      `load_panel`: read_sql_query of the data table plus lag construction
+    run_experiment  one `run_experiment` (MLR + LGBM fit, one-step and recursive scores)
+    recursive       `RecursiveForecaster` over the test years with both fitted models
+
+Startup (independent of scale, reported as "startup/<name>"): wall time of a
+fresh interpreter running each of `STARTUP_COMMANDS` from the repository root.
+
+Usage:
+    python -m benchmarks.suite --output benchmarks/baseline.json
+    python -m benchmarks.suite --scales small medium --compare benchmarks/baseline.json
+"""
+import argparse
+import contextlib
+import dataclasses
+import datetime
+import io
+import json
+import logging
+import pathlib
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable
+
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import orm
+
+from benchmarks import synthetic
+from database import create_profile_engine
+from database.importer import bulk_import_data, import_data
+from forecasting.experiment import (
+    FULL_MODEL_FEATURES, LAGGED_TARGET_COL, fit_model, load_panel, run_experiment, split,
+)
+from forecasting.recursive import RecursiveForecaster
+from raw_data.interpolation import fill_panel
+
+# (countries, years, WDI indicators). "small" is about the size of the real panel.
+SCALES = {
+    "small": {"countries": 200, "years": 35, "indicators": 16},
+    "medium": {"countries": 1000, "years": 45, "indicators": 32},
+    "large": {"countries": 4000, "years": 60, "indicators": 64},
+}
+DEFAULT_SCALES = ("small", "medium")
+DEFAULT_NAN_DENSITY = 0.1
+DEFAULT_THRESHOLD = 0.15
+
+REPO_DIR = pathlib.Path(__file__).parent.parent
+# Interpreter arguments of the startup benchmarks.
+STARTUP_COMMANDS = {
+    "import_database": ["-c", "import database"],
+    "cli_help": ["cli.py", "--help"],
+    "import_modelexp": ["-c", "import modelexp"],
+}
+
+
+@dataclasses.dataclass
+class Workspace:
+    """Synthetic inputs of one scale, generated once and shared by all cases."""
+    scale: str
+    directory: pathlib.Path
+    panel: pd.DataFrame
+    wdi: pd.DataFrame
+    n_indicators: int
+    csv_path: pathlib.Path
+    db_path: pathlib.Path
+    empty_db_path: pathlib.Path
+
+    @classmethod
+    def create(cls, scale: str, directory: pathlib.Path, nan_density: float, seed: int) -> "Workspace":
+        size = SCALES[scale]
+        panel = synthetic.make_panel(size["countries"], size["years"], nan_density, seed)
+        wdi = synthetic.make_wdi(size["countries"], size["years"], size["indicators"], nan_density, seed)
+        workspace = cls(scale, directory, panel, wdi, size["indicators"],
+                        directory / "panel.csv", directory / "panel.db", directory / "empty.db")
+        synthetic.write_csv(panel, workspace.csv_path)
+        synthetic.write_database(panel, workspace.db_path)
+        synthetic.write_database(panel, workspace.empty_db_path, with_data=False)
+        return workspace
+
+    def fresh_database(self) -> pathlib.Path:
+        """A copy of the schema-and-countries database to import into."""
+        path = self.directory / "import.db"
+        for stale in self.directory.glob("import.db*"):
+            stale.unlink()
+        shutil.copyfile(self.empty_db_path, path)
+        return path
+
+    def engine(self) -> sqlalchemy.Engine:
+        return sqlalchemy.create_engine(f"sqlite:///{self.db_path.resolve()}", connect_args={"autocommit": False})
+
+    def load_panel(self) -> pd.DataFrame:
+        engine = self.engine()
+        with orm.Session(engine) as session:
+            df_clean = load_panel(session)
+        engine.dispose()
+        return df_clean
+
+
+def _import_orm(ws: Workspace) -> Callable:
+    bind = sqlalchemy.create_engine(f"sqlite:///{ws.fresh_database().resolve()}", connect_args={"autocommit": False})
+    return lambda: import_data(ws.csv_path, bind=bind)
+
+
+def _import_bulk(ws: Workspace) -> Callable:
+    bind = create_profile_engine("bulk_write", ws.fresh_database())
+    return lambda: bulk_import_data(ws.csv_path, bind=bind)
+
+
+def _interpolate(ws: Workspace) -> Callable:
+    methods = synthetic.wdi_methods(ws.n_indicators)
+    edge_fill_cols = list(methods)[::2]
+    return lambda: fill_panel(ws.wdi, methods, edge_fill_cols)
+
+
+def _load_panel(ws: Workspace) -> Callable:
+    return ws.load_panel
+
+
+def _run_experiment(ws: Workspace) -> Callable:
+    df_clean = ws.load_panel()
+    return lambda: run_experiment(df_clean, FULL_MODEL_FEATURES, "Benchmark")
+
+
+def _recursive(ws: Workspace) -> Callable:
+    df_clean = ws.load_panel()
+    X_train, y_train, X_test, y_test = split(df_clean, FULL_MODEL_FEATURES)
+    pipelines = {kind: fit_model(FULL_MODEL_FEATURES, kind, X_train, y_train, X_test, y_test)[0] for kind in ("MLR", "LGBM")}
+    return lambda: RecursiveForecaster(X_test, y_test, LAGGED_TARGET_COL).forecast(pipelines)
+
+
+CASES: dict[str, Callable[[Workspace], Callable]] = {
+    "import_orm": _import_orm,
+    "import_bulk": _import_bulk,
+    "interpolate": _interpolate,
+    "load_panel": _load_panel,
+    "run_experiment": _run_experiment,
+    "recursive": _recursive,
+}
+
+
+def measure(prepare: Callable[[], Callable], repeat: int) -> dict:
+    """Times `repeat` runs, each on freshly prepared inputs. Output of the timed code is discarded."""
+    timings = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            run = prepare()
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+    return {"median_s": statistics.median(timings), "min_s": min(timings), "repeat": repeat}
+
+
+def measure_startup(args: list[str], repeat: int) -> dict:
+    """Times `repeat` fresh `python <args>` processes started in the repository root."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=REPO_DIR, check=True, capture_output=True)
+        timings.append(time.perf_counter() - started)
+    return {"median_s": statistics.median(timings), "min_s": min(timings), "repeat": repeat}
+
+
+def _environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=pathlib.Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+def run_suite(scales: list[str], cases: list[str], repeat: int, nan_density: float, seed: int,
+              startup: bool = True) -> dict:
+    """
+    Runs every case at every scale (and, with `startup`, the startup commands) and
+    returns {"environment": ..., "results": {"scale/case": timing}}.
+    """
+    results = {}
+    if startup:
+        for name, args in STARTUP_COMMANDS.items():
+            # Startup times are short and noisy, so they get a few more runs.
+            timing = measure_startup(args, max(repeat, 5))
+            results[f"startup/{name}"] = timing
+            logging.info(f"startup/{name}: median {timing['median_s']:.3f}s, min {timing['min_s']:.3f}s")
+    for scale in scales:
+        with tempfile.TemporaryDirectory(prefix=f"bench-{scale}-") as directory:
+            logging.info(f"Generating {scale} panel {SCALES[scale]}...")
+            ws = Workspace.create(scale, pathlib.Path(directory), nan_density, seed)
+            for case in cases:
+                timing = measure(lambda: CASES[case](ws), repeat)
+                timing["rows"] = len(ws.wdi) if case == "interpolate" else len(ws.panel)
+                results[f"{scale}/{case}"] = timing
+                logging.info(f"{scale}/{case}: median {timing['median_s']:.3f}s, min {timing['min_s']:.3f}s")
+    return {
+        "environment": _environment(),
+        "settings": {"nan_density": nan_density, "seed": seed, "scales": {s: SCALES[s] for s in scales}},
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Prints current vs. baseline medians and returns the benchmarks whose median
+    grew by more than `threshold` (a fraction, 0.15 = 15%).
+    """
+    regressions = []
+    print(f"{'benchmark':<28} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, timing in current["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            print(f"{name:<28} {'-':>10} {timing['median_s']:>9.3f}s {'new':>8}")
+            continue
+        change = timing["median_s"] / reference["median_s"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<28} {reference['median_s']:>9.3f}s {timing['median_s']:>9.3f}s {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the importer, preprocessing and modelling code on synthetic panels.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=list(DEFAULT_SCALES))
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark.")
+    parser.add_argument("--nan-density", type=float, default=DEFAULT_NAN_DENSITY,
+                        help="Share of missing country-years (panel) and blank cells (WDI frame).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-startup", action="store_true", help="Skip the interpreter startup benchmarks.")
+    parser.add_argument("--output", type=pathlib.Path, help="Write the results as a JSON baseline.")
+    parser.add_argument("--compare", type=pathlib.Path, metavar="BASELINE",
+                        help="Compare against a baseline JSON and exit non-zero on regressions.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown of the median that counts as a regression.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    current = run_suite(args.scales, args.cases, args.repeat, args.nan_density, args.seed,
+                        startup=not args.no_startup)
+    if args.output:
+        args.output.write_text(json.dumps(current, indent=2), encoding="utf-8")
+        logging.info(f"Wrote {len(current['results'])} results to {args.output}")
+    if args.compare:
+        regressions = compare(current, json.loads(args.compare.read_text(encoding="utf-8")), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Synthetic WDI-shaped panels for benchmarking.
+
+Two shapes are generated, both deterministic for a given seed:
+
+* `make_panel` - the `data` table layout (one row per country and year, every
+  DataEntry column). The table is NOT NULL throughout, so missing observations
+  are leading country-years: series start late, as many WDI series do.
+* `make_wdi` - the raw World Bank download layout that `raw_data/preprocess.py`
+  interpolates, with any number of indicators and individual blank cells.
+
+`write_csv` and `write_database` turn a panel into an importer CSV or a
+ready-to-query SQLite file.
+"""
+import pathlib
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import orm
+
+from database import create_schema, models
+from database.importer import HEADER_MAP
+
+END_YEAR = 2023
+
+
+def country_codes(n_countries: int) -> list[str]:
+    """Distinct synthetic country codes ("C0000", "C0001", ...)."""
+    return [f"C{i:04d}" for i in range(n_countries)]
+
+
+def _walk(rng: np.random.Generator, shape: tuple[int, int], start, drift, noise) -> np.ndarray:
+    """Per-country random walks along the year axis, one row per country."""
+    steps = rng.normal(drift, noise, size=shape)
+    steps[:, 0] = 0
+    return np.asarray(start).reshape(-1, 1) + steps.cumsum(axis=1)
+
+
+def make_panel(n_countries: int, n_years: int, nan_density: float = 0.0, seed: int = 0,
+               min_years: int = 12) -> pd.DataFrame:
+    """
+    A panel with every `DataEntry` column for `n_countries` over the `n_years`
+    up to END_YEAR. About a `nan_density` share of country-years is missing,
+    as a run of leading years per country; the last `min_years` are always kept.
+    """
+    rng = np.random.default_rng(seed)
+    shape = (n_countries, n_years)
+    female = np.clip(_walk(rng, shape, rng.normal(50, 1, n_countries), 0, 0.05), 40, 60)
+    columns = {
+        "gdp": np.exp(_walk(rng, shape, rng.normal(8.5, 1.2, n_countries), 0.02, 0.04)),
+        "population": np.exp(_walk(rng, shape, rng.normal(15.5, 1.5, n_countries), 0.01, 0.005)).astype(np.int64),
+        "female": female,
+        "male": 100 - female,
+        "life_expectancy": np.clip(_walk(rng, shape, rng.uniform(50, 78, n_countries), 0.2, 0.3), 30, 90),
+        "migration": rng.normal(0, 1e4, shape).astype(np.int64),
+        "infant_mortality": np.clip(_walk(rng, shape, rng.uniform(5, 90, n_countries), -0.8, 1.0), 1, 150),
+        "internet": np.clip(_walk(rng, shape, rng.uniform(0, 20, n_countries), 2.0, 1.5), 0, 100),
+        "hci": np.clip(_walk(rng, shape, rng.uniform(0.3, 0.8, n_countries), 0.003, 0.005), 0.2, 0.95),
+        "enrollment": np.clip(_walk(rng, shape, rng.uniform(0.7, 1.05, n_countries), 0.002, 0.01), 0.3, 1.3),
+        "urban_pop": np.clip(_walk(rng, shape, rng.uniform(15, 85, n_countries), 0.3, 0.2), 5, 100),
+    }
+    panel = pd.DataFrame({
+        "country_code": np.repeat(country_codes(n_countries), n_years),
+        "year": np.tile(np.arange(END_YEAR - n_years + 1, END_YEAR + 1), n_countries),
+        **{name: values.ravel() for name, values in columns.items()},
+    })
+    if nan_density:
+        # A gap inside a series would break the lag chain, so only series starts are cut.
+        missing = np.minimum(rng.binomial(n_years, nan_density, n_countries), max(n_years - min_years, 0))
+        position = np.tile(np.arange(n_years), n_countries)
+        panel = panel[position >= np.repeat(missing, n_years)].reset_index(drop=True)
+    return panel
+
+
+def make_wdi(n_countries: int, n_years: int, n_indicators: int, nan_density: float = 0.0,
+             seed: int = 0) -> pd.DataFrame:
+    """
+    A raw WDI frame ("Country Name", "Country Code", "Time" and one column per
+    indicator) after `clean_and_tag`, with a `nan_density` share of blank cells.
+    """
+    rng = np.random.default_rng(seed)
+    shape = (n_countries, n_years)
+    codes = country_codes(n_countries)
+    frame = pd.DataFrame({
+        "Country Name": np.repeat([f"Country {code}" for code in codes], n_years),
+        "Country Code": np.repeat(codes, n_years),
+        "Time": np.tile(np.arange(END_YEAR - n_years + 1, END_YEAR + 1), n_countries),
+    })
+    for k in range(n_indicators):
+        values = _walk(rng, shape, rng.uniform(0, 100, n_countries), rng.normal(0, 0.5), 1.0).ravel()
+        values[rng.random(values.size) < nan_density] = np.nan
+        frame[wdi_indicator(k)] = values
+    return frame
+
+
+def wdi_indicator(k: int) -> str:
+    return f"Synthetic indicator {k} [SYN.IND.{k}]"
+
+
+def wdi_methods(n_indicators: int) -> dict[str, str]:
+    """Interpolation methods in the mix `preprocess.py` uses: two smooth indicators per jagged one."""
+    return {wdi_indicator(k): "linear" if k % 3 == 2 else "pchip" for k in range(n_indicators)}
+
+
+def write_csv(panel: pd.DataFrame, path: pathlib.Path):
+    """Writes `panel` with the CSV headers the importer expects."""
+    headers = {attr: header for header, attr in HEADER_MAP.items()}
+    panel.rename(columns=headers).to_csv(path, index=False, lineterminator="\n")
+
+
+def _countries(panel: pd.DataFrame) -> list[dict]:
+    return [{"country_code": code, "name": f"Country {code}", "lat": 0.0, "lng": 0.0}
+            for code in panel["country_code"].unique()]
+
+
+def write_database(panel: pd.DataFrame, path: pathlib.Path, with_data: bool = True):
+    """
+    Creates a SQLite database at `path` with the project schema and the panel's
+    countries; with `with_data` the panel itself is loaded as well.
+    """
+    engine = sqlalchemy.create_engine(f"sqlite:///{path.resolve()}", connect_args={"autocommit": False})
+    create_schema(bind=engine)
+    with orm.Session(engine) as session, session.begin():
+        session.execute(sqlalchemy.insert(models.Country), _countries(panel))
+        if with_data:
+            session.execute(sqlalchemy.insert(models.DataEntry), panel.to_dict("records"))
+    engine.dispose()
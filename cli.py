@@ -0,0 +1,119 @@
+"""
+Command-line entry point for the data pipeline and the forecasting models.
+
+Each subcommand imports what it needs when it runs, so `--help`, `init-db` and
+`plot` start without loading scikit-learn or LightGBM. Nothing touches the
+database until a subcommand does; `init-db` and `import` create the schema.
+`import`, `preprocess`, `merge`, `experiment`, `publish` and the other script
+commands hand their arguments to the scripts they wrap (`database/importer.py`,
+`raw_data/preprocess.py`, `raw_data/merge.py`, `modelexp.py`,
+`forecasting/publish.py`, ...), so `python cli.py experiment --help` lists the
+experiment's own options.
+
+Usage:
+    python cli.py init-db
+    python cli.py import --bulk data/cleanWDI_gdp.csv
+    python cli.py preprocess --workers 4
+    python cli.py merge --output data/wdi_gdp_data.csv
+    python cli.py experiment --workers 4 --results experiment_results.csv
+    python cli.py plot experiment_results.csv --output-dir plots
+    python cli.py features materialize gdp_lagged gdp_rollmean3
+    python cli.py forecast FI 2016 --horizon 3
+    python cli.py simulate --perturb "hci=+5%,sd=2%,ramp=5" --draws 10000 --horizon 20
+    python cli.py publish --horizon 10 --origins 2014
+    python cli.py forecasts year 2026
+"""
+import argparse
+import importlib
+import json
+import pathlib
+import sys
+
+# Subcommands delegating to a script's `main(argv)`: name -> (module, help).
+SCRIPTS = {
+    "import": ("database.importer", "Import a panel CSV into the database."),
+    "preprocess": ("raw_data.preprocess", "Clean the raw WDI extract and fill its gaps."),
+    "merge": ("raw_data.merge", "Join the cleaned WDI panel with the GDP sources and import it."),
+    "experiment": ("modelexp", "Run the feature-impact experiments."),
+    "features": ("database.views", "Create, materialize and query the SQL-side feature views."),
+    "simulate": ("forecasting.simulate", "Monte Carlo GDP per capita bands under perturbed indicators."),
+    "publish": ("forecasting.publish", "Forecast every country and publish the forecasts to the database."),
+    "forecasts": ("database.forecasts", "Read the published forecasts."),
+}
+
+
+def init_db(args: argparse.Namespace):
+    import database
+
+    database.create_schema()
+    print(f"Schema ready in {database.DB_PATH}")
+
+
+def run_script(args: argparse.Namespace, argv: list[str]):
+    module = importlib.import_module(SCRIPTS[args.command][0])
+    # Usage lines of the script's own parser then read "cli.py <command> ...".
+    sys.argv[0] = f"{pathlib.Path(sys.argv[0]).name} {args.command}"
+    module.main(argv)
+
+
+def plot(args: argparse.Namespace):
+    from forecasting.plots import load_results, plot_results
+
+    plot_results(load_results(args.results), args.output_dir)
+
+
+def forecast(args: argparse.Namespace):
+    import logging
+
+    from forecasting.serve import BatchingPredictor, ForecastRequest, ModelRegistry
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    registry = ModelRegistry.load(kinds=[args.model])
+    request = ForecastRequest(args.country_code.upper(), args.year, args.model, max(1, args.horizon))
+    print(json.dumps(BatchingPredictor(registry).submit(request).result(), indent=2))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Import, preprocess, experiment with and forecast the country panel.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True, metavar="COMMAND")
+
+    def add(name: str, handler, help: str, **kwargs) -> argparse.ArgumentParser:
+        subparser = commands.add_parser(name, help=help, description=help,
+                                        formatter_class=argparse.ArgumentDefaultsHelpFormatter, **kwargs)
+        subparser.set_defaults(handler=handler)
+        return subparser
+
+    add("init-db", init_db, "Create any missing tables and indexes.")
+    for name, (_, help) in SCRIPTS.items():
+        # The script parses its own options (including --help) once it is imported.
+        add(name, run_script, help, add_help=False)
+
+    plot_parser = add("plot", plot, "Draw the comparison charts of a saved experiment summary.")
+    plot_parser.add_argument("results", type=pathlib.Path, help="CSV written by `experiment --results`.")
+    plot_parser.add_argument("--output-dir", type=pathlib.Path, default=pathlib.Path("."),
+                             help="Directory for the PNGs.")
+
+    forecast_parser = add("forecast", forecast, "Forecast GDP per capita of one country from a fitted model.")
+    forecast_parser.add_argument("country_code", help="ISO alpha-2 country code, e.g. FI.")
+    forecast_parser.add_argument("year", type=int, help="First forecast year; needs data for the year before.")
+    forecast_parser.add_argument("--horizon", type=int, default=1, help="Years to forecast recursively.")
+    forecast_parser.add_argument("--model", choices=["MLR", "LGBM"], default="LGBM")
+    return parser
+
+
+def main():
+    parser = build_parser()
+    args, rest = parser.parse_known_args()
+    if args.handler is run_script:
+        run_script(args, rest)
+    elif rest:
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+    else:
+        args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,17 @@
+"""
+Database connection and schema.
+
+Importing the package has no side effects: the default `engine` and `sessions`
+are created on first use, and the schema is only created by `create_schema()`
+(run by the importer and by `python cli.py init-db`).
+"""
+import functools
+import math
 import pathlib
+import sqlite3
 
-from sqlalchemy import create_engine, event, Engine, orm
+from sqlalchemy import create_engine, event, func, Engine, orm
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 import database.models
 
@@ -11,12 +22,27 @@ DB_PATH =  BASE_DIR / "data.db"
 # Create the SQLite connection string
 DATABASE_URL = f"sqlite:///{DB_PATH.resolve()}"
 
-# Create the database engine
-engine = create_engine(
-    DATABASE_URL, 
-    connect_args={"autocommit": False}
-)
-sessions = orm.sessionmaker(bind=engine)
+
+@functools.cache
+def _default_engine() -> Engine:
+    return create_engine(
+        DATABASE_URL,
+        connect_args={"autocommit": False}
+    )
+
+
+@functools.cache
+def _default_sessions() -> orm.sessionmaker:
+    return orm.sessionmaker(bind=_default_engine())
+
+
+def __getattr__(name: str):
+    # `database.engine` and `database.sessions` are created lazily on first access.
+    if name == "engine":
+        return _default_engine()
+    if name == "sessions":
+        return _default_sessions()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 @event.listens_for(Engine, "connect")
@@ -27,8 +53,142 @@ def set_sqlite_pragma(dbapi_connection, connection_record):
     dbapi_connection.autocommit = True
     cursor = dbapi_connection.cursor()
     cursor.execute("PRAGMA foreign_keys=ON")
+    try:
+        cursor.execute("SELECT sqrt(1), ln(1)")
+    except sqlite3.OperationalError:
+        # SQLite builds without SQLITE_ENABLE_MATH_FUNCTIONS; the feature views need these two.
+        dbapi_connection.create_function("sqrt", 1, _sqrt, deterministic=True)
+        dbapi_connection.create_function("ln", 1, _ln, deterministic=True)
     cursor.close()
     dbapi_connection.autocommit = False
 
 
-models.Base.metadata.create_all(bind=engine)
+def _sqrt(value):
+    return math.sqrt(value) if value is not None and value >= 0 else None
+
+
+def _ln(value):
+    return math.log(value) if value is not None and value > 0 else None
+
+
+# --- Engine profiles ---
+
+# Connection settings per workload. "read" opens read-only connections in a sized
+# pool so many readers can work next to one writer; WAL journaling (persistent in
+# the database file, switched on by `create_schema` and the "bulk_write" profile)
+# keeps them from blocking on the writer. "read" never writes, not even the
+# journal mode, so it needs an existing database file. "bulk_write" is tuned for
+# long import transactions.
+PROFILES = {
+    "read": {
+        "read_only": True,
+        "pool": {"pool_size": 8, "max_overflow": 8},
+        "pragmas": {
+            "mmap_size": 256 * 1024 * 1024,
+            "cache_size": -64 * 1024,  # negative = KiB
+            "synchronous": "NORMAL",
+        },
+    },
+    "bulk_write": {
+        "read_only": False,
+        "pool": {"pool_size": 1, "max_overflow": 0},
+        "pragmas": {
+            "cache_size": -256 * 1024,
+            "synchronous": "NORMAL",
+            "temp_store": "MEMORY",
+            "wal_autocheckpoint": 10000,
+        },
+    },
+}
+
+# Pragmas reported by `engine_stats`.
+REPORTED_PRAGMAS = (
+    "journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store",
+    "foreign_keys", "query_only", "busy_timeout", "wal_autocheckpoint",
+)
+
+
+def _switch_to_wal(bind: Engine):
+    with bind.connect() as connection:
+        # journal_mode can't change inside a transaction.
+        dbapi_connection = connection.connection.dbapi_connection
+        dbapi_connection.autocommit = True
+        try:
+            connection.exec_driver_sql("PRAGMA journal_mode=WAL")
+        finally:
+            dbapi_connection.autocommit = False
+
+
+def enable_wal(db_path: pathlib.Path = DB_PATH):
+    """Switches the database file to WAL journaling. The mode persists in the file."""
+    bootstrap = create_engine(f"sqlite:///{db_path.resolve()}", connect_args={"autocommit": False})
+    _switch_to_wal(bootstrap)
+    bootstrap.dispose()
+
+
+def create_profile_engine(profile: str, db_path: pathlib.Path = DB_PATH) -> Engine:
+    """Creates an engine configured with one of `PROFILES` for `db_path`."""
+    settings = PROFILES[profile]
+    if settings["read_only"]:
+        url = f"sqlite:///file:{db_path.resolve().as_posix()}?mode=ro&uri=true"
+    else:
+        enable_wal(db_path)
+        url = f"sqlite:///{db_path.resolve()}"
+    profile_engine = create_engine(
+        url,
+        connect_args={"autocommit": False, "timeout": 30},
+        **settings["pool"],
+    )
+
+    @event.listens_for(profile_engine, "connect")
+    def set_profile_pragmas(dbapi_connection, connection_record):
+        dbapi_connection.autocommit = True
+        cursor = dbapi_connection.cursor()
+        for name, value in settings["pragmas"].items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+        dbapi_connection.autocommit = False
+
+    return profile_engine
+
+
+@functools.cache
+def get_engine(profile: str) -> Engine:
+    """Shared engine for a profile, created on first use."""
+    return create_profile_engine(profile)
+
+
+def engine_stats(bind: Engine | None = None) -> dict:
+    """Reports the pragmas active on a pooled connection of `bind` (default engine if None) and its pool statistics."""
+    bind = bind or _default_engine()
+    with bind.connect() as connection:
+        pragmas = {name: connection.exec_driver_sql(f"PRAGMA {name}").scalar() for name in REPORTED_PRAGMAS}
+    pool = bind.pool
+    stats = {"pragmas": pragmas, "pool": pool.status()}
+    for counter in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, counter):
+            stats[counter] = getattr(pool, counter)()
+    return stats
+
+
+def create_schema(bind: Engine | None = None):
+    """
+    Creates missing tables, indexes and the data table's revision triggers in
+    the database behind `bind` (default engine if None) and switches it to WAL
+    journaling for the read profile.
+    """
+    bind = bind or _default_engine()
+    _switch_to_wal(bind)
+    models.Base.metadata.create_all(bind=bind)
+    # create_all skips indexes of tables that already exist, so add new ones explicitly.
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+    revision = models.DataRevision.__table__
+    with bind.begin() as connection:
+        connection.execute(
+            sqlite_insert(revision).values(id=1, token=func.lower(func.hex(func.randomblob(8))), revision=0)
+            .on_conflict_do_nothing()
+        )
+        for trigger in models.DATA_REVISION_TRIGGERS:
+            connection.exec_driver_sql(trigger)
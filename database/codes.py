@@ -0,0 +1,81 @@
+"""
+Precomputed ISO 3166-1 code resolution.
+
+The alpha-3 -> alpha-2 and name -> alpha-2 tables are built from pycountry once
+and persisted to `data/iso_codes.json`, next to `countries.json`. Whole columns
+are resolved with one lookup per distinct code; fuzzy name searches are cached.
+"""
+import functools
+import importlib.metadata
+import json
+import logging
+import os
+import tempfile
+
+import pandas as pd
+from pycountry import countries
+
+import database
+
+CODES_PATH = (database.BASE_DIR / ".." / "data" / "iso_codes.json").resolve()
+
+UNKNOWN_ALPHA_2 = "XX"
+# Codes that pycountry doesn't know but the World Bank uses.
+ALPHA_3_OVERRIDES = {
+    "XKX": "XK",  # Kosovo
+}
+
+
+def _build_table() -> dict:
+    alpha_3 = {country.alpha_3: country.alpha_2 for country in countries}
+    alpha_3.update(ALPHA_3_OVERRIDES)
+    names = {}
+    for country in countries:
+        for attr in ("name", "official_name", "common_name"):
+            name = getattr(country, attr, None)
+            if name:
+                names[name.lower()] = country.alpha_2
+    return {"pycountry": importlib.metadata.version("pycountry"), "alpha_3": alpha_3, "name": names}
+
+
+@functools.cache
+def load_table() -> dict:
+    """Loads the persisted lookup table, rebuilding it when missing or made by another pycountry version."""
+    if CODES_PATH.exists():
+        table = json.loads(CODES_PATH.read_text(encoding="utf-8"))
+        if table.get("pycountry") == importlib.metadata.version("pycountry"):
+            return table
+    logging.info(f"Building ISO code table at {CODES_PATH}")
+    table = _build_table()
+    CODES_PATH.parent.mkdir(parents=True, exist_ok=True)
+    # Write next to the target and rename, so concurrent readers never see a partial file.
+    fd, staging = tempfile.mkstemp(dir=CODES_PATH.parent, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(table, f, ensure_ascii=False, indent=1)
+    os.replace(staging, CODES_PATH)
+    return table
+
+
+def alpha3_to_alpha2(alpha3: str) -> str:
+    """Alpha-2 code for an alpha-3 code, "XX" when unknown."""
+    return load_table()["alpha_3"].get(alpha3.upper(), UNKNOWN_ALPHA_2)
+
+
+def resolve_alpha2(column: pd.Series) -> pd.Series:
+    """Maps a column of alpha-3 codes to alpha-2 with one table lookup per distinct code."""
+    mapping = {code: alpha3_to_alpha2(code) for code in column.dropna().unique()}
+    return column.map(mapping)
+
+
+@functools.lru_cache(maxsize=1024)
+def _search_fuzzy(name: str) -> str:
+    return countries.search_fuzzy(name)[0].alpha_2
+
+
+def name_to_alpha2(name: str) -> str:
+    """
+    Alpha-2 code for a country name: exact (case-insensitive) table match first,
+    then a cached pycountry fuzzy search. Raises LookupError when nothing matches.
+    """
+    code = load_table()["name"].get(name.lower())
+    return code if code is not None else _search_fuzzy(name)
@@ -0,0 +1,69 @@
+"""
+Names of the lag, rolling and change features.
+
+Both feature implementations parse these names: the pandas feature store
+(`forecasting.features`) and the SQL window views (`database.views`).
+
+Feature names (`column` is any numeric panel column):
+    {column}_lagged        previous year's value (the same as {column}_lag1)
+    {column}_lag{k}        value k >= 1 years back
+    {column}_rollmean{w}   mean of the previous w >= 1 years
+    {column}_rollstd{w}    sample standard deviation of the previous w >= 2 years
+    {column}_growth        previous year's growth rate: x[t-1] / x[t-2] - 1, missing if x[t-2] is 0
+    {column}_diff          previous year's first difference: x[t-1] - x[t-2]
+"""
+import dataclasses
+import hashlib
+import re
+
+_NAME = re.compile(
+    r"^(?P<column>.+?)_(?:(?P<lagged>lagged)|lag(?P<lag>\d+)|roll(?P<stat>mean|std)(?P<window>\d+)"
+    r"|(?P<change>growth|diff))$"
+)
+
+# Smallest lag / window per kind.
+_MIN_PARAM = {"lag": 1, "rollmean": 1, "rollstd": 2}
+
+
+@dataclasses.dataclass(frozen=True)
+class FeatureSpec:
+    """A parsed feature name: `kind` is "lag", "rollmean", "rollstd", "growth" or "diff"."""
+    name: str
+    column: str
+    kind: str
+    param: int = 1
+
+
+def parse_feature(name: str) -> FeatureSpec:
+    """Parses a feature name; raises ValueError for names that aren't store features."""
+    match = _NAME.match(name)
+    if match is None:
+        raise ValueError(f"Not a feature store name: '{name}'")
+    column = match["column"]
+    if match["lagged"]:
+        return FeatureSpec(name, column, "lag", 1)
+    if match["lag"]:
+        spec = FeatureSpec(name, column, "lag", int(match["lag"]))
+    elif match["stat"]:
+        spec = FeatureSpec(name, column, f"roll{match['stat']}", int(match["window"]))
+    else:
+        return FeatureSpec(name, column, match["change"])
+    if spec.param < _MIN_PARAM[spec.kind]:
+        # lag0 would be the current (target) year; rollstd needs two values for ddof=1.
+        raise ValueError(f"'{name}': {spec.kind}{spec.param} isn't a feature, the smallest is "
+                         f"{spec.kind}{_MIN_PARAM[spec.kind]}")
+    return spec
+
+
+def is_feature(name: str) -> bool:
+    """Whether `parse_feature` accepts `name`."""
+    try:
+        parse_feature(name)
+    except ValueError:
+        return False
+    return True
+
+
+def spec_key(names) -> str:
+    """Short, order-independent hash of a set of feature names."""
+    return hashlib.sha256("\n".join(sorted(set(names))).encode()).hexdigest()[:12]
@@ -0,0 +1,167 @@
+"""
+Published forecasts: writes of `forecasting.publish` and the dashboard's reads.
+
+The `forecasts` table holds recursive GDP per capita forecasts keyed by
+(model_version, country_code, target_year, horizon); `forecast_metrics` holds
+one row per model version with its test scores. Both reads are index lookups
+and never run a model: a year's map is a range scan of `ix_forecasts_model_year`
+and a country's trajectory a range scan of the primary key (the table is
+WITHOUT ROWID, so that is the table itself).
+
+Usage:
+    model_versions(kind="LGBM")[0]["model_version"]            # most recently published first
+    year_forecasts("LGBM-3f9a0c1d2e4b", 2026)                   # arrays in country_code order
+    country_trajectory("LGBM-3f9a0c1d2e4b", "FI", as_="records")
+    python -m database.forecasts versions
+    python -m database.forecasts year 2026
+    python -m database.forecasts country FI --model LGBM-3f9a0c1d2e4b
+"""
+import argparse
+import time
+from typing import Literal
+
+import numpy as np
+import sqlalchemy
+from sqlalchemy import Engine
+
+import database
+from database import models
+from database.query import column_dtype
+
+COLUMNS = ("country_code", "target_year", "horizon", "gdp_per_capita", "actual")
+
+
+def write(metrics: dict, rows: list[dict], bind: Engine | None = None) -> int:
+    """
+    Replaces model version `metrics["model_version"]`: its metrics row and every
+    forecast row, in one transaction. Returns the number of forecast rows.
+    """
+    forecasts, versions = models.Forecast.__table__, models.ForecastMetrics.__table__
+    version = metrics["model_version"]
+    with (bind or database.get_engine("bulk_write")).begin() as connection:
+        connection.execute(forecasts.delete().where(forecasts.c.model_version == version))
+        connection.execute(versions.delete().where(versions.c.model_version == version))
+        connection.execute(versions.insert(), [metrics])
+        if rows:
+            connection.execute(forecasts.insert(), [dict(row, model_version=version) for row in rows])
+    return len(rows)
+
+
+def delete(model_version: str, bind: Engine | None = None):
+    forecasts, versions = models.Forecast.__table__, models.ForecastMetrics.__table__
+    with (bind or database.get_engine("bulk_write")).begin() as connection:
+        connection.execute(forecasts.delete().where(forecasts.c.model_version == model_version))
+        connection.execute(versions.delete().where(versions.c.model_version == model_version))
+
+
+# --- Reads ---
+
+def model_versions(kind: str | None = None, bind: Engine | None = None) -> list[dict]:
+    """Published model versions with their metrics, most recently published first."""
+    versions = models.ForecastMetrics.__table__
+    query = sqlalchemy.select(versions).order_by(versions.c.published_at.desc(), versions.c.model_version)
+    if kind is not None:
+        query = query.where(versions.c.kind == kind)
+    with (bind or database.get_engine("read")).connect() as connection:
+        return [dict(row) for row in connection.execute(query).mappings()]
+
+
+def latest_version(kind: str = "LGBM", bind: Engine | None = None) -> str | None:
+    versions = model_versions(kind, bind)
+    return versions[0]["model_version"] if versions else None
+
+
+def _result(rows: list, as_: str) -> dict[str, np.ndarray] | list[tuple]:
+    if as_ == "records":
+        return [tuple(row) for row in rows]
+    table = models.Forecast.__table__
+    columns = list(zip(*rows)) if rows else [()] * len(COLUMNS)
+    return {name: np.array(values, dtype=column_dtype(table.c[name])) for name, values in zip(COLUMNS, columns)}
+
+
+def year_forecasts(model_version: str, year: int, horizon: int | None = None,
+                   as_: Literal["arrays", "records"] = "arrays",
+                   bind: Engine | None = None) -> dict[str, np.ndarray] | list[tuple]:
+    """
+    Every country's forecast for `year` under `model_version`, in country_code
+    order. Without `horizon`, each country's shortest-horizon forecast of the year
+    (the one made with the most data). Returns {column: array} of `COLUMNS`,
+    unknown actuals as NaN (as_="arrays"), or tuples in that order (as_="records").
+    Uses the read-only engine profile unless `bind` is given.
+    """
+    table = models.Forecast.__table__
+    query = (sqlalchemy.select(*(table.c[name] for name in COLUMNS))
+             .where(table.c.model_version == model_version, table.c.target_year == year))
+    if horizon is not None:
+        query = query.where(table.c.horizon == horizon)
+    query = query.order_by(table.c.country_code, table.c.horizon)
+    with (bind or database.get_engine("read")).connect() as connection:
+        rows = connection.execute(query).all()
+    if horizon is None:
+        # Rows come in (country_code, horizon) order: keep each country's first.
+        rows = [row for i, row in enumerate(rows) if i == 0 or row[0] != rows[i - 1][0]]
+    return _result(rows, as_)
+
+
+def country_trajectory(model_version: str, country_code: str, origin: int | None = None,
+                       as_: Literal["arrays", "records"] = "arrays",
+                       bind: Engine | None = None) -> dict[str, np.ndarray] | list[tuple]:
+    """
+    Forecasts of one country under `model_version` in (target_year, horizon)
+    order; with `origin`, only the trajectory starting after that year (target
+    years origin + horizon). Returns as `year_forecasts` does.
+    """
+    table = models.Forecast.__table__
+    query = (sqlalchemy.select(*(table.c[name] for name in COLUMNS))
+             .where(table.c.model_version == model_version, table.c.country_code == country_code))
+    if origin is not None:
+        query = query.where(table.c.target_year - table.c.horizon == origin)
+    query = query.order_by(table.c.target_year, table.c.horizon)
+    with (bind or database.get_engine("read")).connect() as connection:
+        rows = connection.execute(query).all()
+    return _result(rows, as_)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Read the published forecasts.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("versions", help="List the published model versions and their metrics.")
+    year = commands.add_parser("year", help="Every country's forecast for one year.")
+    year.add_argument("year", type=int)
+    year.add_argument("--horizon", type=int, help="Only forecasts made this many years ahead.")
+    country = commands.add_parser("country", help="One country's forecast trajectory.")
+    country.add_argument("country_code")
+    country.add_argument("--origin", type=int, help="Only the trajectory starting after this year.")
+    for subparser in (year, country):
+        subparser.add_argument("--model", help="Model version (default: the latest published LGBM version).")
+    drop = commands.add_parser("delete", help="Delete a published model version.")
+    drop.add_argument("model")
+    args = parser.parse_args(argv)
+
+    if args.command == "versions":
+        for version in model_versions():
+            print(*version.values(), sep="\t")
+        return
+    if args.command == "delete":
+        delete(args.model)
+        return
+    model_version = args.model or latest_version()
+    if model_version is None:
+        parser.error("no published forecasts; run `python cli.py publish` first")
+    started = time.perf_counter()
+    if args.command == "year":
+        rows = year_forecasts(model_version, args.year, args.horizon, as_="records")
+    else:
+        rows = country_trajectory(model_version, args.country_code.upper(), args.origin, as_="records")
+    elapsed = time.perf_counter() - started
+    print(*COLUMNS, sep="\t")
+    for row in rows:
+        print(*row, sep="\t")
+    print(f"{len(rows)} rows of {model_version} in {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
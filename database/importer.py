@@ -4,19 +4,32 @@ This script imports time-series country data from a CSV file into the database.
 It maps the specific CSV headers to the `DataEntry` model fields,
 handles data type conversion, and skips rows with missing primary key data.
 
+Missing tables are created before importing (see `database.create_schema`), and
+a materialized feature table (see `database.views`) is refreshed afterwards.
+
 Usage:
     python importer.py /path/to/your/data.csv
+    python importer.py --bulk /path/to/your/data.csv   # chunked upsert, safe for re-imports
+    python cli.py import --bulk /path/to/your/data.csv
 """
 
 import argparse
+import collections
 import csv
+import dataclasses
 import logging
 import pathlib
-from typing import Any, Type, Optional
+from typing import Any, Iterable, Iterator, Type, Optional
 
-from database import models, sessions
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import orm
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+import database
+import tracing
+from database import get_engine, models, views
 
 # --- Data Mapping Configuration ---
 
@@ -89,23 +102,100 @@ def _safe_cast(value: Optional[str], cast_to: Type) -> Optional[Any]:
         return None
 
 
-def import_data(csv_path: pathlib.Path):
+def _parse_row(i: int, row: dict, valid_country_codes: set) -> Optional[dict]:
     """
-    Imports data from the specified CSV file into the database.
+    Converts a single CSV row into `DataEntry` keyword arguments.
+    Returns None (after logging) when the row cannot be imported.
     """
-    if not csv_path.exists():
-        logging.error(f"File not found: {csv_path}")
-        return
+    raw_country_code = row.get("alpha_2")
+    country_code = None
+    if raw_country_code and raw_country_code.strip():
+        country_code = raw_country_code.strip().upper()
+
+    if not country_code:
+        raw_name = row.get("name")
+        if raw_name and raw_name.strip().lower() == "namibia":
+            country_code = "NA"
+            logging.debug(f"Row {i}: Used fallback for Namibia based on name to set country code 'NA'.")
+
+    year = _safe_cast(row.get("year"), int)
+
+    if not country_code or not year:
+        if any(row.values()):
+            logging.warning(f"Skipping row {i}: Missing primary key data (country_code or year).")
+        return None
+
+    if country_code not in valid_country_codes:
+        logging.warning(f"Skipping row {i}: Code '{country_code}' not in database.")
+        return None
+
+    entry_data = {"country_code": country_code, "year": year}
+
+    # Process all mapped fields
+    for csv_header, model_attr in HEADER_MAP.items():
+        if model_attr in ("country_code", "year"):
+            continue
+        entry_data[model_attr] = _safe_cast(row.get(csv_header), TYPE_MAP[model_attr])
+    return entry_data
+
+
+def _keep_entry(i: int, entry_data: dict, unique_entries: dict) -> bool:
+    """
+    Decides whether `entry_data` should replace an already seen entry with the same key.
+    The entry whose GDP lies closer to the previous year's GDP wins.
+    """
+    country_code, year = entry_data["country_code"], entry_data["year"]
+    if (country_code, year) not in unique_entries:
+        return True
+    prev_gdp = unique_entries.get((country_code, year-1), {"gdp": 0})["gdp"]
+    known_gdp_diff = abs(prev_gdp - unique_entries.get((country_code, year), {"gdp": 0})["gdp"])
+    curr_gdp_diff = abs(prev_gdp - entry_data["gdp"])
+    if known_gdp_diff < curr_gdp_diff:
+        logging.warning(f"Duplicate entry for row {i} ({country_code}, {year}). Skipping.")
+        return False
+    logging.warning(f"Duplicate entry for row {i} ({country_code}, {year}). Overwriting old.")
+    return True
 
+
+def _session_factory(bind: Optional[sqlalchemy.Engine]) -> orm.sessionmaker:
+    return orm.sessionmaker(bind=bind) if bind is not None else database.sessions
+
+
+def refresh_features(bind: sqlalchemy.Engine):
+    """Recomputes the materialized feature table, if there is one, after the data table changed."""
+    with tracing.span("import.refresh_features"):
+        rows = views.refresh(bind)
+    if rows is not None:
+        logging.info(f"Refreshed {rows} rows of {views.TABLE_NAME}.")
+
+
+def fetch_country_codes(bind: Optional[sqlalchemy.Engine] = None) -> Optional[set]:
+    """Returns the set of country codes known to the database, or None if it can't be reached."""
     logging.info("Fetching existing country codes from the database...")
     try:
-        with sessions() as session:
+        with _session_factory(bind)() as session:
             results = session.query(models.Country.country_code).all()
             valid_country_codes = {code for (code,) in results}
         logging.info(f"Found {len(valid_country_codes)} countries in the database.")
+        return valid_country_codes
     except Exception as e:
         logging.error(f"Could not connect to database to fetch country codes: {e}", exc_info=True)
         logging.error("Aborting import. Please ensure the database is set up and Country data is imported.")
+        return None
+
+
+@tracing.traced("import.import_data")
+def import_data(csv_path: pathlib.Path, bind: Optional[sqlalchemy.Engine] = None):
+    """
+    Imports data from the specified CSV file into the database
+    (or into the database behind `bind`).
+    """
+    if not csv_path.exists():
+        logging.error(f"File not found: {csv_path}")
+        return
+
+    valid_country_codes = fetch_country_codes(bind)
+    if valid_country_codes is None:
         return
 
     logging.info(f"Starting import from {csv_path}...")
@@ -113,52 +203,15 @@ def import_data(csv_path: pathlib.Path):
     unique_entries = {}
 
     try:
-        with open(csv_path, mode="r", encoding="utf-8-sig") as csvfile:
+        with tracing.span("import.parse_csv"), open(csv_path, mode="r", encoding="utf-8-sig") as csvfile:
             reader = csv.DictReader(csvfile)
 
             for i, row in enumerate(reader, start=2):
-
-                raw_country_code = row.get("alpha_2")
-                country_code = None
-                if raw_country_code and raw_country_code.strip():
-                    country_code = raw_country_code.strip().upper()
-
-                if not country_code:
-                    raw_name = row.get("name")
-                    if raw_name and raw_name.strip().lower() == "namibia":
-                        country_code = "NA"
-                        logging.debug(f"Row {i}: Used fallback for Namibia based on name to set country code 'NA'.")
-
-                year = _safe_cast(row.get("year"), int)
-
-                if not country_code or not year:
-                    if any(row.values()):
-                        logging.warning(f"Skipping row {i}: Missing primary key data (country_code or year).")
+                entry_data = _parse_row(i, row, valid_country_codes)
+                if entry_data is None:
                     continue
-
-                if country_code not in valid_country_codes:
-                    logging.warning(f"Skipping row {i}: Code '{country_code}' not in database.")
-                    continue
-
-                entry_data = {"country_code": country_code, "year": year}
-
-                # Process all mapped fields
-                for csv_header, model_attr in HEADER_MAP.items():
-                    if model_attr in ("country_code", "year"):
-                        continue
-                    entry_data[model_attr] = _safe_cast(row.get(csv_header), TYPE_MAP[model_attr])
-
-                composite_key = (country_code, year)
-                if composite_key in unique_entries:
-                    prev_gdp = unique_entries.get((country_code, year-1), {"gdp": 0})["gdp"]
-                    known_gdp_diff = abs(prev_gdp - unique_entries.get((country_code, year), {"gdp": 0})["gdp"])
-                    curr_gdp_diff = abs(prev_gdp - entry_data["gdp"])
-                    if known_gdp_diff < curr_gdp_diff:
-                        logging.warning(f"Duplicate entry for row {i} ({country_code}, {year}). Skipping.")
-                        continue
-                    logging.warning(f"Duplicate entry for row {i} ({country_code}, {year}). Overwriting old.")
-
-                unique_entries[composite_key] = entry_data
+                if _keep_entry(i, entry_data, unique_entries):
+                    unique_entries[(entry_data["country_code"], entry_data["year"])] = entry_data
 
     except Exception as e:
         logging.error(f"Error while reading CSV: {e}", exc_info=True)
@@ -170,10 +223,11 @@ def import_data(csv_path: pathlib.Path):
 
     logging.info(f"Processed CSV. Found {len(unique_entries)} valid records to import.")
 
-    entries_to_add = [models.DataEntry(**data) for data in unique_entries.values()]
+    with tracing.span("import.build_entries", rows=len(unique_entries)):
+        entries_to_add = [models.DataEntry(**data) for data in unique_entries.values()]
 
     try:
-        with sessions.begin() as session:
+        with tracing.span("import.write"), _session_factory(bind).begin() as session:
             logging.info("Database session started. Adding all entries...")
             session.add_all(entries_to_add)
             logging.info("Committing transaction...")
@@ -181,9 +235,248 @@ def import_data(csv_path: pathlib.Path):
     except Exception as e:
         logging.error(f"Database error during transaction: {e}", exc_info=True)
         logging.error("Transaction rolled back. No data was saved.")
+        return
+    refresh_features(bind or database.engine)
+
+
+# --- Bulk (upsert) import ---
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+@dataclasses.dataclass
+class ImportStats:
+    """Row counts reported by `bulk_import_data`."""
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    skipped: int = 0
+
+    @property
+    def written(self) -> int:
+        return self.inserted + self.updated + self.unchanged
+
+
+def upsert_statement() -> sqlalchemy.Insert:
+    """
+    Builds `INSERT ... ON CONFLICT(country_code, year) DO UPDATE` for the data table.
+    The update only fires when at least one value differs, so untouched rows are not rewritten.
+    """
+    table = models.DataEntry.__table__
+    value_columns = [col.name for col in table.columns if not col.primary_key]
+    stmt = sqlite_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[col.name for col in table.primary_key.columns],
+        set_={name: stmt.excluded[name] for name in value_columns},
+        where=sqlalchemy.or_(*(table.c[name].is_distinct_from(stmt.excluded[name]) for name in value_columns)),
+    )
+
+
+def _existing_key_count(connection: sqlalchemy.Connection, chunk: list[dict]) -> int:
+    """Counts how many (country_code, year) keys of `chunk` are already stored."""
+    table = models.DataEntry.__table__
+    keys = {(entry["country_code"], entry["year"]) for entry in chunk}
+    years = [year for _, year in keys]
+    query = sqlalchemy.select(table.c.country_code, table.c.year).where(
+        table.c.country_code.in_({code for code, _ in keys}),
+        table.c.year.between(min(years), max(years)),
+    )
+    return sum(1 for row in connection.execute(query) if tuple(row) in keys)
+
+
+def _flush_chunk(connection: sqlalchemy.Connection, stmt: sqlalchemy.Insert, rows: list[dict], stats: ImportStats):
+    """Writes one chunk with a single executemany upsert and updates `stats`."""
+    existing = _existing_key_count(connection, rows)
+    changed = connection.execute(stmt, rows).rowcount
+    inserted = len(rows) - existing
+    stats.inserted += inserted
+    stats.updated += changed - inserted
+    stats.unchanged += existing - (changed - inserted)
+    logging.debug(f"Flushed chunk of {len(rows)} rows ({inserted} new).")
+
+
+def _row_chunks(csvfile, valid_country_codes: set, chunk_size: int, stats: ImportStats) -> Iterator[list[dict]]:
+    """Parses the CSV row by row with `_parse_row`, yielding deduplicated chunks."""
+    reader = csv.DictReader(csvfile)
+    chunk = {}
+    for i, row in enumerate(reader, start=2):
+        entry_data = _parse_row(i, row, valid_country_codes)
+        if entry_data is None:
+            stats.skipped += 1
+            continue
+        if _keep_entry(i, entry_data, chunk):
+            chunk[(entry_data["country_code"], entry_data["year"])] = entry_data
+        if len(chunk) >= chunk_size:
+            yield list(chunk.values())
+            chunk = {}
+    if chunk:
+        yield list(chunk.values())
+
+
+# --- Columnar parsing ---
+
+NULL_SENTINELS = ("", "na", "n/a", "..", "null")
+
+
+def cast_column(column: pd.Series, cast_to: Type) -> tuple[pd.Series, int]:
+    """
+    Vectorized counterpart of `_safe_cast` for a whole column of raw strings.
+    Returns the cast column (missing values as NA) and the number of rejected cells,
+    i.e. non-null cells that could not be converted.
+    """
+    is_null = column.isna()
+    if cast_to is not str:
+        try:
+            # Fast path for clean columns; float() already ignores surrounding whitespace.
+            return _as_type(column.astype("float64"), cast_to), 0
+        except ValueError:
+            pass
+
+    stripped = column.str.strip()
+    is_null |= stripped.str.lower().isin(NULL_SENTINELS)
+    cleaned = stripped.str.replace(",", "", regex=False).mask(is_null)
+
+    if cast_to is str:
+        return cleaned, 0
+
+    # to_numeric only locates the bad cells; its parser is not round-trip exact like float().
+    bad = pd.to_numeric(cleaned, errors="coerce").isna() & ~is_null
+    values = cleaned.mask(bad).astype("float64")
+    return _as_type(values, cast_to), int(bad.sum())
+
+
+def _as_type(values: pd.Series, cast_to: Type) -> pd.Series:
+    if cast_to is int:
+        # Same truncation as int(float(...)).
+        return np.trunc(values).astype("Int64")
+    return values
+
+
+def to_records(chunk: pd.DataFrame) -> list[dict]:
+    """Converts a cast chunk to plain-Python row dicts with None for missing values."""
+    names = list(chunk.columns)
+    columns = [chunk[col].astype(object).where(chunk[col].notna(), None).tolist() for col in names]
+    return [dict(zip(names, values)) for values in zip(*columns)]
+
+
+def _column_chunks(csvfile, valid_country_codes: set, chunk_size: int, stats: ImportStats) -> Iterator[list[dict]]:
+    """
+    Parses the CSV in batches of `chunk_size` rows, casting each mapped column as a
+    whole instead of cell by cell. Rejected cells and skipped rows are counted and
+    logged once at the end instead of one warning per row.
+    """
+    header = next(csv.reader(csvfile))
+    csvfile.seek(0)
+    columns = {csv_header: attr for csv_header, attr in HEADER_MAP.items()
+               if csv_header in header and attr not in ("country_code", "year")}
+    usecols = [col for col in header if col in HEADER_MAP or col == "name"]
+    rejected = dict.fromkeys(columns.values(), 0)
+    missing_key, unknown_codes = 0, collections.Counter()
+
+    # Only empty cells become NaN here; "NA" must survive as Namibia's country code.
+    reader = pd.read_csv(csvfile, usecols=usecols, dtype=str, keep_default_na=False, na_values=[""],
+                         chunksize=chunk_size)
+    for raw in reader:
+        empty = pd.Series(np.nan, index=raw.index, dtype=object)
+
+        country_code = raw.get("alpha_2", empty).str.strip().str.upper().replace("", None)
+        is_namibia = raw.get("name", empty).str.strip().str.lower() == "namibia"
+        country_code = country_code.mask(country_code.isna() & is_namibia, "NA")
+        year, _ = cast_column(raw.get("year", empty), int)
+
+        has_key = country_code.notna() & year.notna() & (year != 0)
+        missing_key += int((~has_key & raw.notna().any(axis=1)).sum())
+        is_known = country_code.isin(valid_country_codes)
+        unknown_codes.update(country_code[has_key & ~is_known])
+        keep = has_key & is_known
+        stats.skipped += int((~keep).sum())
+
+        chunk = pd.DataFrame({"country_code": country_code[keep], "year": year[keep]})
+        for csv_header, attr in columns.items():
+            chunk[attr], bad = cast_column(raw.loc[keep, csv_header], TYPE_MAP[attr])
+            rejected[attr] += bad
+        for attr in HEADER_MAP.values():
+            if attr not in chunk:
+                chunk[attr] = None
+
+        duplicated = chunk.duplicated(["country_code", "year"], keep=False)
+        entries = {(row["country_code"], row["year"]): row for row in to_records(chunk[~duplicated])}
+        # Duplicates are rare, so resolve them with the row-wise rule.
+        for i, row in zip(chunk.index[duplicated], to_records(chunk[duplicated])):
+            if _keep_entry(i + 2, row, entries):
+                entries[(row["country_code"], row["year"])] = row
+        yield list(entries.values())
+
+    if missing_key:
+        logging.warning(f"Skipped {missing_key} rows: Missing primary key data (country_code or year).")
+    for code, count in unknown_codes.items():
+        logging.warning(f"Skipped {count} rows: Code '{code}' not in database.")
+    for attr, count in rejected.items():
+        if count:
+            logging.warning(f"Column '{attr}': {count} cells could not be cast to {TYPE_MAP[attr].__name__}.")
+
+
+@tracing.traced("import.bulk_import_data")
+def bulk_import_data(csv_path: pathlib.Path, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     columnar: bool = True, bind: Optional[sqlalchemy.Engine] = None) -> Optional[ImportStats]:
+    """
+    Streams the CSV into the database in chunks of `chunk_size` rows using
+    Core-level executemany upserts, so existing (country_code, year) rows are
+    updated in place instead of failing the import.
+
+    Only one chunk is held in memory at a time. Duplicate keys are resolved within
+    a chunk the same way as `import_data`; across chunks the later row wins.
+    All chunks are written in one transaction on the "bulk_write" engine profile. With `columnar` the chunks are
+    parsed column-wise, otherwise row by row with `_safe_cast`. `bind` overrides the target engine.
+    """
+    if not csv_path.exists():
+        logging.error(f"File not found: {csv_path}")
+        return None
+
+    valid_country_codes = fetch_country_codes(bind)
+    if valid_country_codes is None:
+        return None
+
+    logging.info(f"Starting bulk import from {csv_path} (chunk size {chunk_size})...")
+
+    stats = ImportStats()
+    parse_chunks = _column_chunks if columnar else _row_chunks
+    with open(csv_path, mode="r", encoding="utf-8-sig") as csvfile:
+        return write_chunks(parse_chunks(csvfile, valid_country_codes, chunk_size, stats), bind, stats)
+
+
+def write_chunks(chunks: Iterable[list[dict]], bind: Optional[sqlalchemy.Engine] = None,
+                 stats: Optional[ImportStats] = None) -> Optional[ImportStats]:
+    """
+    Upserts chunks of `DataEntry` row dicts (keyed by model attribute, every row
+    with the same keys) in one transaction on the "bulk_write" engine profile or
+    `bind`. Chunks are pulled one at a time, so a generator can stream rows in
+    without the whole input in memory. Returns None after rolling back on error.
+    """
+    stats = stats or ImportStats()
+    stmt = upsert_statement()
+    bind = bind or get_engine("bulk_write")
+    try:
+        with bind.begin() as connection:
+            for rows in chunks:
+                if rows:
+                    with tracing.span("import.flush_chunk", rows=len(rows)):
+                        _flush_chunk(connection, stmt, rows, stats)
+    except Exception as e:
+        logging.error(f"Error during bulk import: {e}", exc_info=True)
+        logging.error("Transaction rolled back. No data was saved.")
+        return None
+
+    logging.info(
+        f"Bulk import completed: {stats.inserted} inserted, {stats.updated} updated, "
+        f"{stats.unchanged} unchanged, {stats.skipped} skipped."
+    )
+    if stats.inserted or stats.updated:
+        refresh_features(bind)
+    return stats
 
 
-def main():
+def main(argv: list[str] | None = None):
     """Main function to parse command-line arguments and run the importer."""
     parser = argparse.ArgumentParser(
         description="A script to import country data from a CSV file into the database.",
@@ -194,9 +487,30 @@ def main():
         type=pathlib.Path,
         help="Path to the CSV file to import."
     )
-    args = parser.parse_args()
-
-    import_data(args.csv_file)
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Stream the file in chunks and upsert rows, updating existing (country_code, year) entries."
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Rows per executemany batch in bulk mode."
+    )
+    parser.add_argument(
+        "--row-parser",
+        action="store_true",
+        help="In bulk mode, parse row by row instead of column-wise."
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    database.create_schema()
+    if args.bulk:
+        bulk_import_data(args.csv_file, chunk_size=args.chunk_size, columnar=not args.row_parser)
+    else:
+        import_data(args.csv_file)
 
 
 if __name__ == "__main__":
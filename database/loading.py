@@ -0,0 +1,80 @@
+"""
+Named loader profiles for the Country <-> DataEntry relationships.
+
+Both relationships load lazily by default. A profile returns a SELECT with the
+loader options for one access pattern, so callers choose per query how much of
+the panel comes along:
+
+    with sessions() as session:
+        countries = session.scalars(loader_query("countries_only")).all()
+        recent = session.scalars(loader_query("country_with_last_n_years", n=5)).all()
+
+Run this module to print how many SQL statements each profile emits.
+"""
+import contextlib
+from typing import Callable
+
+import sqlalchemy
+from sqlalchemy import event, orm
+
+from database import models
+
+
+def _countries_only() -> sqlalchemy.Select:
+    # raiseload turns an accidental per-country records access into an error instead of N queries.
+    return sqlalchemy.select(models.Country).options(orm.raiseload(models.Country.records))
+
+
+def _panel_only() -> sqlalchemy.Select:
+    return sqlalchemy.select(models.DataEntry).options(orm.raiseload(models.DataEntry.country))
+
+
+def _panel_with_country() -> sqlalchemy.Select:
+    return sqlalchemy.select(models.DataEntry).options(orm.joinedload(models.DataEntry.country))
+
+
+def _country_with_last_n_years(n: int) -> sqlalchemy.Select:
+    """Countries with `records` holding only the last `n` years of the whole panel."""
+    cutoff = sqlalchemy.select(sqlalchemy.func.max(models.DataEntry.year) - n).scalar_subquery()
+    return sqlalchemy.select(models.Country).options(
+        orm.selectinload(models.Country.records.and_(models.DataEntry.year > cutoff)),
+        orm.raiseload(models.Country.records, models.DataEntry.country),
+    )
+
+
+LOADER_PROFILES: dict[str, Callable[..., sqlalchemy.Select]] = {
+    "countries_only": _countries_only,
+    "panel_only": _panel_only,
+    "panel_with_country": _panel_with_country,
+    "country_with_last_n_years": _country_with_last_n_years,
+}
+
+
+def loader_query(profile: str, **kwargs) -> sqlalchemy.Select:
+    """SELECT for a named loader profile; `kwargs` are passed to the profile (e.g. `n`)."""
+    return LOADER_PROFILES[profile](**kwargs)
+
+
+@contextlib.contextmanager
+def count_statements(bind: sqlalchemy.Engine):
+    """Counts the SQL statements executed on `bind` inside the block: `with count_statements(e) as n: ...; n[0]`."""
+    counter = [0]
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        counter[0] += 1
+
+    event.listen(bind, "before_cursor_execute", _count)
+    try:
+        yield counter
+    finally:
+        event.remove(bind, "before_cursor_execute", _count)
+
+
+if __name__ == "__main__":
+    from database import engine, sessions
+
+    for name, kwargs in [("countries_only", {}), ("panel_only", {}), ("panel_with_country", {}),
+                         ("country_with_last_n_years", {"n": 5})]:
+        with sessions() as session, count_statements(engine) as statements:
+            rows = session.scalars(loader_query(name, **kwargs)).unique().all()
+        print(f"{name:<28} {len(rows):>6} objects  {statements[0]} statement(s)")
@@ -12,7 +12,12 @@ class Base(orm.DeclarativeBase):
 
 class DataEntry(Base):
     __tablename__ = "data"
-    __table_args__ = {"sqlite_strict": True, "comment": "Core Time-Serialized data entries"}
+    __table_args__ = (
+        # Cross-sectional reads ("all countries in year Y", year ranges) seek on year; the primary key
+        # only serves per-country reads. Covers the GDP / population projection without touching the table.
+        sqlalchemy.Index("ix_data_year", "year", "country_code", "gdp", "population"),
+        {"sqlite_strict": True, "comment": "Core Time-Serialized data entries"},
+    )
     country_code: orm.Mapped[str] = orm.mapped_column(sqlalchemy.ForeignKey("countries.country_code"),
                                                       comment="ISO 3166-1 alpha-2", primary_key=True)
     year: orm.Mapped[int] = orm.mapped_column(primary_key=True, comment="Statistic for specified year.")
@@ -49,7 +54,7 @@ class DataEntry(Base):
     # literacy_rate: orm.Mapped[float|None] = orm.mapped_column(comment="Literacy rate, youth (ages 15-24), gender parity index (GPI)")
 
     # Relationship
-    country: orm.Mapped["Country"] = orm.relationship(back_populates="records", lazy="selectin")
+    country: orm.Mapped["Country"] = orm.relationship(back_populates="records", lazy="select")
 
 class Country(Base):
     """Used to declare constants regarding each country itself."""
@@ -60,4 +65,61 @@ class Country(Base):
     lat: orm.Mapped[float] = orm.mapped_column(nullable=False, comment="Latitude.")
     lng: orm.Mapped[float] = orm.mapped_column(nullable=False, comment="Longitude.")
 
-    records: orm.Mapped[list["DataEntry"]] = orm.relationship(back_populates="country", lazy="selectin")
\ No newline at end of file
+    records: orm.Mapped[list["DataEntry"]] = orm.relationship(back_populates="country", lazy="select")
+
+class DataRevision(Base):
+    """
+    Change counter of the data table: one row, bumped by the `DATA_REVISION_TRIGGERS`
+    on every insert, update and delete. Snapshots and cached fits are keyed by it.
+    """
+    __tablename__ = "data_revision"
+    __table_args__ = {"sqlite_strict": True, "comment": "Write counter of the data table."}
+    id: orm.Mapped[int] = orm.mapped_column(primary_key=True, comment="Always 1")
+    token: orm.Mapped[str] = orm.mapped_column(comment="Random id of this database, so two files never share a revision")
+    revision: orm.Mapped[int] = orm.mapped_column(comment="Number of row writes to the data table")
+
+
+# SQLite has no statement-level triggers; bumping a one-row table per written row is cheap next to the write itself.
+DATA_REVISION_TRIGGERS = [
+    f"CREATE TRIGGER IF NOT EXISTS data_revision_{event.lower()} AFTER {event} ON {DataEntry.__tablename__} "
+    f"BEGIN UPDATE {DataRevision.__tablename__} SET revision = revision + 1; END"
+    for event in ("INSERT", "UPDATE", "DELETE")
+]
+
+class ForecastMetrics(Base):
+    """One published model version: what it was fitted on and how it scored on the held-out years."""
+    __tablename__ = "forecast_metrics"
+    __table_args__ = {"sqlite_strict": True, "comment": "Published forecast model versions and their test metrics."}
+    model_version: orm.Mapped[str] = orm.mapped_column(primary_key=True, comment="Model kind and fit hash, e.g. LGBM-3f9a0c1d2e4b")
+    kind: orm.Mapped[str] = orm.mapped_column(comment="MLR or LGBM")
+    features: orm.Mapped[str] = orm.mapped_column(comment="JSON list of the model's features")
+    training_end: orm.Mapped[int] = orm.mapped_column(comment="Last training year")
+    published_at: orm.Mapped[str] = orm.mapped_column(comment="UTC time of publishing, ISO 8601")
+    rmse: orm.Mapped[float | None] = orm.mapped_column(comment="One-step test RMSE of GDP per capita")
+    r2: orm.Mapped[float | None] = orm.mapped_column(comment="One-step test R² of log GDP per capita")
+    rmse_recursive_final: orm.Mapped[float | None] = orm.mapped_column(comment="Recursive RMSE in the final test year")
+    r2_recursive_final: orm.Mapped[float | None] = orm.mapped_column(comment="Recursive R² in the final test year")
+
+    forecasts: orm.Mapped[list["Forecast"]] = orm.relationship(back_populates="model", lazy="select")
+
+
+class Forecast(Base):
+    """A precomputed recursive forecast: `horizon` years after the last year the model was given data for."""
+    __tablename__ = "forecasts"
+    __table_args__ = (
+        # Dashboard maps ("all countries in year Y under model M") seek on the year; the primary key
+        # serves per-country trajectories. Covers every column, so neither read touches the table.
+        sqlalchemy.Index("ix_forecasts_model_year", "model_version", "target_year", "country_code", "horizon",
+                         "gdp_per_capita", "actual"),
+        {"sqlite_strict": True, "sqlite_with_rowid": False, "comment": "Published GDP per capita forecasts"},
+    )
+    model_version: orm.Mapped[str] = orm.mapped_column(sqlalchemy.ForeignKey("forecast_metrics.model_version"),
+                                                       primary_key=True)
+    country_code: orm.Mapped[str] = orm.mapped_column(sqlalchemy.ForeignKey("countries.country_code"),
+                                                      primary_key=True, comment="ISO 3166-1 alpha-2")
+    target_year: orm.Mapped[int] = orm.mapped_column(primary_key=True, comment="Year forecast")
+    horizon: orm.Mapped[int] = orm.mapped_column(primary_key=True, comment="Years after the last observed year")
+    gdp_per_capita: orm.Mapped[float] = orm.mapped_column(comment="Forecast GDP per capita")
+    actual: orm.Mapped[float | None] = orm.mapped_column(comment="Observed GDP per capita, where known")
+
+    model: orm.Mapped["ForecastMetrics"] = orm.relationship(back_populates="forecasts", lazy="select")
@@ -0,0 +1,69 @@
+"""
+Typed, column-oriented reads of the data table.
+
+These bypass the ORM: rows come straight from a Core SELECT and are returned
+either as NumPy arrays per column or as plain tuples.
+
+Usage:
+    panel = read_panel(["gdp", "population"], years=(2000, 2010))
+    panel["gdp"]  # float64 array, aligned with panel["country_code"] and panel["year"]
+"""
+from typing import Iterable, Literal
+
+import numpy as np
+import sqlalchemy
+from sqlalchemy import Engine
+
+import database
+from database import models
+
+_DTYPES = {sqlalchemy.REAL: np.float64, sqlalchemy.INTEGER: np.int64, sqlalchemy.TEXT: object}
+
+
+def panel_query(columns: Iterable[str], countries: Iterable[str] | None = None,
+                years: tuple[int, int] | None = None) -> sqlalchemy.Select:
+    """
+    SELECT of the key columns plus `columns`, filtered by country set and inclusive year range.
+    Rows are ordered by (year, country_code) for pure year-range slices, else by (country_code, year).
+    """
+    table = models.DataEntry.__table__
+    selected = ["country_code", "year"] + [col for col in columns if col not in ("country_code", "year")]
+    query = sqlalchemy.select(*(table.c[col] for col in selected))
+    if countries is not None:
+        query = query.where(table.c.country_code.in_(list(countries)))
+    if years is not None:
+        query = query.where(table.c.year.between(*years))
+    if countries is None and years is not None:
+        # Cross-sectional slice: year-major order walks ix_data_year instead of scanning the primary key.
+        return query.order_by(table.c.year, table.c.country_code)
+    return query.order_by(table.c.country_code, table.c.year)
+
+
+def column_dtype(column: sqlalchemy.Column):
+    """NumPy dtype for a table column's values; nullable integers become float64 so NULL reads as NaN."""
+    for sql_type, dtype in _DTYPES.items():
+        if isinstance(column.type, sql_type):
+            return dtype if not column.nullable else (np.float64 if dtype is np.int64 else dtype)
+    return object
+
+
+def read_panel(columns: Iterable[str], countries: Iterable[str] | None = None,
+               years: tuple[int, int] | None = None, as_: Literal["arrays", "records"] = "arrays",
+               bind: Engine | None = None) -> dict[str, np.ndarray] | list[tuple]:
+    """
+    Reads `columns` for the given countries and inclusive (start, end) year range.
+
+    Returns {column: array} including "country_code" and "year" (as_="arrays"),
+    or a list of (country_code, year, *columns) tuples (as_="records").
+    Uses the read-only engine profile unless `bind` is given.
+    """
+    query = panel_query(columns, countries, years)
+    with (bind or database.get_engine("read")).connect() as connection:
+        rows = connection.execute(query).all()
+    if as_ == "records":
+        return [tuple(row) for row in rows]
+
+    table = models.DataEntry.__table__
+    names = [col.name for col in query.selected_columns]
+    values = list(zip(*rows)) if rows else [()] * len(names)
+    return {name: np.array(value, dtype=column_dtype(table.c[name])) for name, value in zip(names, values)}
@@ -0,0 +1,153 @@
+"""
+Columnar on-disk snapshots of frames derived from the database.
+
+A snapshot is a directory holding one `.npy` file per column plus a small JSON
+header. Columns are memory-mapped on load, so reading a snapshot costs an mmap
+instead of a full SQL scan. Snapshots are keyed by the data table's revision
+(`data_version`), a counter that triggers bump on every write to the table, and
+are rebuilt only when the data changes; writes to other tables, such as
+materialized features or published forecasts, keep them.
+
+Usage:
+    version = snapshot.data_version()
+    frame = snapshot.cached_frame("panel", build_panel, version)  # build_panel(session) -> DataFrame
+"""
+import functools
+import hashlib
+import json
+import logging
+import pathlib
+import shutil
+import sqlite3
+import tempfile
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+import database
+from database import models
+
+SNAPSHOT_DIR = database.BASE_DIR / "snapshots"
+
+_HEADER_FILE = "snapshot.json"
+_INDEX_FILE = "__index__.npy"
+_EMPTY_VERSION = "empty"
+
+
+def data_version(db_path: pathlib.Path = database.DB_PATH) -> str:
+    """
+    Version of the data table, which every snapshot and fitted model is derived
+    from: the database's token and its write counter (`models.DataRevision`),
+    one indexed row read over a read-only connection. "empty" if the database
+    or the data table doesn't exist yet.
+
+    Callers compute it once per run and pass it on (`cached_frame(version=...)`,
+    `ArtifactStore(data_version=...)`).
+    """
+    if not db_path.exists():
+        return _EMPTY_VERSION
+    connection = sqlite3.connect(f"file:{db_path.resolve().as_posix()}?mode=ro", uri=True)
+    try:
+        try:
+            row = connection.execute(
+                f"SELECT token, revision FROM {models.DataRevision.__tablename__} WHERE id = 1"
+            ).fetchone()
+        except sqlite3.OperationalError as e:
+            if "no such table" not in str(e):
+                raise
+            row = None
+        if row is not None:
+            return f"{row[0]}-{row[1]}"
+        # Databases from before the revision counter; `create_schema` adds it.
+        _warn_untracked(db_path)
+        return _content_hash(connection)
+    finally:
+        connection.close()
+
+
+@functools.cache
+def _warn_untracked(db_path: pathlib.Path):
+    logging.warning(f"{db_path} has no data revision counter; hashing the data table instead. "
+                    f"Run `python cli.py init-db` to add it.")
+
+
+def _content_hash(connection: sqlite3.Connection) -> str:
+    """Content hash of the data table's rows."""
+    digest = hashlib.sha256()
+    try:
+        cursor = connection.execute(f"SELECT * FROM {models.DataEntry.__tablename__} ORDER BY country_code, year")
+    except sqlite3.OperationalError as e:
+        if "no such table" not in str(e):
+            raise
+        return _EMPTY_VERSION
+    digest.update(repr([column[0] for column in cursor.description]).encode())
+    # repr round-trips floats exactly, so equal rows always hash equal.
+    for rows in iter(lambda: cursor.fetchmany(10_000), []):
+        digest.update(repr(rows).encode())
+    return digest.hexdigest()[:16]
+
+
+def write_frame(df: pd.DataFrame, directory: pathlib.Path) -> pathlib.Path:
+    """Writes every column (and the index) of `df` to `directory` as one `.npy` file each."""
+    directory.mkdir(parents=True, exist_ok=True)
+    np.save(directory / _INDEX_FILE, df.index.to_numpy())
+    for position, column in enumerate(df.columns):
+        values = df[column].to_numpy()
+        if values.dtype == object:
+            # Fixed-width strings can be memory-mapped, Python objects can't.
+            values = values.astype(str)
+        np.save(directory / f"{position}.npy", values)
+    header = {"columns": list(df.columns), "rows": len(df)}
+    (directory / _HEADER_FILE).write_text(json.dumps(header))
+    return directory
+
+
+def read_frame(directory: pathlib.Path) -> pd.DataFrame:
+    """Loads a frame written by `write_frame`, memory-mapping its numeric columns read-only."""
+    header = json.loads((directory / _HEADER_FILE).read_text())
+    data = {
+        column: np.load(directory / f"{position}.npy", mmap_mode="r")
+        for position, column in enumerate(header["columns"])
+    }
+    return pd.DataFrame(data, index=np.load(directory / _INDEX_FILE), copy=False)
+
+
+def snapshot_path(name: str, version: str) -> pathlib.Path:
+    return SNAPSHOT_DIR / name / version
+
+
+def cached_frame(name: str, build: Callable[..., pd.DataFrame], version: str | None = None) -> pd.DataFrame:
+    """
+    Returns the snapshot `name` for the current data version, building it with
+    `build(session)` and replacing older versions when it is missing.
+    """
+    version = version or data_version()
+    path = snapshot_path(name, version)
+    if (path / _HEADER_FILE).exists():
+        logging.debug(f"Loading snapshot '{name}' ({version}).")
+        return read_frame(path)
+
+    logging.info(f"Building snapshot '{name}' for data version {version}...")
+    with database.sessions() as session:
+        df = build(session)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write next to the target and rename, so readers never see a partial snapshot.
+    staging = pathlib.Path(tempfile.mkdtemp(prefix=f".{version}-", dir=path.parent))
+    write_frame(df, staging)
+    try:
+        staging.rename(path)
+    except OSError:
+        # Another process published the same version first.
+        shutil.rmtree(staging, ignore_errors=True)
+
+    for stale in path.parent.iterdir():
+        if stale != path and not stale.name.startswith("."):
+            shutil.rmtree(stale, ignore_errors=True)
+    return read_frame(path)
+
+
+def clear(name: str | None = None):
+    """Deletes all snapshots, or only those of `name`."""
+    shutil.rmtree(SNAPSHOT_DIR / name if name else SNAPSHOT_DIR, ignore_errors=True)
@@ -0,0 +1,155 @@
+"""
+Dense country x year x feature panel.
+
+`PanelTensor` holds the panel as one contiguous array of shape
+(countries, years, features) with a (countries, years) validity mask marking
+which country-years exist. Countries are sorted and years form a contiguous
+range, so a country, year or feature maps to its position in constant time and
+every slice by country, year, year range or feature is a NumPy view.
+
+Usage:
+    panel = PanelTensor.from_frame(df_clean, ["gdp", "hci"])
+    panel.year(2015)                    # (countries, features) view
+    panel.countries_present(2015, 2020)  # countries with a row in every year of the range
+    panel.to_frame()                    # back to long format
+    PanelTensor.from_sql(["gdp", "population"], years=(2000, 2020))
+"""
+import dataclasses
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import Engine
+
+import database
+from database import models
+from database.importer import refresh_features, upsert_statement
+from database.query import read_panel
+
+
+@dataclasses.dataclass
+class PanelTensor:
+    values: np.ndarray      # (countries, years, features), NaN where invalid
+    valid: np.ndarray       # (countries, years) bool: the country-year exists
+    countries: np.ndarray   # sorted country codes
+    years: np.ndarray       # contiguous year range
+    features: list[str]
+
+    def __post_init__(self):
+        self._country_index = {code: i for i, code in enumerate(self.countries)}
+        self._feature_index = {name: i for i, name in enumerate(self.features)}
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return self.values.shape
+
+    # --- Index maps ---
+
+    def country_pos(self, code: str) -> int:
+        return self._country_index[code]
+
+    def year_pos(self, year: int) -> int:
+        position = int(year) - int(self.years[0])
+        if not 0 <= position < len(self.years):
+            raise KeyError(f"Year {year} outside {self.years[0]}-{self.years[-1]}")
+        return position
+
+    def feature_pos(self, name: str) -> int:
+        return self._feature_index[name]
+
+    # --- Views ---
+
+    def year(self, year: int) -> np.ndarray:
+        """(countries, features) view of one year; check `present(year)` for which rows exist."""
+        return self.values[:, self.year_pos(year)]
+
+    def country(self, code: str) -> np.ndarray:
+        """(years, features) view of one country."""
+        return self.values[self.country_pos(code)]
+
+    def feature(self, name: str) -> np.ndarray:
+        """(countries, years) view of one feature."""
+        return self.values[:, :, self.feature_pos(name)]
+
+    def present(self, year: int) -> np.ndarray:
+        """Validity mask of one year (a view)."""
+        return self.valid[:, self.year_pos(year)]
+
+    def window(self, start: int, end: int) -> "PanelTensor":
+        """The inclusive year range start..end as a PanelTensor of views."""
+        first, last = self.year_pos(start), self.year_pos(end) + 1
+        return PanelTensor(self.values[:, first:last], self.valid[:, first:last], self.countries,
+                           self.years[first:last], self.features)
+
+    def countries_present(self, start: int, end: int) -> np.ndarray:
+        """Countries with a row in every year from start to end (inclusive)."""
+        first, last = self.year_pos(start), self.year_pos(end) + 1
+        return self.countries[self.valid[:, first:last].all(axis=1)]
+
+    # --- Conversions ---
+
+    @classmethod
+    def from_arrays(cls, codes: np.ndarray, years: np.ndarray, columns: dict[str, np.ndarray],
+                    dtype=np.float64) -> "PanelTensor":
+        """Builds the tensor from aligned long-format arrays (one entry per country-year)."""
+        countries, country_idx = np.unique(np.asarray(codes), return_inverse=True)
+        years = np.asarray(years, dtype=np.int64)
+        first = int(years.min()) if len(years) else 0
+        span = int(years.max()) - first + 1 if len(years) else 0
+        year_idx = years - first
+
+        features = list(columns)
+        values = np.full((len(countries), span, len(features)), np.nan, dtype=dtype)
+        for position, name in enumerate(features):
+            values[country_idx, year_idx, position] = columns[name]
+        valid = np.zeros((len(countries), span), dtype=bool)
+        valid[country_idx, year_idx] = True
+        return cls(values, valid, countries, np.arange(first, first + span), features)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, features: Iterable[str] | None = None, country_col: str = "country_code",
+                   year_col: str = "year", dtype=np.float64) -> "PanelTensor":
+        """Builds the tensor from a long-format frame; `features` defaults to every numeric column."""
+        if features is None:
+            features = [col for col in df.select_dtypes("number").columns if col not in (country_col, year_col)]
+        columns = {name: df[name].to_numpy(dtype=dtype) for name in features}
+        return cls.from_arrays(df[country_col].to_numpy(), df[year_col].to_numpy(), columns, dtype)
+
+    @classmethod
+    def from_sql(cls, features: Iterable[str], countries: Iterable[str] | None = None,
+                 years: tuple[int, int] | None = None, bind: Engine | None = None,
+                 dtype=np.float64) -> "PanelTensor":
+        """Reads `features` of the data table (see `read_panel`) straight into a tensor."""
+        arrays = read_panel(features, countries=countries, years=years, bind=bind)
+        codes, year_values = arrays.pop("country_code"), arrays.pop("year")
+        return cls.from_arrays(codes, year_values, arrays, dtype)
+
+    def to_frame(self, country_col: str = "country_code", year_col: str = "year") -> pd.DataFrame:
+        """Long-format frame of the valid country-years, ordered by country then year."""
+        country_idx, year_idx = np.nonzero(self.valid)
+        frame = pd.DataFrame({country_col: self.countries[country_idx], year_col: self.years[year_idx]})
+        for position, name in enumerate(self.features):
+            frame[name] = self.values[country_idx, year_idx, position]
+        return frame
+
+    def to_sql(self, bind: Engine | None = None) -> int:
+        """
+        Upserts the valid country-years into the data table and returns the row
+        count. The tensor must hold every value column of the table. Like the
+        importers, refreshes a materialized feature table afterwards.
+        """
+        table = models.DataEntry.__table__
+        missing = [col.name for col in table.columns if not col.primary_key and col.name not in self._feature_index]
+        if missing:
+            raise ValueError(f"The data table also needs: {missing}")
+        frame = self.to_frame()[[col.name for col in table.columns]]
+        for col in table.columns:
+            if isinstance(col.type, sqlalchemy.INTEGER) and col.name != "year":
+                frame[col.name] = frame[col.name].round().astype(np.int64)
+        records = frame.to_dict("records")
+        bind = bind or database.get_engine("bulk_write")
+        with bind.begin() as connection:
+            connection.execute(upsert_statement(), records)
+        refresh_features(bind)
+        return len(records)
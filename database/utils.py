@@ -1,28 +1,31 @@
+import functools
 import json
+import types
 import database
-from database import models
+from database import codes, models
 
 from pycountry import countries
 
 
 def get_country(name: str):
-    return countries.search_fuzzy(name)[0]
+    # Resolved (and cached) by the shared name table; Kosovo's "XK" isn't in pycountry.
+    alpha2 = codes.name_to_alpha2(name)
+    return countries.get(alpha_2=alpha2) or types.SimpleNamespace(alpha_2=alpha2)
 
+@functools.lru_cache(maxsize=1024)
 def code_based_get(alpha3: str):
     rs = countries.get(alpha_3=alpha3)
     if rs:
         return rs
-    rs = lambda: None
-    setattr(rs, "alpha_2", "XX")
-    if alpha3 == "XKX": # Bypass custom Kosovo code
-        setattr(rs, "alpha_2", "XK")
-    return rs
+    # Unknown codes resolve to "XX", except overrides such as Kosovo's "XKX".
+    return types.SimpleNamespace(alpha_2=codes.alpha3_to_alpha2(alpha3))
 
 
 def setup_countrydb():
     print("Setting up country database")
     datb = database.BASE_DIR / ".." / "data" / "countries.json"
     datb = datb.resolve()
+    database.create_schema()
     with database.sessions.begin() as session:
         with open(datb, "rb") as f:
             json_data = json.load(f)
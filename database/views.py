@@ -0,0 +1,264 @@
+"""
+Lag and rolling-window features computed by SQLite next to the data.
+
+Features use the names of `database.feature_names` ("gdp_lagged", "hci_lag2",
+"population_rollmean3", "gdp_growth", ...) and are built from window functions
+over `PARTITION BY country_code ORDER BY year`, so they equal the pandas feature
+store's values without loading the panel. `logged_gdp_pcp` (log GDP per capita,
+the modelling target) can be used like a column of the data table.
+
+The features can be read straight from the window query, published as a SQL
+view (`data_features_v`) for other tools, or materialized into the
+`data_features` table. The importers refresh a materialized table after every
+import, and reads use it whenever it holds the requested features.
+
+Usage:
+    read_features(["gdp_lagged", "hci_lagged"], year=2015)   # arrays in (country_code, year) order
+    python -m database.views materialize                     # every column's _lagged feature
+    python -m database.views materialize gdp_rollmean3 gdp_growth
+    python -m database.views show 2015 gdp_lagged hci_lagged
+    python cli.py features refresh
+"""
+import argparse
+from typing import Iterable, Literal
+
+import numpy as np
+import sqlalchemy
+from sqlalchemy import Engine, func
+
+import database
+from database import models
+from database.feature_names import FeatureSpec, parse_feature
+from database.query import column_dtype
+
+VIEW_NAME = "data_features_v"
+TABLE_NAME = "data_features"
+KEY_COLUMNS = ("country_code", "year")
+
+# Derived columns as `forecasting.experiment.load_panel` adds them: name -> SQL expression over the data table.
+DERIVED_COLUMNS = {
+    "logged_gdp_pcp": lambda table: func.ln(table.c.gdp),
+}
+
+VALUE_COLUMNS = [col.name for col in models.DataEntry.__table__.columns if not col.primary_key]
+DEFAULT_FEATURES = [f"{col}_lagged" for col in VALUE_COLUMNS + list(DERIVED_COLUMNS)]
+
+
+def _specs(names: Iterable[str]) -> list[FeatureSpec]:
+    specs = [parse_feature(name) for name in dict.fromkeys(names)]
+    unknown = {spec.column for spec in specs} - set(VALUE_COLUMNS) - set(DERIVED_COLUMNS)
+    if unknown:
+        raise KeyError(f"Columns not in the data table: {sorted(unknown)}")
+    return specs
+
+
+def _base(specs: list[FeatureSpec], countries: Iterable[str] | None) -> sqlalchemy.Subquery:
+    """The data table plus derived columns and, for rolling std, per-country centred copies of the source columns."""
+    table = models.DataEntry.__table__
+    columns = [table.c[name] for name in KEY_COLUMNS + tuple(VALUE_COLUMNS)]
+    columns += [expression(table).label(name) for name, expression in DERIVED_COLUMNS.items()]
+    query = sqlalchemy.select(*columns)
+    if countries is not None:
+        # Windows never cross countries, so the country filter can be applied before them.
+        query = query.where(table.c.country_code.in_(list(countries)))
+    base = query.subquery("base")
+
+    centred = {spec.column for spec in specs if spec.kind == "rollstd"}
+    if not centred:
+        return base
+    # Centring keeps the sum-of-squares variance below numerically stable for large values such as population.
+    means = {name: base.c[name] - func.avg(base.c[name]).over(partition_by=base.c.country_code)
+             for name in sorted(centred)}
+    centred_columns = (value.label(f"_centred_{name}") for name, value in means.items())
+    return sqlalchemy.select(*base.c, *centred_columns).subquery("centred")
+
+
+def _feature(base: sqlalchemy.Subquery, spec: FeatureSpec):
+    """Window expression of one feature; NULL wherever `forecasting.features` gives NaN."""
+    window = {"partition_by": base.c.country_code, "order_by": base.c.year}
+    column = base.c[spec.column]
+
+    def lag(k: int):
+        return func.lag(column, k).over(**window)
+
+    if spec.kind == "lag":
+        return lag(spec.param)
+    if spec.kind == "diff":
+        return lag(1) - lag(2)
+    if spec.kind == "growth":
+        # Growth from zero is NULL, stated outright rather than left to SQLite's division by zero.
+        return lag(1) / func.nullif(lag(2), 0) - 1
+
+    # Rolling windows need `w` previous rows of the same country.
+    w = spec.param
+    enough = func.row_number().over(**window) > w
+    if spec.kind == "rollmean":
+        return sqlalchemy.case((enough, func.avg(column).over(**window, rows=(-w, -1))))
+    centred = base.c[f"_centred_{spec.column}"]
+    total = func.sum(centred).over(**window, rows=(-w, -1))
+    squares = func.sum(centred * centred).over(**window, rows=(-w, -1))
+    variance = (squares - total * total / w) / (w - 1)
+    return sqlalchemy.case((enough, func.sqrt(func.max(variance, 0.0))))
+
+
+def feature_query(names: Iterable[str], countries: Iterable[str] | None = None,
+                  years: tuple[int, int] | None = None, complete_only: bool = False) -> sqlalchemy.Select:
+    """
+    SELECT of the data table, the derived columns and the named features, in
+    (country_code, year) order. Windows run over each country's full history
+    before the year filter, so the first selected year still gets its lags.
+    `complete_only` drops rows with a missing feature, as `load_panel` does.
+    """
+    specs = _specs(names)
+    base = _base(specs, countries)
+    value_columns = VALUE_COLUMNS + list(DERIVED_COLUMNS)
+    features = sqlalchemy.select(
+        *(base.c[name] for name in KEY_COLUMNS + tuple(value_columns)),
+        *(_feature(base, spec).label(spec.name) for spec in specs),
+    ).subquery("features")
+
+    query = sqlalchemy.select(*features.c)
+    if years is not None:
+        query = query.where(features.c.year.between(*years))
+    if complete_only:
+        query = query.where(*(features.c[spec.name].is_not(None) for spec in specs))
+    return query.order_by(features.c.country_code, features.c.year)
+
+
+# --- View and materialized table ---
+
+def materialized_features(bind: Engine | None = None) -> list[str] | None:
+    """Feature names held by the `data_features` table, or None if it doesn't exist."""
+    with (bind or database.engine).connect() as connection:
+        inspector = sqlalchemy.inspect(connection)
+        if not inspector.has_table(TABLE_NAME):
+            return None
+        skip = set(KEY_COLUMNS) | set(VALUE_COLUMNS) | set(DERIVED_COLUMNS)
+        return [col["name"] for col in inspector.get_columns(TABLE_NAME) if col["name"] not in skip]
+
+
+def _feature_table(names: list[str]) -> sqlalchemy.Table:
+    """`data_features` as a Core table: its own metadata, so `create_schema` never creates it."""
+    data = models.DataEntry.__table__
+    columns = [sqlalchemy.Column(col.name, col.type, primary_key=col.primary_key)
+               for col in data.columns]
+    columns += [sqlalchemy.Column(name, sqlalchemy.REAL) for name in list(DERIVED_COLUMNS) + names]
+    return sqlalchemy.Table(TABLE_NAME, sqlalchemy.MetaData(), *columns, sqlite_with_rowid=False)
+
+
+def create_view(names: Iterable[str] = DEFAULT_FEATURES, bind: Engine | None = None):
+    """(Re)creates the `data_features_v` view computing `names` on every read."""
+    sql = feature_query(names).compile(dialect=(bind or database.engine).dialect,
+                                       compile_kwargs={"literal_binds": True})
+    with (bind or database.engine).begin() as connection:
+        connection.exec_driver_sql(f"DROP VIEW IF EXISTS {VIEW_NAME}")
+        connection.exec_driver_sql(f"CREATE VIEW {VIEW_NAME} AS {sql}")
+
+
+def materialize(names: Iterable[str] = DEFAULT_FEATURES, bind: Engine | None = None) -> int:
+    """(Re)builds the `data_features` table with `names` and returns its row count."""
+    names = [spec.name for spec in _specs(names)]
+    table = _feature_table(names)
+    with (bind or database.engine).begin() as connection:
+        table.drop(connection, checkfirst=True)
+        table.create(connection)
+        connection.execute(table.insert().from_select([col.name for col in table.columns], feature_query(names)))
+        return connection.execute(sqlalchemy.select(func.count()).select_from(table)).scalar_one()
+
+
+def refresh(bind: Engine | None = None) -> int | None:
+    """Recomputes a materialized `data_features` table with its current features; None if there is none."""
+    names = materialized_features(bind)
+    if names is None:
+        return None
+    return materialize(names, bind)
+
+
+def drop(bind: Engine | None = None):
+    with (bind or database.engine).begin() as connection:
+        connection.exec_driver_sql(f"DROP VIEW IF EXISTS {VIEW_NAME}")
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {TABLE_NAME}")
+
+
+# --- Reads ---
+
+def read_features(names: Iterable[str], year: int | None = None, countries: Iterable[str] | None = None,
+                  years: tuple[int, int] | None = None, complete_only: bool = False,
+                  as_: Literal["arrays", "records"] = "arrays",
+                  bind: Engine | None = None) -> dict[str, np.ndarray] | list[tuple]:
+    """
+    Model-ready rows of the key columns and the named features for one `year`
+    (or an inclusive `years` range) in (country_code, year) order.
+
+    Served from the materialized table when it holds every requested feature,
+    otherwise computed by the window query. Returns {column: array}, missing
+    values as NaN (as_="arrays"), or (country_code, year, *names) tuples
+    (as_="records"). Uses the read-only engine profile unless `bind` is given.
+    """
+    names = [spec.name for spec in _specs(names)]
+    if year is not None:
+        years = (year, year)
+    bind = bind or database.get_engine("read")
+
+    materialized = materialized_features(bind) or []
+    if set(names) <= set(materialized):
+        table = _feature_table(materialized)
+        source = sqlalchemy.select(*(table.c[name] for name in KEY_COLUMNS + tuple(names)))
+        if countries is not None:
+            source = source.where(table.c.country_code.in_(list(countries)))
+        if years is not None:
+            source = source.where(table.c.year.between(*years))
+        if complete_only:
+            source = source.where(*(table.c[name].is_not(None) for name in names))
+        query = source.order_by(table.c.country_code, table.c.year)
+    else:
+        computed = feature_query(names, countries, years, complete_only).subquery()
+        query = sqlalchemy.select(*(computed.c[name] for name in KEY_COLUMNS + tuple(names)))
+
+    with bind.connect() as connection:
+        rows = connection.execute(query).all()
+    if as_ == "records":
+        return [tuple(row) for row in rows]
+
+    data = models.DataEntry.__table__
+    columns = list(zip(*rows)) if rows else [()] * (len(KEY_COLUMNS) + len(names))
+    arrays = {name: np.array(values, dtype=column_dtype(data.c[name])) for name, values in zip(KEY_COLUMNS, columns)}
+    for name, values in zip(names, columns[len(KEY_COLUMNS):]):
+        arrays[name] = np.array(values, dtype=np.float64)
+    return arrays
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Create, materialize and query the SQL-side feature views.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    for command, help in [("view", "Create the data_features_v view."),
+                          ("materialize", "Build the data_features table.")]:
+        commands.add_parser(command, help=help).add_argument(
+            "features", nargs="*", help="Feature names (default: every column's _lagged feature).")
+    commands.add_parser("refresh", help="Recompute data_features with its current features.")
+    commands.add_parser("drop", help="Drop the view and the table.")
+    show = commands.add_parser("show", help="Print the features of one year.")
+    show.add_argument("year", type=int)
+    show.add_argument("features", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "view":
+        create_view(args.features or DEFAULT_FEATURES)
+        print(f"Created view {VIEW_NAME}")
+    elif args.command == "materialize":
+        print(f"Materialized {materialize(args.features or DEFAULT_FEATURES)} rows into {TABLE_NAME}")
+    elif args.command == "refresh":
+        rows = refresh()
+        print(f"Refreshed {rows} rows" if rows is not None else f"No {TABLE_NAME} table to refresh")
+    elif args.command == "drop":
+        drop()
+    else:
+        for row in read_features(args.features, year=args.year, as_="records"):
+            print(*row, sep="\t")
+
+
+if __name__ == "__main__":
+    main()
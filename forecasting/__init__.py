@@ -0,0 +1 @@
+"""Model training, evaluation and forecasting helpers shared by the experiment scripts."""
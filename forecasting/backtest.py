@@ -0,0 +1,243 @@
+"""
+Walk-forward (rolling-origin) backtesting.
+
+Instead of the single TRAINING_END cut of `run_experiment`, every cutoff in a
+range is a fold: train on the years up to the cutoff (all of them, or a sliding
+window of the last `window_years`) and test on the following `horizon` years.
+
+The panel is sorted by year once and shared with the worker processes as
+memory-mapped columns, so a fold's training and test sets are contiguous row
+slices found by binary search rather than boolean masks over a copy. Folds run
+in parallel.
+
+With expanding windows LightGBM can optionally warm-start (`warm_start=True`,
+`--warm-start`): runs of up to `chain_length` consecutive folds form a chain in
+which each fold continues boosting the previous fold's booster with
+`warm_start_trees` more trees, as the new training set extends the old one.
+That trades fit time for comparability: fold k of a chain scores a model of
+100 + k * `warm_start_trees` trees partly fitted on earlier folds' data, so its
+scores depend on the chain length and the fold's position in the chain. The
+`trees` column of the results records each fold's effective tree count. Chain
+boundaries don't depend on the worker count, so results don't either. By
+default every fold is fitted from scratch.
+
+Usage:
+    python -m forecasting.backtest --start 2005 --end 2018
+    python -m forecasting.backtest --window sliding --window-years 15 --horizon 1 --output folds.csv
+    python -m forecasting.backtest --warm-start --chain-length 4   # faster, see above
+"""
+import argparse
+import concurrent.futures
+import dataclasses
+import os
+import pathlib
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import r2_score, root_mean_squared_error
+
+from database import snapshot
+from forecasting.experiment import (
+    FULL_MODEL_FEATURES, LAGGED_TARGET_COL, MODEL_KINDS, TARGET_COL, build_pipeline, load_cached_panel,
+    recursive_scores,
+)
+
+DEFAULT_HORIZON = 3
+DEFAULT_WARM_START_TREES = 25
+DEFAULT_CHAIN_LENGTH = 4
+
+# Panel attached by each worker process in `_init_worker`.
+_panel: pd.DataFrame | None = None
+
+
+@dataclasses.dataclass(frozen=True)
+class Fold:
+    """Train on years [train_start, cutoff], test on (cutoff, cutoff + horizon]."""
+    cutoff: int
+    train_start: int
+    horizon: int
+
+    @property
+    def test_end(self) -> int:
+        return self.cutoff + self.horizon
+
+
+def make_folds(cutoffs, horizon: int = DEFAULT_HORIZON, window: str = "expanding",
+               window_years: int | None = None, first_year: int = 0) -> list[Fold]:
+    """Folds for each cutoff; a "sliding" window trains on the last `window_years` years only."""
+    if window not in ("expanding", "sliding"):
+        raise ValueError(f"Unknown window type: {window}")
+    if window == "sliding" and not window_years:
+        raise ValueError("A sliding window needs window_years")
+    return [
+        Fold(cutoff, first_year if window == "expanding" else cutoff - window_years + 1, horizon)
+        for cutoff in cutoffs
+    ]
+
+
+def sort_panel(df_clean: pd.DataFrame) -> pd.DataFrame:
+    """The panel in (year, country_code) order, so every year range is one contiguous row slice."""
+    return df_clean.sort_values(["year", "country_code"], kind="stable")
+
+
+def _rows(years: np.ndarray, first: int, last: int) -> slice:
+    """Row slice of the year-sorted panel holding years first..last."""
+    return slice(int(np.searchsorted(years, first, "left")), int(np.searchsorted(years, last, "right")))
+
+
+def _fit_fold(panel: pd.DataFrame, features: list[str], kind: str, fold: Fold, countries: list[str],
+              init_model=None, warm_start_trees: int = DEFAULT_WARM_START_TREES):
+    years = panel["year"].to_numpy()
+    train = panel.iloc[_rows(years, fold.train_start, fold.cutoff)]
+    test = panel.iloc[_rows(years, fold.cutoff + 1, fold.test_end)]
+    X_train, y_train = train[features], train[TARGET_COL]
+    X_test, y_test = test[features], test[TARGET_COL]
+
+    pipeline = build_pipeline(kind, features, n_jobs=1)
+    if "country_code" in features:
+        # Same one-hot columns in every fold, which a warm-started booster requires.
+        pipeline.set_params(preprocessor__cat__categories=[countries])
+    fit_params = {}
+    if init_model is not None:
+        pipeline.set_params(regressor__n_estimators=warm_start_trees)
+        fit_params["regressor__init_model"] = init_model
+
+    started = time.perf_counter()
+    pipeline.fit(X_train, y_train, **fit_params)
+    fit_seconds = time.perf_counter() - started
+
+    regressor = pipeline.named_steps["regressor"]
+    row = {
+        "cutoff": fold.cutoff, "train_start": fold.train_start, "test_end": fold.test_end, "kind": kind,
+        "train_rows": len(train), "test_rows": len(test), "warm_start": init_model is not None,
+        # Boosting rounds in the scored model, inherited ones included; none for MLR.
+        "trees": regressor.booster_.num_trees() if hasattr(regressor, "booster_") else np.nan,
+        "fit_seconds": fit_seconds,
+    }
+    if test.empty:
+        return pipeline, row | {"RMSE": np.nan, "R2": np.nan, "RMSE_Recursive_Final": np.nan,
+                                "R2_Recursive_Final": np.nan}
+    pred_log = pipeline.predict(X_test)
+    recursive = recursive_scores(panel, features, {kind: pipeline}, X_test, y_test)
+    return pipeline, row | {
+        "RMSE": root_mean_squared_error(np.exp(y_test), np.exp(pred_log)),
+        "R2": r2_score(y_test, pred_log),
+        "RMSE_Recursive_Final": recursive[f"{kind}_RMSE_Recursive_Final"],
+        "R2_Recursive_Final": recursive[f"{kind}_R2_Recursive_Final"],
+    }
+
+
+def run_chain(panel: pd.DataFrame, features: list[str], kind: str, folds: list[Fold], warm_start: bool,
+              warm_start_trees: int = DEFAULT_WARM_START_TREES) -> list[dict]:
+    """Fits `folds` in order; LightGBM folds after the first continue the previous booster when `warm_start`."""
+    countries = sorted(pd.unique(panel["country_code"]))
+    rows, booster = [], None
+    for fold in folds:
+        pipeline, row = _fit_fold(panel, features, kind, fold, countries, booster, warm_start_trees)
+        rows.append(row)
+        if warm_start and kind == "LGBM":
+            booster = pipeline.named_steps["regressor"].booster_
+    return rows
+
+
+def _init_worker(directory: str):
+    global _panel
+    _panel = snapshot.read_frame(pathlib.Path(directory))
+    warnings.filterwarnings("ignore", category=UserWarning)
+
+
+def _run_chain(features: list[str], kind: str, folds: list[Fold], warm_start: bool, warm_start_trees: int):
+    return run_chain(_panel, features, kind, folds, warm_start, warm_start_trees)
+
+
+def _chains(folds: list[Fold], kind: str, warm_start: bool, chain_length: int) -> list[list[Fold]]:
+    """Independent folds are one chain each; warm-started folds are cut into chains of `chain_length`."""
+    if not (warm_start and kind == "LGBM"):
+        return [[fold] for fold in folds]
+    return [folds[i:i + chain_length] for i in range(0, len(folds), chain_length)]
+
+
+def backtest(df_clean: pd.DataFrame, features: list[str], folds: list[Fold], kinds=MODEL_KINDS,
+             warm_start: bool = False, warm_start_trees: int = DEFAULT_WARM_START_TREES,
+             chain_length: int = DEFAULT_CHAIN_LENGTH, max_workers: int | None = None) -> pd.DataFrame:
+    """
+    Runs every fold for every model kind and returns one row per (fold, kind).
+    Warm starts (opt-in) are only used for expanding windows, where each training
+    set contains the previous one.
+    """
+    warm_start = warm_start and len({fold.train_start for fold in folds}) == 1
+    panel = sort_panel(df_clean)
+    max_workers = max_workers or os.cpu_count() or 1
+    tasks = [(kind, chain) for kind in kinds for chain in _chains(folds, kind, warm_start, chain_length)]
+
+    if max_workers == 1:
+        results = [run_chain(panel, features, kind, chain, warm_start, warm_start_trees) for kind, chain in tasks]
+    else:
+        with tempfile.TemporaryDirectory(prefix="backtest-") as directory:
+            snapshot.write_frame(panel, pathlib.Path(directory))
+            with concurrent.futures.ProcessPoolExecutor(max_workers, initializer=_init_worker,
+                                                        initargs=(directory,)) as pool:
+                futures = [pool.submit(_run_chain, features, kind, chain, warm_start, warm_start_trees)
+                           for kind, chain in tasks]
+                results = [future.result() for future in futures]
+
+    table = pd.DataFrame([row for rows in results for row in rows])
+    table["trees"] = table["trees"].astype("Int64")
+    return table.sort_values(["cutoff", "kind"], ignore_index=True)
+
+
+def summarize(table: pd.DataFrame) -> pd.DataFrame:
+    """Mean and standard deviation of every metric across folds, per model kind."""
+    metrics = ["RMSE", "R2", "RMSE_Recursive_Final", "R2_Recursive_Final"]
+    return table.groupby("kind")[metrics].agg(["mean", "std"])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Walk-forward backtest of the GDP per capita models over a range of training cutoffs.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--start", type=int, default=2005, help="First training cutoff year.")
+    parser.add_argument("--end", type=int, default=2018, help="Last training cutoff year.")
+    parser.add_argument("--step", type=int, default=1, help="Years between cutoffs.")
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON, help="Test years after each cutoff.")
+    parser.add_argument("--window", choices=["expanding", "sliding"], default="expanding")
+    parser.add_argument("--window-years", type=int, default=None, help="Training years of a sliding window.")
+    parser.add_argument("--features", nargs="+", default=FULL_MODEL_FEATURES)
+    parser.add_argument("--warm-start", action="store_true",
+                        help="Continue each LightGBM fold from the previous fold's booster. Faster, but scores "
+                             "then depend on the chain; see the `trees` column.")
+    parser.add_argument("--warm-start-trees", type=int, default=DEFAULT_WARM_START_TREES,
+                        help="Trees added per warm-started fold.")
+    parser.add_argument("--chain-length", type=int, default=DEFAULT_CHAIN_LENGTH,
+                        help="Folds per warm-start chain; each chain starts with a fit from scratch.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (1 runs in-process).")
+    parser.add_argument("--output", type=pathlib.Path, help="Write the per-fold table as CSV.")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+    df_clean = load_cached_panel(args.features)
+    folds = make_folds(range(args.start, args.end + 1, args.step), args.horizon, args.window,
+                       args.window_years, first_year=int(df_clean["year"].min()))
+    if LAGGED_TARGET_COL not in args.features:
+        print("Note: the lagged target is not a feature, so recursive scores are NaN.")
+
+    started = time.perf_counter()
+    table = backtest(df_clean, args.features, folds, warm_start=args.warm_start,
+                     warm_start_trees=args.warm_start_trees, chain_length=args.chain_length,
+                     max_workers=args.workers)
+    print(f"--- {len(folds)} folds x {len(MODEL_KINDS)} models in {time.perf_counter() - started:.1f}s ---")
+
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.float_format", "{:,.4f}".format):
+        print(table.to_string(index=False))
+        print("\n--- Aggregated over folds ---")
+        print(summarize(table))
+    if args.output:
+        table.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
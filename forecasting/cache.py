@@ -0,0 +1,111 @@
+"""
+Content-addressed store of fitted pipelines and their experiment metrics.
+
+An entry is keyed by a hash of the feature list, model kind and hyperparameters,
+the training cutoff and the data version (`snapshot.data_version`, the data
+table's revision), so a pipeline is only refit when one of those changes. The
+store is bounded in size and evicts least recently used entries.
+
+Usage:
+    python -m forecasting.cache stats
+    python -m forecasting.cache clear
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import pickle
+import tempfile
+
+ARTIFACT_DIR = pathlib.Path(__file__).parent / "artifacts"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Bump when the evaluation logic changes in a way that makes stored metrics stale.
+CACHE_FORMAT = 1
+
+
+class ArtifactStore:
+    """Pickled {"pipeline": ..., "scores": {...}} entries in `directory`, one file per key."""
+
+    def __init__(self, data_version: str, directory: pathlib.Path = ARTIFACT_DIR,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.data_version = data_version
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, features: list[str], kind: str, hyperparameters: dict, training_end: int) -> str:
+        payload = {
+            "format": CACHE_FORMAT,
+            "features": list(features),
+            "kind": kind,
+            "hyperparameters": hyperparameters,
+            "training_end": training_end,
+            "data_version": self.data_version,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.directory / f"{key}.pkl"
+
+    def get(self, key: str) -> dict | None:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        # Access time drives LRU eviction; atime is unreliable on many mounts, so touch mtime.
+        os.utime(path)
+        logging.debug(f"Artifact cache hit {key[:12]}")
+        return entry
+
+    def put(self, key: str, pipeline, scores: dict):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, staging = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump({"pipeline": pipeline, "scores": scores}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(staging, self._path(key))
+        self.evict()
+
+    def entries(self) -> list[pathlib.Path]:
+        """Stored entries, least recently used first."""
+        if not self.directory.exists():
+            return []
+        return sorted(self.directory.glob("*.pkl"), key=lambda p: p.stat().st_mtime)
+
+    def evict(self):
+        """Deletes least recently used entries until the store fits in `max_bytes`."""
+        entries = self.entries()
+        total = sum(p.stat().st_size for p in entries)
+        for path in entries:
+            if total <= self.max_bytes:
+                break
+            total -= path.stat().st_size
+            path.unlink(missing_ok=True)
+
+    def clear(self) -> int:
+        """Deletes every entry and returns how many were removed."""
+        entries = self.entries()
+        for path in entries:
+            path.unlink(missing_ok=True)
+        return len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or invalidate the fitted-model artifact cache.")
+    parser.add_argument("command", choices=["stats", "clear"])
+    args = parser.parse_args()
+
+    store = ArtifactStore(data_version="")
+    if args.command == "clear":
+        print(f"Removed {store.clear()} cached artifacts from {store.directory}")
+    else:
+        entries = store.entries()
+        size = sum(p.stat().st_size for p in entries)
+        print(f"{len(entries)} artifacts, {size / 1024 / 1024:.1f} MiB in {store.directory}")
+
+
+if __name__ == "__main__":
+    main()
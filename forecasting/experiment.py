@@ -0,0 +1,216 @@
+"""
+Core experiment logic: data preparation, model pipelines and the
+one-step / recursive evaluation used by `modelexp.py`.
+"""
+import functools
+import logging
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import root_mean_squared_error, r2_score
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+import tracing
+from database import models, snapshot
+from database.feature_names import is_feature, spec_key
+from database.tensor import PanelTensor
+from forecasting.cache import ArtifactStore
+from forecasting.features import compute_features
+from forecasting.recursive import RecursiveForecaster
+
+TARGET_COL = "logged_gdp_pcp"
+LAGGED_TARGET_COL = f"{TARGET_COL}_lagged"
+TRAINING_END = 2014
+MODEL_KINDS = ("MLR", "LGBM")
+
+ALL_POSSIBLE_LAGGED_FEATURES = [
+    "population", "female", "male", "life_expectancy", "migration", "infant_mortality",
+    "internet", "hci", "enrollment", "urban_pop", TARGET_COL,
+]
+LAGGED_FEATURES = [f"{feature}_lagged" for feature in ALL_POSSIBLE_LAGGED_FEATURES]
+# The "Full Model" scenario of modelexp.py: every lagged indicator, the GDP momentum lag and country.
+FULL_MODEL_FEATURES = ["year", "country_code"] + LAGGED_FEATURES
+
+
+def load_panel(session, features: list[str] = LAGGED_FEATURES) -> pd.DataFrame:
+    """
+    Loads the data table, adds the log target and the feature store `features`
+    (by default every lag-1 feature) and drops incomplete rows.
+    """
+    with tracing.span("panel.read_sql"):
+        df = pd.read_sql_query(session.query(models.DataEntry).statement, session.bind)
+    with tracing.span("panel.lags", rows=len(df), features=len(features)):
+        df.sort_values(by=["country_code", "year"], inplace=True)
+        df[TARGET_COL] = np.log(df["gdp"])
+        df = pd.concat([df, compute_features(df, features)], axis=1)
+    with tracing.span("panel.dropna"):
+        return df.dropna().copy()
+
+
+def load_cached_panel(features: list[str] | None = None, version: str | None = None) -> pd.DataFrame:
+    """
+    `load_panel` through the on-disk snapshot cache; rebuilt only when the data table changes.
+    With `features`, the panel holds exactly those store features (other names, such
+    as "year", are ignored) and is cached per feature set. `version` is the
+    `snapshot.data_version()` a caller already has; read if None.
+    """
+    if features is None:
+        return snapshot.cached_frame("panel", load_panel, version)
+    features = sorted({f for f in features if is_feature(f)})
+    return snapshot.cached_frame(f"panel-{spec_key(features)}", functools.partial(load_panel, features=features),
+                                 version)
+
+
+def build_pipeline(kind: str, features: list[str], n_jobs: int | None = None) -> Pipeline:
+    """Builds the unfitted MLR or LGBM pipeline for a feature list."""
+    categorical_features = ['country_code'] if 'country_code' in features else []
+    numerical_features = [f for f in features if f not in categorical_features]
+    if kind == "MLR":
+        return Pipeline(steps=[("preprocessor", ColumnTransformer(transformers=[("num", StandardScaler(), numerical_features), ("cat", OneHotEncoder(handle_unknown="ignore"), categorical_features)])), ("regressor", LinearRegression())])
+    if kind == "LGBM":
+        return Pipeline(steps=[("preprocessor", ColumnTransformer(transformers=[("cat", OneHotEncoder(handle_unknown="ignore"), categorical_features)], remainder="passthrough")), ("regressor", lgb.LGBMRegressor(random_state=42, n_jobs=n_jobs))])
+    raise ValueError(f"Unknown model kind: {kind}")
+
+
+def split(df_clean: pd.DataFrame, features: list[str]):
+    """Splits the panel at TRAINING_END into (X_train, y_train, X_test, y_test)."""
+    X = df_clean[features]
+    y = df_clean[TARGET_COL]
+    train_mask = X["year"] <= TRAINING_END
+    return X[train_mask], y[train_mask], X[~train_mask], y[~train_mask]
+
+
+def recursive_forecast(model, X_test_data, y_test_data):
+    """Feeds each year's predicted target back in as the next year's lag and scores every year."""
+    return RecursiveForecaster(X_test_data, y_test_data, LAGGED_TARGET_COL).forecast({"model": model}).scores["model"]
+
+
+def recursive_test_set(df_clean: pd.DataFrame, X_test, y_test):
+    """
+    Without country codes the lag can only be carried positionally, so restrict
+    the test set to countries present in every test year.
+    """
+    if 'country_code' in X_test.columns:
+        return X_test, y_test
+    test_meta_df = df_clean.loc[X_test.index][['country_code', 'year']]
+    presence = PanelTensor.from_frame(test_meta_df, features=[])
+    common_countries = presence.countries_present(presence.years[0], presence.years[-1])
+
+    stable_indices = test_meta_df[test_meta_df['country_code'].isin(common_countries)].index
+    return X_test.loc[stable_indices], y_test.loc[stable_indices]
+
+
+def fit_model(features: list[str], kind: str, X_train, y_train, X_test, y_test, n_jobs: int | None = None):
+    """Fits one model kind and returns the pipeline with its one-step RMSE/R²."""
+    pipeline = build_pipeline(kind, features, n_jobs=n_jobs)
+    # Equivalent to pipeline.fit, split so the encoding and the regressor fit are traced separately.
+    with tracing.span("fit.encode", kind=kind):
+        X_encoded = pipeline[:-1].fit_transform(X_train, y_train)
+    with tracing.span("fit.regressor", kind=kind, rows=len(X_train)):
+        pipeline[-1].fit(X_encoded, y_train)
+    with tracing.span("fit.predict", kind=kind):
+        pred_log = pipeline.predict(X_test)
+    return pipeline, {
+        f"{kind}_RMSE": root_mean_squared_error(np.exp(y_test), np.exp(pred_log)),
+        f"{kind}_R2": r2_score(y_test, pred_log),
+    }
+
+
+def recursive_scores(df_clean: pd.DataFrame, features: list[str], pipelines: dict, X_test, y_test) -> dict:
+    """
+    Runs all fitted `pipelines` ({kind: pipeline}) through one recursive pass and
+    returns their final-year RMSE/R² (NaN when the lagged target isn't a feature).
+    """
+    rec_final = {kind: {} for kind in pipelines}
+    if LAGGED_TARGET_COL in features:
+        with tracing.span("recursive.test_set"):
+            X_rec_test, y_rec_test = recursive_test_set(df_clean, X_test, y_test)
+        if not X_rec_test.empty:
+            with tracing.span("recursive.forecast", models=list(pipelines)):
+                result = RecursiveForecaster(X_rec_test, y_rec_test, LAGGED_TARGET_COL).forecast(pipelines)
+            rec_final = {kind: result.final(kind) for kind in pipelines}
+    scores = {}
+    for kind, final in rec_final.items():
+        scores[f"{kind}_RMSE_Recursive_Final"] = final.get('rmse', np.nan)
+        scores[f"{kind}_R2_Recursive_Final"] = final.get('r2', np.nan)
+    return scores
+
+
+def cache_key(cache: ArtifactStore, features: list[str], kind: str) -> str:
+    """Artifact key of one model kind on `features`; thread count doesn't affect the fit's identity."""
+    hyperparameters = build_pipeline(kind, features).named_steps["regressor"].get_params()
+    hyperparameters.pop("n_jobs", None)
+    return cache.key(features, kind, hyperparameters, TRAINING_END)
+
+
+def evaluate_model(df_clean: pd.DataFrame, features: list[str], kind: str, n_jobs: int | None = None,
+                   cache: ArtifactStore | None = None) -> dict:
+    """
+    Fits one model kind on the training years and returns its one-step RMSE/R²
+    and, when the lagged target is a feature, the final-year recursive RMSE/R².
+    With a `cache`, a previously stored fit for the same inputs is reused.
+    """
+    key = cache_key(cache, features, kind) if cache else None
+    if cache and (hit := cache.get(key)):
+        return hit["scores"]
+
+    X_train, y_train, X_test, y_test = split(df_clean, features)
+    pipeline, scores = fit_model(features, kind, X_train, y_train, X_test, y_test, n_jobs=n_jobs)
+    scores.update(recursive_scores(df_clean, features, {kind: pipeline}, X_test, y_test))
+    if cache:
+        cache.put(key, pipeline, scores)
+    return scores
+
+
+def fitted_pipeline(df_clean: pd.DataFrame, features: list[str], kind: str, cache: ArtifactStore) -> Pipeline:
+    """The pipeline fitted on the training years: from `cache`, or fitted and stored there on a miss."""
+    key = cache_key(cache, features, kind)
+    if cache.get(key) is None:
+        logging.info(f"Fitting {kind} on data up to {TRAINING_END}...")
+        evaluate_model(df_clean, features, kind, cache=cache)
+    return cache.get(key)["pipeline"]
+
+
+def collect_results(description: str, scores: list[dict]) -> dict:
+    """Merges per-model scores into one result row in the summary table's column order."""
+    merged = {key: value for part in scores for key, value in part.items()}
+    return {
+        "Scenario": description,
+        "MLR_RMSE": merged["MLR_RMSE"],
+        "MLR_R2": merged["MLR_R2"],
+        "LGBM_RMSE": merged["LGBM_RMSE"],
+        "LGBM_R2": merged["LGBM_R2"],
+        "MLR_RMSE_Recursive_Final": merged["MLR_RMSE_Recursive_Final"],
+        "MLR_R2_Recursive_Final": merged["MLR_R2_Recursive_Final"],
+        "LGBM_RMSE_Recursive_Final": merged["LGBM_RMSE_Recursive_Final"],
+        "LGBM_R2_Recursive_Final": merged["LGBM_R2_Recursive_Final"],
+    }
+
+
+def run_experiment(df_clean: pd.DataFrame, features: list[str], description: str,
+                   cache: ArtifactStore | None = None) -> dict:
+    """Trains, evaluates (RMSE & R2), and runs a full recursive forecast."""
+    print(f"--- Running Experiment: {description} ---")
+    with tracing.span("experiment", scenario=description):
+        with tracing.span("experiment.split"):
+            X_train, y_train, X_test, y_test = split(df_clean, features)
+        pipelines, one_step, scores, keys = {}, {}, [], {}
+        for kind in MODEL_KINDS:
+            keys[kind] = cache_key(cache, features, kind) if cache else None
+            if cache and (hit := cache.get(keys[kind])):
+                scores.append(hit["scores"])
+                continue
+            pipelines[kind], one_step[kind] = fit_model(features, kind, X_train, y_train, X_test, y_test)
+
+        recursive = recursive_scores(df_clean, features, pipelines, X_test, y_test)
+        for kind, pipeline in pipelines.items():
+            kind_scores = one_step[kind] | {key: value for key, value in recursive.items() if key.startswith(f"{kind}_")}
+            scores.append(kind_scores)
+            if cache:
+                with tracing.span("experiment.cache_put", kind=kind):
+                    cache.put(keys[kind], pipeline, kind_scores)
+    return collect_results(description, scores)
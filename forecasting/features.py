@@ -0,0 +1,89 @@
+"""
+Named lag, rolling and change features for the panel.
+
+Features are requested by name and computed for any set of columns in one pass:
+the panel is sorted by country and year once, each source column is pulled out
+as a contiguous float array, and every feature is an array shift or a sliding
+window over it, masked where it would reach into another country's rows.
+
+The names ("gdp_lagged", "hci_lag2", "population_rollmean3", ...) are parsed by
+`database.feature_names`, which the SQL-side views in `database.views` share.
+
+Like the `_lagged` features, every feature only looks at earlier rows of the
+same country, so all of them are available when forecasting year t. "Years
+back" counts rows, as `groupby().shift` does.
+"""
+import numpy as np
+import pandas as pd
+
+from database.feature_names import FeatureSpec, parse_feature
+
+
+class _Grouped:
+    """Source columns of a panel as contiguous arrays in (group, time) order."""
+
+    def __init__(self, df: pd.DataFrame, group_col: str, time_col: str):
+        self.df = df
+        self.order = np.lexsort((df[time_col].to_numpy(), df[group_col].to_numpy()))
+        groups = df[group_col].to_numpy()[self.order]
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+        lengths = np.diff(np.r_[starts, len(groups)])
+        # Row position within its group, used to mask values shifted in from the previous group.
+        self.position = np.arange(len(groups)) - np.repeat(starts, lengths)
+        self._columns: dict[str, np.ndarray] = {}
+        self._lags: dict[tuple[str, int], np.ndarray] = {}
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self._columns:
+            self._columns[name] = np.ascontiguousarray(self.df[name].to_numpy(dtype=np.float64)[self.order])
+        return self._columns[name]
+
+    def lag(self, name: str, k: int) -> np.ndarray:
+        if (name, k) not in self._lags:
+            values = self.column(name)
+            shifted = np.full_like(values, np.nan)
+            if k < len(values):
+                shifted[k:] = values[:len(values) - k]
+            shifted[self.position < k] = np.nan
+            self._lags[(name, k)] = shifted
+        return self._lags[(name, k)]
+
+    def rolling(self, name: str, window: int, stat: str) -> np.ndarray:
+        previous = self.lag(name, 1)
+        result = np.full_like(previous, np.nan)
+        if window <= len(previous):
+            windows = np.lib.stride_tricks.sliding_window_view(previous, window)
+            if stat == "rollmean":
+                result[window - 1:] = windows.mean(axis=1)
+            else:
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    result[window - 1:] = windows.std(axis=1, ddof=1)
+        # The window needs `window` previous rows of the same group.
+        result[self.position < window] = np.nan
+        return result
+
+    def compute(self, spec: FeatureSpec) -> np.ndarray:
+        if spec.kind == "lag":
+            return self.lag(spec.column, spec.param)
+        if spec.kind in ("rollmean", "rollstd"):
+            return self.rolling(spec.column, spec.param, spec.kind)
+        previous, before = self.lag(spec.column, 1), self.lag(spec.column, 2)
+        if spec.kind == "diff":
+            return previous - before
+        # Growth from zero is undefined: NaN, as the SQL views' NULL, rather than ±inf.
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(before == 0, np.nan, previous / before - 1)
+
+
+def compute_features(df: pd.DataFrame, names, group_col: str = "country_code",
+                     time_col: str = "year") -> pd.DataFrame:
+    """Returns the named features of `df` as a frame aligned to `df.index`."""
+    specs = [parse_feature(name) for name in dict.fromkeys(names)]
+    missing = {spec.column for spec in specs} - set(df.columns)
+    if missing:
+        raise KeyError(f"Columns not in the panel: {sorted(missing)}")
+
+    grouped = _Grouped(df, group_col, time_col)
+    inverse = np.empty_like(grouped.order)
+    inverse[grouped.order] = np.arange(len(grouped.order))
+    return pd.DataFrame({spec.name: grouped.compute(spec)[inverse] for spec in specs}, index=df.index)
@@ -0,0 +1,358 @@
+"""
+Local models: one model per country, or per cluster of similar countries.
+
+Instead of one global model with `country_code` one-hot encoded, every group
+of countries gets its own MLR or LightGBM model, fitted on that group's
+training rows only. Groups are fitted in batches on a process pool whose
+workers map the training rows (sorted by country, so a country's rows are one
+slice) from a memory-mapped snapshot. Groups with fewer than `min_rows`
+training rows get no model of their own; their countries, and countries never
+seen in training, use a pooled model fitted on every training row.
+
+`LocalModels` is the registry of the fits: MLR models are one coefficient
+matrix (models x inputs) and intercept vector, LightGBM models a list of
+boosters, and a country -> model dict finds a country's model in O(1). Its
+`predict` takes the same frames as a fitted pipeline and predicts them in one
+vectorized product (MLR) or one call per model present (LightGBM), so
+`RecursiveForecaster` steps every country's local model in a batch per year.
+After a country's data is revised, `refit` refits only its group.
+
+Usage:
+    python -m forecasting.local --kind MLR --registry local-mlr.pkl
+    python -m forecasting.local --kind LGBM --clusters 12 --workers 4
+    python -m forecasting.local --registry local-mlr.pkl --refit FI SE
+    python modelexp.py --local --clusters 12
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import dataclasses
+import os
+import pathlib
+import pickle
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+from sklearn.linear_model import Ridge
+from sklearn.metrics import root_mean_squared_error, r2_score
+from sklearn.preprocessing import StandardScaler
+
+from database import snapshot
+from forecasting.experiment import (
+    FULL_MODEL_FEATURES, LAGGED_FEATURES, MODEL_KINDS, TARGET_COL, TRAINING_END, build_pipeline, collect_results,
+    load_cached_panel, recursive_scores, split,
+)
+
+POOLED = "*"
+DEFAULT_MIN_ROWS = 20
+# Ridge penalty of a local MLR, on inputs standardized by the pooled training rows.
+RIDGE_ALPHA = 10.0
+# Batches per worker, so a few slow groups don't leave the other workers idle.
+BATCHES_PER_WORKER = 4
+
+# Training rows attached to each worker process by `_attach`.
+_train: dict = {}
+
+
+# --- Registry ---
+
+@dataclasses.dataclass
+class LocalModels:
+    kind: str
+    inputs: list[str]                   # regressor inputs: the features without country_code
+    assignment: dict[str, str]          # country -> group label
+    labels: list[str]                   # group of each model; labels[0] is the pooled model
+    group_of: dict[str, int]            # country -> model position, for countries whose group has a model
+    coef: np.ndarray | None = None      # MLR: (models, inputs)
+    intercept: np.ndarray | None = None  # MLR: (models,)
+    boosters: list | None = None        # LGBM: one fitted regressor per model
+
+    @classmethod
+    def from_fits(cls, kind: str, inputs: list[str], assignment: dict[str, str], fits: dict) -> "LocalModels":
+        """Registry of `fits` ({label: `_params` of the fit}), which must include the pooled model."""
+        labels = [POOLED] + sorted(label for label in fits if label != POOLED)
+        position = {label: i for i, label in enumerate(labels)}
+        group_of = {code: position[label] for code, label in assignment.items() if label in position}
+        models = cls(kind, list(inputs), dict(assignment), labels, group_of)
+        if kind == "MLR":
+            models.coef = np.vstack([fits[label][0] for label in labels])
+            models.intercept = np.array([fits[label][1] for label in labels])
+        else:
+            models.boosters = [fits[label] for label in labels]
+        return models
+
+    def fits(self) -> dict:
+        """{label: fit} as accepted by `from_fits`."""
+        if self.kind == "MLR":
+            return {label: (self.coef[i], self.intercept[i]) for i, label in enumerate(self.labels)}
+        return dict(zip(self.labels, self.boosters))
+
+    def model_index(self, codes) -> np.ndarray:
+        """Model position of every country code; the pooled model (0) for countries without their own."""
+        get = self.group_of.get
+        return np.fromiter((get(code, 0) for code in codes), dtype=np.intp, count=len(codes))
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        """Log GDP per capita of every row of `X`, which needs `country_code` and the inputs."""
+        models = self.model_index(X["country_code"].to_numpy())
+        values = X[self.inputs].to_numpy(dtype=np.float64)
+        if self.kind == "MLR":
+            return np.einsum("ij,ij->i", values, self.coef[models]) + self.intercept[models]
+        prediction = np.empty(len(X))
+        order = np.argsort(models, kind="stable")
+        present, starts = np.unique(models[order], return_index=True)
+        for model, rows in zip(present, np.split(order, starts[1:])):
+            prediction[rows] = self.boosters[model].predict(values[rows])
+        return prediction
+
+    def refit(self, df_clean: pd.DataFrame, countries, min_rows: int = DEFAULT_MIN_ROWS,
+              max_workers: int | None = None) -> "LocalModels":
+        """
+        A registry with the groups of `countries` refit on `df_clean` and every other
+        fit reused. Countries not in the assignment become groups of their own. The
+        pooled model is not refit. Raises ValueError for countries without training
+        rows in `df_clean`.
+        """
+        trained = set(df_clean.loc[df_clean["year"] <= TRAINING_END, "country_code"])
+        unknown = sorted(set(countries) - trained)
+        if unknown:
+            raise ValueError(f"No training rows for {unknown}")
+        assignment = self.assignment | {code: code for code in countries if code not in self.assignment}
+        refit = {assignment[code] for code in countries}
+        groups = _members(assignment, refit)
+        fits = {label: fit for label, fit in self.fits().items() if label not in refit}
+        with training_pool(df_clean, max_workers) as trainer:
+            fits |= trainer.fit(self.kind, self.inputs, groups, min_rows)
+        return LocalModels.from_fits(self.kind, self.inputs, assignment, fits)
+
+    def save(self, path: pathlib.Path):
+        # The fields, not the instance: a registry saved by `python -m forecasting.local` then loads anywhere.
+        state = {field.name: getattr(self, field.name) for field in dataclasses.fields(self)}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, staging = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(staging, path)
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> "LocalModels":
+        with open(path, "rb") as f:
+            return cls(**pickle.load(f))
+
+
+# --- Fitting ---
+
+def _regressor(kind: str):
+    """
+    One group's model. A country has a few dozen training rows for a dozen
+    inputs, so its MLR is a ridge regression on inputs standardized by the
+    pooled training rows (see `_fit_batch`); LightGBM is fitted as
+    `build_pipeline` fits it.
+    """
+    if kind == "MLR":
+        return Ridge(alpha=RIDGE_ALPHA)
+    return build_pipeline(kind, [], n_jobs=1).named_steps["regressor"].set_params(verbose=-1)
+
+
+def _params(kind: str, regressor, scaler: StandardScaler | None = None):
+    """
+    What the registry keeps of a fit: for MLR the coefficients and intercept with
+    the standardization folded in, so they apply to raw inputs; for LightGBM the
+    regressor itself.
+    """
+    if kind != "MLR":
+        return regressor
+    coef = regressor.coef_ / scaler.scale_
+    return coef, float(regressor.intercept_ - coef @ scaler.mean_)
+
+
+def _attach(train: pd.DataFrame):
+    codes = train["country_code"].to_numpy()
+    countries, starts = np.unique(codes, return_index=True)
+    ends = np.append(starts[1:], len(codes))
+    _train.update(frame=train, bounds={code: (start, end) for code, start, end in zip(countries, starts, ends)})
+
+
+def _init_worker(directory: str):
+    _attach(snapshot.read_frame(pathlib.Path(directory)))
+    warnings.filterwarnings("ignore", category=UserWarning)
+
+
+def _fit_batch(kind: str, inputs: list[str], batch: list[tuple[str, list[str]]]) -> dict:
+    frame, bounds = _train["frame"], _train["bounds"]
+    values = frame[inputs].to_numpy(dtype=np.float64)
+    target = frame[TARGET_COL].to_numpy(dtype=np.float64)
+    scaler = None
+    if kind == "MLR":
+        # Pooled, not per-group, scales: an indicator that is nearly flat in one country's training
+        # years would otherwise get a large standardized coefficient and extrapolate wildly once it moves.
+        scaler = StandardScaler().fit(values)
+        values = scaler.transform(values)
+    fits = {}
+    for label, members in batch:
+        rows = np.concatenate([np.arange(*bounds[code]) for code in members if code in bounds])
+        fits[label] = _params(kind, _regressor(kind).fit(values[rows], target[rows]), scaler)
+    return fits
+
+
+def _members(assignment: dict[str, str], labels=None) -> dict[str, list[str]]:
+    """Countries of each group label (of `labels` only, if given)."""
+    groups = {}
+    for code, label in sorted(assignment.items()):
+        if labels is None or label in labels:
+            groups.setdefault(label, []).append(code)
+    return groups
+
+
+@dataclasses.dataclass
+class _Trainer:
+    pool: concurrent.futures.ProcessPoolExecutor | None
+    rows: dict[str, int]    # training rows per country
+    workers: int
+
+    def fit(self, kind: str, inputs: list[str], groups: dict[str, list[str]], min_rows: int) -> dict:
+        """Fits every group with at least `min_rows` training rows; returns {label: fit}."""
+        tasks = [(label, members) for label, members in groups.items()
+                 if sum(self.rows.get(code, 0) for code in members) >= min_rows]
+        n_batches = min(len(tasks), self.workers * BATCHES_PER_WORKER) or 1
+        batches = [tasks[i::n_batches] for i in range(n_batches)]
+        if self.pool is None:
+            results = [_fit_batch(kind, inputs, batch) for batch in batches]
+        else:
+            futures = [self.pool.submit(_fit_batch, kind, inputs, batch) for batch in batches]
+            results = [future.result() for future in futures]
+        return {label: fit for fits in results for label, fit in fits.items()}
+
+
+@contextlib.contextmanager
+def training_pool(df_clean: pd.DataFrame, max_workers: int | None = None):
+    """
+    Yields a trainer for the training years of `df_clean`. With `max_workers=1`
+    groups are fitted in-process, otherwise on a pool of up to `max_workers`
+    processes (default: CPU count) sharing the rows as a memory-mapped snapshot.
+    """
+    train = df_clean[df_clean["year"] <= TRAINING_END].sort_values(["country_code", "year"], kind="stable")
+    rows = train["country_code"].value_counts().to_dict()
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1:
+        _attach(train)
+        yield _Trainer(None, rows, 1)
+        return
+    with tempfile.TemporaryDirectory(prefix="local-") as directory:
+        snapshot.write_frame(train.reset_index(drop=True), pathlib.Path(directory))
+        with concurrent.futures.ProcessPoolExecutor(max_workers, initializer=_init_worker,
+                                                    initargs=(directory,)) as pool:
+            yield _Trainer(pool, rows, max_workers)
+
+
+def cluster_countries(df_clean: pd.DataFrame, n_clusters: int, columns: list[str] = LAGGED_FEATURES,
+                      seed: int = 0) -> dict[str, str]:
+    """Groups countries by k-means over the standardized training-year means of `columns`."""
+    train = df_clean[df_clean["year"] <= TRAINING_END]
+    profile = train.groupby("country_code")[[col for col in columns if col in train.columns]].mean()
+    labels = KMeans(n_clusters, n_init=10, random_state=seed).fit_predict(StandardScaler().fit_transform(profile))
+    return {code: f"cluster{label}" for code, label in zip(profile.index, labels)}
+
+
+def fit_local(df_clean: pd.DataFrame, features: list[str], kind: str, assignment: dict[str, str] | None = None,
+              min_rows: int = DEFAULT_MIN_ROWS, max_workers: int | None = None,
+              trainer: _Trainer | None = None) -> LocalModels:
+    """
+    Fits a `kind` model per group of `assignment` (default: one per country) on the
+    training years, plus the pooled fallback. `trainer` reuses an open `training_pool`.
+    """
+    inputs = [f for f in features if f != "country_code"]
+    if assignment is None:
+        codes = df_clean.loc[df_clean["year"] <= TRAINING_END, "country_code"]
+        assignment = {code: code for code in pd.unique(codes)}
+    groups = {POOLED: sorted(assignment)} | _members(assignment)
+    if trainer is None:
+        with training_pool(df_clean, max_workers) as trainer:
+            fits = trainer.fit(kind, inputs, groups, min_rows)
+    else:
+        fits = trainer.fit(kind, inputs, groups, min_rows)
+    return LocalModels.from_fits(kind, inputs, assignment, fits)
+
+
+# --- Scoring ---
+
+def score_local(df_clean: pd.DataFrame, models: LocalModels) -> dict:
+    """One-step test RMSE/R² and, with the lagged target as an input, the final-year recursive RMSE/R²."""
+    columns = ["country_code"] + models.inputs
+    _, _, X_test, y_test = split(df_clean, columns)
+    pred_log = models.predict(X_test)
+    scores = {
+        f"{models.kind}_RMSE": root_mean_squared_error(np.exp(y_test), np.exp(pred_log)),
+        f"{models.kind}_R2": r2_score(y_test, pred_log),
+    }
+    scores.update(recursive_scores(df_clean, columns, {models.kind: models}, X_test, y_test))
+    return scores
+
+
+def run_scenarios(df_clean: pd.DataFrame, scenarios: list[dict], assignment: dict[str, str] | None = None,
+                  min_rows: int = DEFAULT_MIN_ROWS, max_workers: int | None = None) -> list[dict]:
+    """
+    Local-model counterpart of `forecasting.parallel.run_scenarios`: every scenario
+    and model kind fitted per group on one shared pool. `country_code` only
+    selects the local model, so scenarios differing only by it score the same.
+    """
+    results = []
+    with training_pool(df_clean, max_workers) as trainer:
+        for scenario in scenarios:
+            print(f"--- Running Experiment: {scenario['description']} (local models) ---")
+            scores = [score_local(df_clean, fit_local(df_clean, scenario["features"], kind, assignment, min_rows,
+                                                      trainer=trainer))
+                      for kind in MODEL_KINDS]
+            results.append(collect_results(scenario["description"], scores))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fit and score per-country (or per-cluster) local models.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--kind", choices=MODEL_KINDS, default="MLR")
+    parser.add_argument("--features", nargs="+", default=FULL_MODEL_FEATURES)
+    parser.add_argument("--clusters", type=int, help="One model per k-means cluster of countries, not per country.")
+    parser.add_argument("--min-rows", type=int, default=DEFAULT_MIN_ROWS,
+                        help="Training rows a group needs for its own model; others use the pooled model.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (1 runs in-process).")
+    parser.add_argument("--registry", type=pathlib.Path, help="Save the fitted models here (or load them, with --refit).")
+    parser.add_argument("--refit", nargs="+", metavar="CODE", help="Refit only these countries' groups in --registry.")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+    if args.refit and not args.registry:
+        parser.error("--refit needs --registry")
+    started = time.perf_counter()
+    if args.refit:
+        models = LocalModels.load(args.registry)
+        df_clean = load_cached_panel(models.inputs)
+        try:
+            models = models.refit(df_clean, [code.upper() for code in args.refit], args.min_rows, args.workers)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Refit the groups of {', '.join(args.refit)} in {time.perf_counter() - started:.2f}s")
+    else:
+        df_clean = load_cached_panel(args.features)
+        assignment = cluster_countries(df_clean, args.clusters) if args.clusters else None
+        models = fit_local(df_clean, args.features, args.kind, assignment, args.min_rows, args.workers)
+        print(f"Fitted {len(models.labels) - 1} local {args.kind} models and the pooled one "
+              f"in {time.perf_counter() - started:.2f}s")
+    pooled = sorted(set(models.assignment) - set(models.group_of))
+    if pooled:
+        print(f"Countries on the pooled model: {', '.join(pooled)}")
+
+    for name, value in score_local(df_clean, models).items():
+        print(f"{name}: {value:,.4f}")
+    if args.registry:
+        models.save(args.registry)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Runs experiment scenarios on a process pool.
+
+Every (scenario, model kind) pair is a separate task, so the MLR and LGBM fits
+of one scenario run side by side. The cleaned panel is written once to a
+directory of memory-mapped `.npy` columns; workers map it read-only at start-up
+instead of receiving a pickled copy with every task. Results are returned in
+scenario order regardless of completion order.
+"""
+import concurrent.futures
+import os
+import pathlib
+import tempfile
+
+import pandas as pd
+
+from database import snapshot
+from forecasting.cache import ArtifactStore
+from forecasting.experiment import MODEL_KINDS, collect_results, evaluate_model, run_experiment
+
+# Panel attached by each worker process in `_init_worker`.
+_panel: pd.DataFrame | None = None
+
+
+def _init_worker(directory: str):
+    global _panel
+    _panel = snapshot.read_frame(pathlib.Path(directory))
+
+
+def _evaluate(features: list[str], kind: str, n_jobs: int | None, cache: ArtifactStore | None) -> dict:
+    return evaluate_model(_panel, features, kind, n_jobs=n_jobs, cache=cache)
+
+
+def run_scenarios(df_clean: pd.DataFrame, scenarios: list[dict], max_workers: int | None = None,
+                  cache: ArtifactStore | None = None) -> list[dict]:
+    """
+    Evaluates every scenario (`{"features": [...], "description": ...}`) and returns
+    the result rows in the same order as `scenarios`.
+
+    `max_workers=1` runs in-process; otherwise up to `max_workers` processes
+    (default: CPU count) are used and LightGBM is limited to one thread per fit.
+    With a `cache`, fits stored by earlier runs are reused instead of retrained.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1:
+        return [run_experiment(df_clean, s["features"], s["description"], cache=cache) for s in scenarios]
+
+    with tempfile.TemporaryDirectory(prefix="panel-") as directory:
+        snapshot.write_frame(df_clean, pathlib.Path(directory))
+        with concurrent.futures.ProcessPoolExecutor(max_workers, initializer=_init_worker,
+                                                    initargs=(directory,)) as pool:
+            futures = [
+                [pool.submit(_evaluate, s["features"], kind, 1, cache) for kind in MODEL_KINDS]
+                for s in scenarios
+            ]
+            results = []
+            for scenario, scenario_futures in zip(scenarios, futures):
+                results.append(collect_results(scenario["description"], [f.result() for f in scenario_futures]))
+                print(f"--- Finished Experiment: {scenario['description']} ---")
+            return results
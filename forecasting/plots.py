@@ -0,0 +1,129 @@
+"""
+Comparison charts of the experiment summary table.
+
+Rendered headless on the non-interactive Agg backend; matplotlib is only
+imported when a chart is drawn.
+
+Usage:
+    python cli.py experiment --plot
+    python cli.py plot experiment_results.csv
+"""
+import pathlib
+
+import tracing
+
+
+def add_bar_labels(ax, rects1, rects2, is_r2=False):
+    """Attach a text label above each bar in *rects*, displaying its height."""
+    fmt = '{:.4f}' if is_r2 else '{:,.0f}'
+    ax.bar_label(rects1, padding=3, fmt=fmt, rotation=90, fontsize=9)
+    ax.bar_label(rects2, padding=3, fmt=fmt, rotation=90, fontsize=9)
+
+
+@tracing.traced("plot")
+def plot_results(results_df, output_dir: pathlib.Path = pathlib.Path(".")):
+    """Saves the four comparison charts of an experiment summary table as PNGs in `output_dir`."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    print("\n--- Generating Result Visualizations ---")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # --- Plot 1: One-Step-Ahead RMSE Comparison ---
+    plt.style.use('seaborn-v0_8-whitegrid')
+    fig, ax = plt.subplots(figsize=(12, 9)) # Increased figure height for labels
+
+    scenarios = results_df.index
+    x = np.arange(len(scenarios))
+    width = 0.35
+
+    rects1 = ax.bar(x - width/2, results_df['MLR_RMSE'], width, label='MLR RMSE', color='skyblue')
+    rects2 = ax.bar(x + width/2, results_df['LGBM_RMSE'], width, label='LGBM RMSE', color='royalblue')
+
+    ax.set_ylabel('RMSE (in dollars of GDP per capita)')
+    ax.set_title('One-Step-Ahead Forecast Accuracy Comparison', fontsize=16)
+    ax.set_xticks(x)
+    ax.set_xticklabels(scenarios, rotation=45, ha="right")
+    ax.legend()
+    ax.set_yscale('log')
+    ax.grid(True, which="both", ls="--", c='0.7')
+    add_bar_labels(ax, rects1, rects2)
+
+    fig.tight_layout()
+    with tracing.span("plot.render", file="one_step_rmse_comparison.png"):
+        plt.savefig(output_dir / "one_step_rmse_comparison.png")
+    print("Saved one-step RMSE comparison plot to 'one_step_rmse_comparison.png'")
+
+
+    # --- Plot 2: Recursive Forecast Stability Comparison ---
+    recursive_df = results_df.dropna(subset=['MLR_RMSE_Recursive_Final', 'LGBM_RMSE_Recursive_Final'])
+    if not recursive_df.empty:
+        fig2, ax2 = plt.subplots(figsize=(12, 9))
+        rec_scenarios = recursive_df.index
+        x_rec = np.arange(len(rec_scenarios))
+
+        rects3 = ax2.bar(x_rec - width/2, recursive_df['MLR_RMSE_Recursive_Final'], width, label='MLR Final Recursive RMSE', color='lightcoral')
+        rects4 = ax2.bar(x_rec + width/2, recursive_df['LGBM_RMSE_Recursive_Final'], width, label='LGBM Final Recursive RMSE', color='firebrick')
+
+        ax2.set_ylabel('RMSE of Final Year Forecast (Error Accumulation)')
+        ax2.set_title('Long-Term Forecast Stability Comparison (Recursive Test)', fontsize=16)
+        ax2.set_xticks(x_rec)
+        ax2.set_xticklabels(rec_scenarios, rotation=45, ha="right")
+        ax2.legend()
+        ax2.grid(True, ls="--", c='0.7')
+        add_bar_labels(ax2, rects3, rects4)
+
+        fig2.tight_layout()
+        with tracing.span("plot.render", file="recursive_stability_comparison.png"):
+            plt.savefig(output_dir / "recursive_stability_comparison.png")
+        print("Saved recursive stability comparison plot to 'recursive_stability_comparison.png'")
+
+    # --- Plot 3: One-Step-Ahead R-squared Comparison ---
+    fig3, ax3 = plt.subplots(figsize=(12, 9))
+    rects5 = ax3.bar(x - width/2, results_df['MLR_R2'], width, label='MLR R²', color='mediumseagreen')
+    rects6 = ax3.bar(x + width/2, results_df['LGBM_R2'], width, label='LGBM R²', color='darkgreen')
+
+    ax3.set_ylabel('R-squared Score')
+    ax3.set_title('One-Step-Ahead R-squared Comparison', fontsize=16)
+    ax3.set_xticks(x)
+    ax3.set_xticklabels(scenarios, rotation=45, ha="right")
+    ax3.legend()
+    ax3.set_ylim([-0.1, 1.05]) # Give a little extra space at the top for labels
+    ax3.grid(True, ls="--", c='0.7')
+    add_bar_labels(ax3, rects5, rects6, is_r2=True)
+
+    fig3.tight_layout()
+    with tracing.span("plot.render", file="one_step_r2_comparison.png"):
+        plt.savefig(output_dir / "one_step_r2_comparison.png")
+    print("Saved one-step R-squared comparison plot to 'one_step_r2_comparison.png'")
+
+    # --- Plot 4: Recursive Forecast R-squared Comparison ---
+    if not recursive_df.empty:
+        fig4, ax4 = plt.subplots(figsize=(12, 9))
+        rects7 = ax4.bar(x_rec - width/2, recursive_df['MLR_R2_Recursive_Final'], width, label='MLR Final Recursive R²', color='orchid')
+        rects8 = ax4.bar(x_rec + width/2, recursive_df['LGBM_R2_Recursive_Final'], width, label='LGBM Final Recursive R²', color='darkviolet')
+
+        ax4.set_ylabel('R-squared Score of Final Year Forecast')
+        ax4.set_title('Long-Term Forecast R-squared Comparison (Recursive Test)', fontsize=16)
+        ax4.set_xticks(x_rec)
+        ax4.set_xticklabels(rec_scenarios, rotation=45, ha="right")
+        ax4.legend()
+        ax4.set_ylim([0, 1.05]) # Give a little extra space at the top
+        ax4.grid(True, ls="--", c='0.7')
+        add_bar_labels(ax4, rects7, rects8, is_r2=True)
+
+        fig4.tight_layout()
+        with tracing.span("plot.render", file="recursive_r2_comparison.png"):
+            plt.savefig(output_dir / "recursive_r2_comparison.png")
+        print("Saved recursive R-squared comparison plot to 'recursive_r2_comparison.png'")
+
+    plt.close("all")
+    print("\nAll plotting is done!")
+
+
+def load_results(path: pathlib.Path):
+    """Reads a summary table written by `modelexp.py --results`."""
+    import pandas as pd
+
+    return pd.read_csv(path, index_col="Scenario")
@@ -0,0 +1,145 @@
+"""
+Publishes recursive GDP per capita forecasts of every country into the database.
+
+For each model kind, the pipeline fitted on the training years (from the
+artifact cache, fitted on a miss) forecasts every country `horizon` years ahead
+from its last observed year, and from each of `origins`: earlier years whose
+outcomes are known, so the dashboard can draw forecasts next to actuals. All
+countries are stepped together through `ModelRegistry.forecast`, the code the
+forecast service runs, so each year costs one `predict` call. The rows and the
+model's test metrics are written by `database.forecasts.write`, replacing an
+earlier publish of the same model version; the website then reads them with
+`database.forecasts.year_forecasts` / `country_trajectory` instead of running
+models.
+
+A model version is the kind plus the artifact key of its fit, which includes
+the data version: republishing unchanged data replaces the same versions, while
+publishing after an import adds new ones. The forecast tables aren't part of
+the data version, so publishing keeps every snapshot and cached fit.
+
+Usage:
+    python -m forecasting.publish
+    python -m forecasting.publish --kinds LGBM --horizon 20 --origins 2014 2018
+    python cli.py publish --horizon 5
+"""
+import argparse
+import datetime
+import json
+import logging
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import database
+from database import forecasts, snapshot
+from forecasting.cache import ArtifactStore
+from forecasting.experiment import (
+    FULL_MODEL_FEATURES, MODEL_KINDS, TRAINING_END, cache_key, fitted_pipeline, load_cached_panel,
+)
+from forecasting.serve import ForecastRequest, ModelRegistry
+
+DEFAULT_HORIZON = 10
+DEFAULT_ORIGINS = (TRAINING_END,)
+
+# forecast_metrics columns -> score names of `forecasting.experiment` (prefixed with the kind).
+METRIC_COLUMNS = {
+    "rmse": "RMSE",
+    "r2": "R2",
+    "rmse_recursive_final": "RMSE_Recursive_Final",
+    "r2_recursive_final": "R2_Recursive_Final",
+}
+
+
+def forecast_origins(panel: pd.DataFrame, origins=DEFAULT_ORIGINS) -> list[tuple[str, int]]:
+    """(country, last year with data) pairs: every country's last panel year plus each of `origins` it has data for."""
+    starts = set(panel.groupby("country_code")["year"].max().items())
+    for year in origins:
+        starts.update((code, year) for code in panel.loc[panel["year"] == year, "country_code"])
+    return sorted((code, int(year)) for code, year in starts)
+
+
+def forecast_rows(registry: ModelRegistry, kind: str, starts: list[tuple[str, int]], horizon: int,
+                  actuals: dict) -> list[dict]:
+    """`forecasts` rows of `kind`'s recursive forecasts from every start; `actuals` maps (country, year) to GDP per capita."""
+    requests = [ForecastRequest(code, origin + 1, kind, horizon) for code, origin in starts]
+    registry.forecast(kind, requests)
+    rows = []
+    for request in requests:
+        if request.future.exception() is not None:
+            logging.warning(f"No {kind} forecast for {request.country_code}: {request.future.exception()}")
+            continue
+        for step, point in enumerate(request.future.result(), start=1):
+            rows.append({
+                "country_code": request.country_code,
+                "target_year": point["year"],
+                "horizon": step,
+                "gdp_per_capita": point["gdp_per_capita"],
+                "actual": actuals.get((request.country_code, point["year"])),
+            })
+    return rows
+
+
+def _metric(scores: dict, name: str) -> float | None:
+    value = scores.get(name)
+    return None if value is None or np.isnan(value) else float(value)
+
+
+def publish(kinds=MODEL_KINDS, features: list[str] = FULL_MODEL_FEATURES, horizon: int = DEFAULT_HORIZON,
+            origins=DEFAULT_ORIGINS) -> dict[str, int]:
+    """
+    Fits (or loads) and publishes one model version per kind to the default
+    database, whose data the fits and model versions are keyed by; returns
+    {model_version: forecast rows}.
+    """
+    version = snapshot.data_version()
+    panel = load_cached_panel(version=version)
+    cache = ArtifactStore(data_version=version)
+    registry = ModelRegistry(panel, {kind: fitted_pipeline(panel, features, kind, cache) for kind in kinds}, features)
+    starts = forecast_origins(panel, origins)
+    actuals = dict(zip(zip(panel["country_code"], panel["year"]), panel["gdp"].astype(float)))
+    published_at = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+
+    published = {}
+    for kind in kinds:
+        key = cache_key(cache, features, kind)
+        scores = cache.get(key)["scores"]
+        metrics = {
+            "model_version": f"{kind}-{key[:12]}",
+            "kind": kind,
+            "features": json.dumps(list(features)),
+            "training_end": TRAINING_END,
+            "published_at": published_at,
+        }
+        metrics.update({column: _metric(scores, f"{kind}_{name}") for column, name in METRIC_COLUMNS.items()})
+        started = time.perf_counter()
+        rows = forecast_rows(registry, kind, starts, horizon, actuals)
+        forecasts.write(metrics, rows)
+        logging.info(f"Published {len(rows)} {kind} forecasts as {metrics['model_version']} "
+                     f"in {time.perf_counter() - started:.2f}s")
+        published[metrics["model_version"]] = len(rows)
+    return published
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Forecast every country recursively and publish the forecasts to the database.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--kinds", nargs="+", choices=MODEL_KINDS, default=list(MODEL_KINDS))
+    parser.add_argument("--features", nargs="+", default=FULL_MODEL_FEATURES)
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON, help="Years forecast from each start.")
+    parser.add_argument("--origins", nargs="*", type=int, default=list(DEFAULT_ORIGINS),
+                        help="Also forecast from these years, besides each country's last observed year.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    warnings.filterwarnings("ignore", category=UserWarning)
+    database.create_schema()
+    for model_version, rows in publish(args.kinds, args.features, max(1, args.horizon), args.origins).items():
+        print(f"{model_version}: {rows} forecasts")
+
+
+if __name__ == "__main__":
+    main()
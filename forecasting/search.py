@@ -0,0 +1,273 @@
+"""
+Feature-subset and LightGBM hyperparameter search with successive halving.
+
+A candidate is a subset of the socio-demographic lag features (plus, optionally,
+`country_code` and the GDP momentum lag) together with one point of
+`LGBM_GRID`. Selection never sees the held-out test years (after
+TRAINING_END): candidates are fitted on the training years before a validation
+window (the last `validation_years` up to TRAINING_END) and scored on its
+one-step RMSE in rungs. The first rung trains on a small random share of the
+countries, each later rung keeps the best 1/`eta` of the candidates and
+multiplies the share by `eta`, up to all of them. Only the `finalists` that
+survive every rung get the expensive recursive evaluation, and they are ranked
+on the validation window too. Each finalist is then refit on every training
+year and scored on the test years, for reporting only.
+
+Each rung runs its candidates on a process pool. Every finished evaluation is
+written to a JSON checkpoint, so an interrupted search resumes where it stopped
+when started again with the same settings.
+
+Usage:
+    python -m forecasting.search --candidates 300 --workers 8
+    python -m forecasting.search --candidates 300 --checkpoint search.json   # resumes if search.json exists
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import itertools
+import json
+import math
+import os
+import pathlib
+import tempfile
+import warnings
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import root_mean_squared_error
+
+from database import snapshot
+from forecasting.cache import ARTIFACT_DIR
+from forecasting.experiment import (
+    ALL_POSSIBLE_LAGGED_FEATURES, LAGGED_TARGET_COL, TARGET_COL, TRAINING_END, build_pipeline, load_cached_panel,
+    recursive_scores, split,
+)
+
+SOCIO_DEM_FEATURES = [f"{f}_lagged" for f in ALL_POSSIBLE_LAGGED_FEATURES if f != TARGET_COL]
+OPTIONAL_FEATURES = ["country_code", LAGGED_TARGET_COL]
+LGBM_GRID = {
+    "num_leaves": [15, 31, 63],
+    "learning_rate": [0.05, 0.1],
+    "n_estimators": [100, 300],
+    "min_child_samples": [10, 20, 40],
+}
+DEFAULT_CHECKPOINT = ARTIFACT_DIR / "search.json"
+DEFAULT_VALIDATION_YEARS = 3
+
+# Panel attached by each worker process in `_init_worker`.
+_panel: pd.DataFrame | None = None
+
+
+def candidate_id(features: list[str], params: dict) -> str:
+    payload = json.dumps({"features": sorted(features), "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:12]
+
+
+def sample_candidates(n: int, seed: int = 0) -> list[dict]:
+    """
+    `n` distinct candidates drawn uniformly from every (feature subset, grid point)
+    pair. Every subset keeps "year" and at least one other feature.
+    """
+    rng = np.random.default_rng(seed)
+    pool = SOCIO_DEM_FEATURES + OPTIONAL_FEATURES
+    grid = [dict(zip(LGBM_GRID, values)) for values in itertools.product(*LGBM_GRID.values())]
+    space = (2 ** len(pool) - 1) * len(grid)
+    candidates = {}
+    while len(candidates) < min(n, space):
+        mask = rng.random(len(pool)) < 0.5
+        if not mask.any():
+            continue
+        features = ["year"] + [f for f, keep in zip(pool, mask) if keep]
+        params = grid[rng.integers(len(grid))]
+        candidates.setdefault(candidate_id(features, params), {"features": features, "params": params})
+    return [{"id": key} | value for key, value in candidates.items()]
+
+
+def rung_fractions(min_fraction: float, eta: int) -> list[float]:
+    """Training-country shares of the rungs: min_fraction, min_fraction * eta, ..., 1."""
+    n_rungs = max(1, math.floor(math.log(1 / min_fraction, eta) + 1e-9) + 1)
+    return [min(1.0, min_fraction * eta ** r) for r in range(n_rungs - 1)] + [1.0]
+
+
+def _pipeline(features: list[str], params: dict):
+    pipeline = build_pipeline("LGBM", features, n_jobs=1)
+    pipeline.set_params(**{f"regressor__{key}": value for key, value in params.items()}, regressor__verbose=-1)
+    return pipeline
+
+
+def validation_split(df_clean: pd.DataFrame, features: list[str], validation_years: int = DEFAULT_VALIDATION_YEARS):
+    """
+    The training years split like `split` splits the panel: (X_fit, y_fit, X_val,
+    y_val), validating on the last `validation_years` years up to TRAINING_END.
+    """
+    X_train, y_train, _, _ = split(df_clean, features)
+    fit_mask = X_train["year"] <= TRAINING_END - validation_years
+    return X_train[fit_mask], y_train[fit_mask], X_train[~fit_mask], y_train[~fit_mask]
+
+
+def _scores(df_clean: pd.DataFrame, features: list[str], params: dict, X_train, y_train, X_test, y_test) -> dict:
+    pipeline = _pipeline(features, params).fit(X_train, y_train)
+    scores = recursive_scores(df_clean, features, {"LGBM": pipeline}, X_test, y_test)
+    return {
+        "RMSE": float(root_mean_squared_error(np.exp(y_test), np.exp(pipeline.predict(X_test)))),
+        "RMSE_Recursive_Final": float(scores["LGBM_RMSE_Recursive_Final"]),
+        "R2_Recursive_Final": float(scores["LGBM_R2_Recursive_Final"]),
+    }
+
+
+def one_step_score(df_clean: pd.DataFrame, features: list[str], params: dict, fraction: float,
+                   seed: int, validation_years: int = DEFAULT_VALIDATION_YEARS) -> float:
+    """One-step validation RMSE after training on a random `fraction` of the countries."""
+    X_train, y_train, X_test, y_test = validation_split(df_clean, features, validation_years)
+    if fraction < 1:
+        countries = df_clean.loc[X_train.index, "country_code"].to_numpy()
+        unique = np.unique(countries)
+        chosen = np.random.default_rng(seed).choice(unique, max(1, math.ceil(fraction * len(unique))), replace=False)
+        keep = np.isin(countries, chosen)
+        X_train, y_train = X_train[keep], y_train[keep]
+    pipeline = _pipeline(features, params).fit(X_train, y_train)
+    return float(root_mean_squared_error(np.exp(y_test), np.exp(pipeline.predict(X_test))))
+
+
+def final_scores(df_clean: pd.DataFrame, features: list[str], params: dict,
+                 validation_years: int = DEFAULT_VALIDATION_YEARS) -> dict:
+    """
+    One-step RMSE and final-year recursive RMSE/R² (NaN without the momentum lag)
+    on the validation window ("Val_"), which ranks the finalists, and after a
+    refit on every training year on the test years ("Test_"), which is only reported.
+    """
+    validation = _scores(df_clean, features, params, *validation_split(df_clean, features, validation_years))
+    test = _scores(df_clean, features, params, *split(df_clean, features))
+    return {f"Val_{name}": value for name, value in validation.items()} | \
+        {f"Test_{name}": value for name, value in test.items()}
+
+
+def _init_worker(directory: str):
+    global _panel
+    _panel = snapshot.read_frame(pathlib.Path(directory))
+    warnings.filterwarnings("ignore", category=UserWarning)
+
+
+def _one_step(features, params, fraction, seed, validation_years):
+    return one_step_score(_panel, features, params, fraction, seed, validation_years)
+
+
+def _final(features, params, validation_years):
+    return final_scores(_panel, features, params, validation_years)
+
+
+class Checkpoint:
+    """Search state in a JSON file, rewritten atomically after every finished evaluation."""
+
+    def __init__(self, path: pathlib.Path, settings: dict):
+        self.path = path
+        self.state = {"settings": settings, "candidates": None, "rungs": {}, "final": {}}
+        if path.exists():
+            saved = json.loads(path.read_text(encoding="utf-8"))
+            if saved["settings"] != settings:
+                raise ValueError(f"Checkpoint {path} was made with other settings; delete it or pass them again: "
+                                 f"{saved['settings']}")
+            self.state = saved
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, staging = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(staging, self.path)
+
+
+def _run_all(submit, pending: list[str], results: dict, checkpoint: Checkpoint, label: str):
+    """Runs `submit(candidate_id)` for every pending id, recording each result as it finishes."""
+    futures = {submit(key): key for key in pending}
+    for done, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+        results[futures[future]] = future.result()
+        checkpoint.save()
+        print(f"\r{label}: {done}/{len(futures)}", end="", flush=True)
+    if futures:
+        print()
+
+
+def search(df_clean: pd.DataFrame, n_candidates: int = 200, eta: int = 3, min_fraction: float = 1 / 9,
+           finalists: int = 8, seed: int = 0, checkpoint_path: pathlib.Path = DEFAULT_CHECKPOINT,
+           max_workers: int | None = None, validation_years: int = DEFAULT_VALIDATION_YEARS,
+           data_version: str | None = None) -> pd.DataFrame:
+    """
+    Runs (or resumes) the search and returns the finalists, best on the validation window first.
+    `data_version` is the `snapshot.data_version()` `df_clean` was loaded at; read if None.
+    """
+    settings = {"candidates": n_candidates, "eta": eta, "min_fraction": min_fraction, "finalists": finalists,
+                "seed": seed, "grid": LGBM_GRID, "validation_years": validation_years,
+                "data_version": data_version or snapshot.data_version()}
+    checkpoint = Checkpoint(checkpoint_path, settings)
+    state = checkpoint.state
+    if state["candidates"] is None:
+        state["candidates"] = sample_candidates(n_candidates, seed)
+        checkpoint.save()
+    candidates = {c["id"]: c for c in state["candidates"]}
+    fractions = rung_fractions(min_fraction, eta)
+
+    max_workers = max_workers or os.cpu_count() or 1
+    with tempfile.TemporaryDirectory(prefix="search-") as directory:
+        snapshot.write_frame(df_clean, pathlib.Path(directory))
+        with concurrent.futures.ProcessPoolExecutor(max_workers, initializer=_init_worker,
+                                                    initargs=(directory,)) as pool:
+            alive = list(candidates)
+            for rung, fraction in enumerate(fractions):
+                scores = state["rungs"].setdefault(str(rung), {})
+                pending = [key for key in alive if key not in scores]
+                _run_all(lambda key: pool.submit(_one_step, candidates[key]["features"],
+                                                       candidates[key]["params"], fraction, seed + rung,
+                                                       validation_years),
+                         pending, scores, checkpoint,
+                         f"Rung {rung + 1}/{len(fractions)} ({fraction:.0%} of countries, {len(alive)} candidates)")
+                keep = finalists if rung == len(fractions) - 1 else max(finalists, math.ceil(len(alive) / eta))
+                alive = sorted(alive, key=lambda key: scores[key])[:keep]
+
+            pending = [key for key in alive if key not in state["final"]]
+            _run_all(lambda key: pool.submit(_final, candidates[key]["features"], candidates[key]["params"],
+                                             validation_years),
+                     pending, state["final"], checkpoint, f"Recursive evaluation ({len(alive)} finalists)")
+
+    table = pd.DataFrame([
+        {"id": key, "features": ", ".join(f for f in candidates[key]["features"] if f != "year"),
+         **candidates[key]["params"], **state["final"][key]}
+        for key in alive
+    ])
+    # Recursive stability is what the search is after; candidates without a recursive score rank last.
+    # The test scores are never used to rank.
+    return table.sort_values(["Val_RMSE_Recursive_Final", "Val_RMSE"], na_position="last", ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Search feature subsets and LightGBM hyperparameters with successive halving.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--candidates", type=int, default=200, help="Candidates sampled for the first rung.")
+    parser.add_argument("--eta", type=int, default=3, help="Each rung keeps 1/eta of the candidates.")
+    parser.add_argument("--min-fraction", type=float, default=1 / 9,
+                        help="Share of training countries in the first rung.")
+    parser.add_argument("--finalists", type=int, default=8, help="Candidates given the recursive evaluation.")
+    parser.add_argument("--validation-years", type=int, default=DEFAULT_VALIDATION_YEARS,
+                        help=f"Training years up to {TRAINING_END} held out to score and rank the candidates.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument("--checkpoint", type=pathlib.Path, default=DEFAULT_CHECKPOINT,
+                        help="Search state file; an existing one with the same settings is resumed.")
+    parser.add_argument("--output", type=pathlib.Path, help="Write the finalists as CSV.")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+    version = snapshot.data_version()
+    df_clean = load_cached_panel(SOCIO_DEM_FEATURES + OPTIONAL_FEATURES, version)
+    table = search(df_clean, args.candidates, args.eta, args.min_fraction, args.finalists, args.seed,
+                   args.checkpoint, args.workers, args.validation_years, version)
+    with pd.option_context("display.width", 250, "display.max_columns", None, "display.max_colwidth", 80):
+        print(table.to_string(index=False))
+    if args.output:
+        table.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""
+Local forecast-serving service with a warm model registry.
+
+Fitted pipelines are loaded (or fitted once, through the artifact cache) at
+start-up. Requests are queued and a single worker thread groups everything that
+arrives within a short window into one `predict` call per model and horizon
+step, so concurrent clients share the model's vectorized predict.
+
+Endpoints (JSON over HTTP, bound to localhost by default):
+    POST /forecast  {"country_code": "FI", "year": 2016, "horizon": 3,
+                     "model": "LGBM", "overrides": {"hci_lagged": 0.85}}
+                    (or a list of such objects)
+    GET  /stats     latency percentiles, throughput and batch sizes
+    GET  /health
+
+Errors come back as {"error": ...}: 400 for a malformed request, an unknown
+model or override feature, a non-numeric override, an override of the
+recursive state (`year`, `country_code`, the lagged target), or no data for the
+year before; 504 when the forecast isn't ready within the handler's timeout;
+500 for anything else, including a `PredictionError` from a failed predict.
+
+Usage:
+    python -m forecasting.serve --port 8050
+    python -m forecasting.serve --bench 2000   # in-process load test on an ephemeral port
+"""
+import argparse
+import collections
+import concurrent.futures
+import dataclasses
+import http.server
+import json
+import logging
+import queue
+import threading
+import time
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+from database import snapshot
+from forecasting.cache import ArtifactStore
+from forecasting.experiment import (
+    ALL_POSSIBLE_LAGGED_FEATURES, FULL_MODEL_FEATURES, LAGGED_TARGET_COL, MODEL_KINDS, TRAINING_END,
+    fitted_pipeline, load_cached_panel,
+)
+
+DEFAULT_FEATURES = FULL_MODEL_FEATURES
+# Features the recursion advances itself; only the exogenous indicators can be overridden.
+RECURSIVE_STATE = {"year", "country_code", LAGGED_TARGET_COL}
+
+
+class PredictionError(RuntimeError):
+    """A model failed to predict a batch; every request in it gets this error (a 500, not the client's fault)."""
+
+
+@dataclasses.dataclass
+class ForecastRequest:
+    country_code: str
+    year: int
+    model: str = "LGBM"
+    horizon: int = 1
+    overrides: dict = dataclasses.field(default_factory=dict)
+    future: concurrent.futures.Future = dataclasses.field(default_factory=concurrent.futures.Future)
+    received: float = dataclasses.field(default_factory=time.perf_counter)
+
+
+class ModelRegistry:
+    """Fitted pipelines by name plus an in-memory index of the panel's feature rows."""
+
+    def __init__(self, panel: pd.DataFrame, models: dict, features: list[str]):
+        self.models = models
+        self.features = features
+        # Feature rows as observed, and the raw values each year contributes as next year's lags.
+        self._rows = {(row["country_code"], row["year"]): row for row in panel[features].to_dict("records")}
+        raw = panel[["country_code", "year"] + ALL_POSSIBLE_LAGGED_FEATURES].to_dict("records")
+        self._raw = {(row["country_code"], row["year"]): row for row in raw}
+
+    @classmethod
+    def load(cls, features: list[str] = DEFAULT_FEATURES, kinds=MODEL_KINDS,
+             cache: ArtifactStore | None = None) -> "ModelRegistry":
+        """Loads one pipeline per kind from `cache`, fitting (and storing) it on the training years on a miss."""
+        version = snapshot.data_version()
+        panel = load_cached_panel(version=version)
+        cache = cache or ArtifactStore(data_version=version)
+        models = {}
+        for kind in kinds:
+            models[kind] = fitted_pipeline(panel, features, kind, cache)
+        return cls(panel, models, features)
+
+    def feature_row(self, country_code: str, year: int) -> dict | None:
+        """Features for (country, year): observed, or derived from the previous year's values."""
+        row = self._rows.get((country_code, year))
+        if row is not None:
+            return dict(row)
+        previous = self._raw.get((country_code, year - 1))
+        if previous is None:
+            return None
+        derived = {f"{f}_lagged": previous[f] for f in ALL_POSSIBLE_LAGGED_FEATURES}
+        derived.update(country_code=country_code, year=year)
+        return {f: derived[f] for f in self.features}
+
+    def forecast(self, model: str, requests: list[ForecastRequest]):
+        """
+        Steps all requests through their horizons together: one predict call per
+        step. Each request's future gets its yearly forecasts, or a KeyError if
+        there is no data for the year before its first year.
+        """
+        pipeline = self.models[model]
+        rows, outputs, active = {}, {}, []
+        for request in requests:
+            row = self.feature_row(request.country_code, request.year)
+            if row is None:
+                request.future.set_exception(KeyError(f"No data for {request.country_code} in {request.year - 1}"))
+                continue
+            rows[id(request)] = row
+            outputs[id(request)] = []
+            active.append(request)
+
+        step = 0
+        while active:
+            frame_rows = []
+            for request in active:
+                row = rows[id(request)]
+                row.update(request.overrides)
+                frame_rows.append(row)
+            predictions = pipeline.predict(pd.DataFrame(frame_rows, columns=self.features))
+
+            still_active = []
+            for request, row, prediction in zip(active, frame_rows, predictions):
+                outputs[id(request)].append({"year": int(row["year"]), "gdp_per_capita": float(np.exp(prediction))})
+                if step + 1 >= request.horizon:
+                    request.future.set_result(outputs[id(request)])
+                    continue
+                # Next year's observed (or held) features, with the predicted target as the momentum lag.
+                next_row = self.feature_row(request.country_code, row["year"] + 1) or dict(row, year=row["year"] + 1)
+                if LAGGED_TARGET_COL in next_row:
+                    next_row[LAGGED_TARGET_COL] = float(prediction)
+                rows[id(request)] = next_row
+                still_active.append(request)
+            active = still_active
+            step += 1
+
+
+class BatchingPredictor:
+    """Collects requests for up to `max_wait` seconds (or `max_batch` requests) and predicts them together."""
+
+    def __init__(self, registry: ModelRegistry, max_batch: int = 512, max_wait: float = 0.002,
+                 window: int = 100_000):
+        self.registry = registry
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: queue.Queue[ForecastRequest] = queue.Queue()
+        self._latencies = collections.deque(maxlen=window)
+        self._batch_sizes = collections.deque(maxlen=window)
+        self._served = 0
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="batching-predictor")
+        self._thread.start()
+
+    def submit(self, request: ForecastRequest) -> concurrent.futures.Future:
+        if request.model not in self.registry.models:
+            raise KeyError(f"Unknown model '{request.model}'")
+        self._queue.put(request)
+        return request.future
+
+    def _next_batch(self) -> list[ForecastRequest]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            by_model = collections.defaultdict(list)
+            for request in batch:
+                by_model[request.model].append(request)
+            for model, requests in by_model.items():
+                try:
+                    self._forecast(model, requests)
+                except Exception as e:
+                    error = PredictionError(f"{model} failed on a batch of {len(requests)}: {type(e).__name__}: {e}")
+                    error.__cause__ = e
+                    for request in requests:
+                        if not request.future.done():
+                            request.future.set_exception(error)
+            done = time.perf_counter()
+            with self._lock:
+                self._batch_sizes.append(len(batch))
+                self._served += len(batch)
+                self._latencies.extend(done - request.received for request in batch)
+
+    def _forecast(self, model: str, requests: list[ForecastRequest]):
+        self.registry.forecast(model, requests)
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            batch_sizes = np.array(self._batch_sizes)
+            served = self._served
+        elapsed = time.perf_counter() - self._started
+        return {
+            "served": served,
+            "throughput_per_s": served / elapsed if elapsed else 0.0,
+            "latency_ms_p50": float(np.percentile(latencies, 50)) if latencies.size else None,
+            "latency_ms_p99": float(np.percentile(latencies, 99)) if latencies.size else None,
+            "mean_batch_size": float(batch_sizes.mean()) if batch_sizes.size else None,
+            "queued": self._queue.qsize(),
+        }
+
+
+def _parse_request(payload: dict, features: list[str]) -> ForecastRequest:
+    overrides = dict(payload.get("overrides", {}))
+    unknown = sorted(set(overrides) - set(features))
+    if unknown:
+        raise ValueError(f"Unknown override features {unknown}; the model's features are {features}")
+    # Overrides are reapplied at every step, so these would pin the recursion to one year or lag.
+    recursive = sorted(set(overrides) & RECURSIVE_STATE)
+    if recursive:
+        raise ValueError(f"{recursive} are stepped by the forecast and can't be overridden")
+    # Checked here, so a bad value is this request's 400 and never fails the shared predict.
+    for name, value in overrides.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"Override '{name}' must be a number, got {value!r}")
+    return ForecastRequest(
+        country_code=str(payload["country_code"]).upper(),
+        year=int(payload["year"]),
+        model=payload.get("model", "LGBM"),
+        horizon=max(1, int(payload.get("horizon", 1))),
+        overrides=overrides,
+    )
+
+
+def make_handler(predictor: BatchingPredictor, timeout: float = 30.0):
+    class ForecastHandler(http.server.BaseHTTPRequestHandler):
+        def _send(self, status: int, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send(200, predictor.stats())
+            elif self.path == "/health":
+                self._send(200, {"status": "ok", "models": list(predictor.registry.models)})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/forecast":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                single = isinstance(payload, dict)
+                features = predictor.registry.features
+                requests = [_parse_request(p, features) for p in ([payload] if single else payload)]
+                futures = [predictor.submit(r) for r in requests]
+            except (KeyError, ValueError, TypeError) as e:
+                self._send(400, {"error": str(e)})
+                return
+            try:
+                results = [f.result(timeout=timeout) for f in futures]
+            except TimeoutError:
+                self._send(504, {"error": f"No forecast within {timeout:g}s"})
+                return
+            except KeyError as e:
+                # Set by `ModelRegistry.forecast` for a request without data for the year before.
+                self._send(400, {"error": str(e)})
+                return
+            except Exception as e:
+                logging.exception("Forecast request failed")
+                self._send(500, {"error": f"{type(e).__name__}: {e}"})
+                return
+            self._send(200, results[0] if single else results)
+
+        def log_message(self, format, *args):
+            logging.debug(format % args)
+
+    return ForecastHandler
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    # The socketserver default backlog of 5 resets connections under concurrent clients.
+    request_queue_size = 128
+
+
+def make_server(predictor: BatchingPredictor, host: str = "127.0.0.1", port: int = 8050):
+    return _Server((host, port), make_handler(predictor))
+
+
+def bench(server: http.server.ThreadingHTTPServer, registry: ModelRegistry, n: int, concurrency: int = 32,
+          horizon: int = 1) -> dict:
+    """Fires `n` single-forecast requests at `server` from `concurrency` client threads."""
+    url = f"http://{server.server_address[0]}:{server.server_address[1]}"
+    keys = [key for key in registry._rows if key[1] > TRAINING_END]
+
+    def call(i: int):
+        country_code, year = keys[i % len(keys)]
+        body = json.dumps({"country_code": country_code, "year": int(year), "horizon": horizon}).encode()
+        request = urllib.request.Request(f"{url}/forecast", data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            return json.load(response)
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(call, range(n)))
+    wall = time.perf_counter() - started
+    with urllib.request.urlopen(f"{url}/stats") as response:
+        stats = json.load(response)
+    stats["client_throughput_per_s"] = n / wall
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve GDP per capita forecasts from warm, fitted pipelines.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8050)
+    parser.add_argument("--max-batch", type=int, default=512, help="Largest number of requests per predict call.")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="How long to wait for a batch to fill.")
+    parser.add_argument("--bench", type=int, default=0, metavar="N",
+                        help="Run N requests against an ephemeral local server, print stats and exit.")
+    parser.add_argument("--bench-horizon", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    registry = ModelRegistry.load()
+    predictor = BatchingPredictor(registry, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000)
+    server = make_server(predictor, args.host, 0 if args.bench else args.port)
+
+    if args.bench:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(json.dumps(bench(server, registry, args.bench, horizon=args.bench_horizon), indent=2))
+        server.shutdown()
+        return
+
+    logging.info(f"Serving {list(registry.models)} on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+Monte Carlo simulation of policy scenarios.
+
+A scenario is a set of `Perturbation`s: over `ramp_years` an indicator moves a
+given share (or amount) away from its base-year level and stays there, with
+draw-to-draw uncertainty about the size of the change and yearly noise around
+its path. Indicators without a perturbation are held at their base-year level.
+
+Every draw is a recursive GDP per capita trajectory from the base year: each
+year's prediction becomes the next year's GDP lag. The draws of a chunk are
+stepped together, so each year costs one `predict` call over all of the chunk's
+draws and countries. Chunks are sized to `chunk_rows` rows, run on a process
+pool and write their trajectories into a memory-mapped `.npy` file, from which
+the quantile bands are computed a block of countries at a time. Results depend
+on `seed` and `chunk_rows`, not on the number of workers.
+
+Usage:
+    python -m forecasting.simulate --perturb "hci=+5%,sd=2%,year_sd=1%,ramp=5" --draws 10000 --horizon 20
+    python -m forecasting.simulate --perturb "internet=+10,countries=FI/SE" --model MLR --output bands.csv
+"""
+import argparse
+import concurrent.futures
+import dataclasses
+import logging
+import os
+import pathlib
+import pickle
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from database import snapshot
+from database.feature_names import parse_feature
+from forecasting.cache import ArtifactStore
+from forecasting.experiment import FULL_MODEL_FEATURES, LAGGED_TARGET_COL, fitted_pipeline, load_cached_panel
+
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+DEFAULT_CHUNK_ROWS = 200_000
+# Memory allowed for the block of trajectories read back to compute quantiles.
+QUANTILE_BLOCK_BYTES = 256 * 1024 * 1024
+
+# Set by `_init_worker` in each worker process.
+_worker: dict = {}
+
+
+@dataclasses.dataclass(frozen=True)
+class Perturbation:
+    """
+    Moves `indicator` by `change` (a share of its base-year value when `relative`,
+    otherwise in the indicator's units), phased in linearly over `ramp_years`.
+    Each draw and country gets its own change from N(change, sd); `year_sd` adds
+    independent noise (same units) to every simulated year. `countries` limits
+    the perturbation to those country codes.
+    """
+    indicator: str
+    change: float
+    relative: bool = True
+    sd: float = 0.0
+    year_sd: float = 0.0
+    ramp_years: int = 1
+    countries: tuple[str, ...] | None = None
+
+
+def parse_perturbation(text: str) -> Perturbation:
+    """
+    Parses "INDICATOR=CHANGE[,sd=X][,year_sd=X][,ramp=N][,countries=A/B]", e.g.
+    "hci=+5%,sd=2%,ramp=5". A "%" change is relative, a plain number absolute.
+    """
+    head, *options = text.split(",")
+    indicator, _, change = head.partition("=")
+    relative = change.endswith("%")
+
+    def number(value: str) -> float:
+        return float(value.rstrip("%")) / 100 if value.endswith("%") else float(value)
+
+    kwargs = {}
+    for option in options:
+        key, _, value = option.partition("=")
+        if key in ("sd", "year_sd"):
+            kwargs[key] = number(value)
+        elif key == "ramp":
+            kwargs["ramp_years"] = int(value)
+        elif key == "countries":
+            kwargs["countries"] = tuple(code.upper() for code in value.split("/"))
+        else:
+            raise ValueError(f"Unknown perturbation option '{key}' in '{text}'")
+    return Perturbation(indicator.strip(), number(change), relative, **kwargs)
+
+
+@dataclasses.dataclass
+class BaseYear:
+    """What every trajectory starts from: the base-year indicator levels and log GDP of each country."""
+    year: int
+    countries: np.ndarray
+    features: list[str]
+    indicators: list[str]
+    levels: np.ndarray      # (countries, indicators)
+    log_gdp: np.ndarray     # (countries,)
+
+    @classmethod
+    def from_panel(cls, df_clean: pd.DataFrame, year: int, features: list[str],
+                   countries=None) -> "BaseYear":
+        """Base year from the panel rows of `year`; every feature must be year, country_code or a lag-1 feature."""
+        indicators = []
+        for name in features:
+            if name in ("year", "country_code") or name == LAGGED_TARGET_COL:
+                continue
+            spec = parse_feature(name)
+            if spec.kind != "lag" or spec.param != 1:
+                raise ValueError(f"The simulation can only carry lag-1 features, not '{name}'")
+            indicators.append(spec.column)
+        rows = df_clean[df_clean["year"] == year].sort_values("country_code")
+        if countries is not None:
+            rows = rows[rows["country_code"].isin(list(countries))]
+        if rows.empty:
+            raise ValueError(f"No panel rows for the base year {year}")
+        target = LAGGED_TARGET_COL.removesuffix("_lagged")
+        return cls(year, rows["country_code"].to_numpy(), list(features), indicators,
+                   rows[indicators].to_numpy(dtype=np.float64), rows[target].to_numpy(dtype=np.float64))
+
+
+def _draw_changes(base: BaseYear, perturbations: list[Perturbation], n: int, rng: np.random.Generator) -> list:
+    """Per perturbation: the (draws, countries) change and the mask of countries it applies to."""
+    changes = []
+    for p in perturbations:
+        if p.indicator not in base.indicators:
+            raise KeyError(f"'{p.indicator}' is not an indicator of the model's features")
+        mask = np.ones(len(base.countries), dtype=bool) if p.countries is None else np.isin(base.countries, p.countries)
+        change = np.full((n, len(base.countries)), p.change)
+        if p.sd:
+            change += p.sd * rng.standard_normal(change.shape)
+        changes.append((change * mask, mask))
+    return changes
+
+
+def simulate_chunk(pipeline, base: BaseYear, perturbations: list[Perturbation], n_draws: int, horizon: int,
+                   rng: np.random.Generator) -> np.ndarray:
+    """Log GDP per capita of `n_draws` trajectories, shape (draws, countries, horizon)."""
+    n_countries = len(base.countries)
+    changes = _draw_changes(base, perturbations, n_draws, rng)
+    positions = [base.indicators.index(p.indicator) for p in perturbations]
+
+    out = np.empty((n_draws, n_countries, horizon), dtype=np.float32)
+    state = np.tile(base.log_gdp, (n_draws, 1))
+    codes = np.tile(base.countries, n_draws)
+    levels = np.broadcast_to(base.levels, (n_draws, n_countries, len(base.indicators)))
+    for step in range(horizon):
+        # Step `step` forecasts base.year + 1 + step from the indicators of base.year + step.
+        values = levels.copy() if step and perturbations else levels
+        for p, i, (change, mask) in zip(perturbations, positions, changes) if step else ():
+            phase = min(1.0, step / p.ramp_years)
+            level = values[:, :, i]
+            scale = base.levels[:, i] if p.relative else 1.0
+            level += scale * change * phase
+            if p.year_sd:
+                level += scale * p.year_sd * rng.standard_normal(level.shape) * mask
+
+        columns = {"year": np.full(n_draws * n_countries, base.year + 1 + step), "country_code": codes,
+                   LAGGED_TARGET_COL: state.ravel()}
+        for i, indicator in enumerate(base.indicators):
+            columns[f"{indicator}_lagged"] = values[:, :, i].ravel()
+        frame = pd.DataFrame({name: columns[name] for name in base.features})
+        state = pipeline.predict(frame).reshape(n_draws, n_countries)
+        out[:, :, step] = state
+    return out
+
+
+def _chunks(n_draws: int, draws_per_chunk: int) -> list[tuple[int, int]]:
+    return [(start, min(start + draws_per_chunk, n_draws)) for start in range(0, n_draws, draws_per_chunk)]
+
+
+def _run_chunk(index: int, start: int, stop: int) -> int:
+    w = _worker
+    rng = np.random.default_rng([w["seed"], index])
+    trajectories = np.load(w["path"], mmap_mode="r+")
+    trajectories[start:stop] = simulate_chunk(w["pipeline"], w["base"], w["perturbations"], stop - start,
+                                              trajectories.shape[2], rng)
+    trajectories.flush()
+    return stop - start
+
+
+def _init_worker(pipeline_bytes: bytes, base: BaseYear, perturbations: list[Perturbation], path: str, seed: int):
+    pipeline = pickle.loads(pipeline_bytes)
+    if "regressor__n_jobs" in pipeline.get_params():
+        pipeline.set_params(regressor__n_jobs=1)
+    warnings.filterwarnings("ignore", category=UserWarning)
+    _worker.update(pipeline=pipeline, base=base, perturbations=perturbations, path=path, seed=seed)
+
+
+@dataclasses.dataclass
+class SimulationResult:
+    countries: np.ndarray
+    years: np.ndarray
+    baseline: np.ndarray              # (countries, years) GDP per capita without perturbations or noise
+    quantiles: dict[float, np.ndarray]  # q -> (countries, years) GDP per capita
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per (country, year): baseline and every quantile band."""
+        frame = pd.DataFrame({
+            "country_code": np.repeat(self.countries, len(self.years)),
+            "year": np.tile(self.years, len(self.countries)),
+            "baseline": self.baseline.ravel(),
+        })
+        for q, values in self.quantiles.items():
+            frame[f"q{q * 100:g}"] = values.ravel()
+        return frame
+
+
+def quantile_bands(trajectories: np.ndarray, quantiles, block_bytes: int = QUANTILE_BLOCK_BYTES) -> np.ndarray:
+    """Quantiles over the draw axis, (quantiles, countries, horizon), reading a block of countries at a time."""
+    n_draws, n_countries, horizon = trajectories.shape
+    block = max(1, block_bytes // (n_draws * horizon * trajectories.itemsize))
+    bands = np.empty((len(quantiles), n_countries, horizon))
+    for first in range(0, n_countries, block):
+        bands[:, first:first + block] = np.quantile(np.asarray(trajectories[:, first:first + block]), quantiles, axis=0)
+    return bands
+
+
+def simulate(pipeline, base: BaseYear, perturbations: list[Perturbation], n_draws: int = 1000, horizon: int = 10,
+             quantiles=DEFAULT_QUANTILES, seed: int = 0, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+             max_workers: int | None = None, trajectories_path: pathlib.Path | None = None) -> SimulationResult:
+    """
+    Runs `n_draws` trajectories of `horizon` years after the base year and returns
+    their quantile bands next to the unperturbed baseline path. The trajectories
+    (log GDP per capita, float32) are kept in `trajectories_path` if given.
+    """
+    draws_per_chunk = max(1, chunk_rows // len(base.countries))
+    chunks = _chunks(n_draws, draws_per_chunk)
+    max_workers = min(max_workers or os.cpu_count() or 1, len(chunks))
+    baseline = simulate_chunk(pipeline, base, [], 1, horizon, np.random.default_rng(seed))[0]
+
+    with tempfile.TemporaryDirectory(prefix="simulate-") as directory:
+        path = trajectories_path or pathlib.Path(directory) / "trajectories.npy"
+        trajectories = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32,
+                                                 shape=(n_draws, len(base.countries), horizon))
+        del trajectories
+        initargs = (pickle.dumps(pipeline), base, perturbations, str(path), seed)
+        if max_workers == 1:
+            _init_worker(*initargs)
+            for index, (start, stop) in enumerate(chunks):
+                _run_chunk(index, start, stop)
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers, initializer=_init_worker,
+                                                        initargs=initargs) as pool:
+                futures = [pool.submit(_run_chunk, index, start, stop) for index, (start, stop) in enumerate(chunks)]
+                done = 0
+                for future in concurrent.futures.as_completed(futures):
+                    done += future.result()
+                    print(f"\rSimulated {done}/{n_draws} draws", end="", flush=True)
+                print()
+        bands = quantile_bands(np.load(path, mmap_mode="r"), list(quantiles))
+
+    return SimulationResult(
+        countries=base.countries,
+        years=np.arange(base.year + 1, base.year + 1 + horizon),
+        baseline=np.exp(baseline.astype(np.float64)),
+        quantiles={q: np.exp(band) for q, band in zip(quantiles, bands)},
+    )
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Simulate GDP per capita trajectories under perturbed indicator paths.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--perturb", action="append", default=[], type=parse_perturbation, metavar="SPEC",
+                        help='Perturbation "INDICATOR=CHANGE[,sd=X][,year_sd=X][,ramp=N][,countries=A/B]"; '
+                             'a "%%" change is relative to the base-year level. Repeatable.')
+    parser.add_argument("--model", choices=["MLR", "LGBM"], default="LGBM")
+    parser.add_argument("--base-year", type=int, help="Last observed year (default: the panel's last year).")
+    parser.add_argument("--horizon", type=int, default=10, help="Years simulated after the base year.")
+    parser.add_argument("--draws", type=int, default=1000)
+    parser.add_argument("--countries", nargs="+", help="Simulate only these countries.")
+    parser.add_argument("--quantiles", nargs="+", type=float, default=list(DEFAULT_QUANTILES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS,
+                        help="Rows (draws x countries) per predict call and per chunk.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (1 runs in-process).")
+    parser.add_argument("--trajectories", type=pathlib.Path, help="Keep every trajectory in this .npy file.")
+    parser.add_argument("--output", type=pathlib.Path, help="Write the bands as CSV.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    warnings.filterwarnings("ignore", category=UserWarning)
+    version = snapshot.data_version()
+    panel = load_cached_panel(version=version)
+    pipeline = fitted_pipeline(panel, FULL_MODEL_FEATURES, args.model, ArtifactStore(data_version=version))
+    base_year = args.base_year or int(panel["year"].max())
+    countries = [code.upper() for code in args.countries] if args.countries else None
+    base = BaseYear.from_panel(panel, base_year, FULL_MODEL_FEATURES, countries)
+
+    started = time.perf_counter()
+    result = simulate(pipeline, base, args.perturb, args.draws, args.horizon, args.quantiles, args.seed,
+                      args.chunk_rows, args.workers, args.trajectories)
+    logging.info(f"{args.draws} draws x {len(base.countries)} countries x {args.horizon} years "
+                 f"in {time.perf_counter() - started:.1f}s")
+
+    table = result.to_frame()
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.float_format", "{:,.0f}".format):
+        print(table[table["year"] == table["year"].max()].to_string(index=False))
+    if args.output:
+        table.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Preprocessing of the raw World Development Indicators extract."""
@@ -0,0 +1,125 @@
+"""
+Batched gap filling over a country x year panel.
+
+Each indicator is handled as one (countries, years) matrix. PCHIP runs once per
+distinct missing-value pattern instead of once per country, linear gaps and
+edge filling are pure array operations, and indicators can be spread over
+worker processes. Results match the per-country `fill_group` implementation
+this replaces.
+"""
+import concurrent.futures
+
+import numpy as np
+import pandas as pd
+from scipy.interpolate import PchipInterpolator
+
+
+def pchip_fill(values: np.ndarray, years: np.ndarray) -> np.ndarray:
+    """
+    PCHIP-interpolates every row of `values` (countries x years) over `years`,
+    leaving cells outside each row's known range as NaN. Rows with fewer than
+    two known values are returned unchanged.
+    """
+    out = values.copy()
+    known = ~np.isnan(values)
+    patterns, pattern_of_row = np.unique(known, axis=0, return_inverse=True)
+    for p, pattern in enumerate(patterns):
+        if pattern.sum() < 2:
+            continue
+        rows = np.flatnonzero(pattern_of_row == p)
+        interp = PchipInterpolator(years[pattern], values[rows][:, pattern].T, axis=0, extrapolate=False)
+        out[rows] = interp(years).T
+    return out
+
+
+def linear_fill(values: np.ndarray, exists: np.ndarray) -> np.ndarray:
+    """
+    Linearly fills interior gaps of every row, spacing points by their position
+    among the row's existing cells (as `Series.interpolate(method="linear")` does).
+    Leading and trailing gaps stay NaN.
+    """
+    out = values.copy()
+    n_rows, n_cols = values.shape
+    position = np.cumsum(exists, axis=1) - 1.0
+    known = ~np.isnan(values)
+    columns = np.broadcast_to(np.arange(n_cols), values.shape)
+
+    prev_col = np.maximum.accumulate(np.where(known, columns, -1), axis=1)
+    next_col = np.minimum.accumulate(np.where(known, columns, n_cols)[:, ::-1], axis=1)[:, ::-1]
+    fill = exists & ~known & (prev_col >= 0) & (next_col < n_cols)
+    if not fill.any():
+        return out
+
+    row = np.broadcast_to(np.arange(n_rows)[:, None], values.shape)[fill]
+    left, right = prev_col[fill], next_col[fill]
+    x_left, x_right = position[row, left], position[row, right]
+    y_left, y_right = values[row, left], values[row, right]
+    # Same evaluation order as np.interp.
+    slope = (y_right - y_left) / (x_right - x_left)
+    out[fill] = slope * (position[fill] - x_left) + y_left
+    return out
+
+
+def edge_fill(values: np.ndarray) -> np.ndarray:
+    """Forward- then backward-fills every row (`ffill().bfill()`)."""
+    n_cols = values.shape[1]
+    columns = np.broadcast_to(np.arange(n_cols), values.shape)
+    known = ~np.isnan(values)
+    rows = np.arange(values.shape[0])[:, None]
+
+    prev_col = np.maximum.accumulate(np.where(known, columns, 0), axis=1)
+    out = values[rows, prev_col]
+    known = ~np.isnan(out)
+    next_col = np.minimum.accumulate(np.where(known, columns, n_cols - 1)[:, ::-1], axis=1)[:, ::-1]
+    return out[rows, next_col]
+
+
+def fill_indicator(values: np.ndarray, exists: np.ndarray, years: np.ndarray, method: str,
+                   fill_edges: bool = False) -> np.ndarray:
+    """Fills one indicator matrix with `method` ("pchip" or "linear"), optionally edge-filling afterwards."""
+    if method == "pchip":
+        values = pchip_fill(values, years)
+    elif method == "linear":
+        values = linear_fill(values, exists)
+    # PCHIP is evaluated on the whole year grid; drop years a country has no row for.
+    values = np.where(exists, values, np.nan)
+    if fill_edges:
+        values = np.where(exists, edge_fill(values), np.nan)
+    return values
+
+
+def fill_panel(data: pd.DataFrame, methods: dict[str, str], edge_fill_cols: list[str],
+               group_col: str = "Country Code", time_col: str = "Time", workers: int = 1) -> pd.DataFrame:
+    """
+    Fills the columns in `methods` ({column: "pchip" | "linear"}) of the long-format
+    `data`, per `group_col` along `time_col`, and returns a copy in the same row order.
+    With `workers > 1` indicators are processed in parallel. Raises ValueError if a
+    (`group_col`, `time_col`) pair repeats, as the panel has one cell per pair.
+    """
+    duplicated = data.duplicated([group_col, time_col])
+    if duplicated.any():
+        pairs = data.loc[duplicated, [group_col, time_col]].drop_duplicates()
+        raise ValueError(f"{len(pairs)} repeated ({group_col}, {time_col}) pairs, e.g. "
+                         f"{list(pairs.head(3).itertuples(index=False, name=None))}")
+    countries, country_idx = np.unique(data[group_col].to_numpy(), return_inverse=True)
+    years, year_idx = np.unique(data[time_col].to_numpy(), return_inverse=True)
+    exists = np.zeros((len(countries), len(years)), dtype=bool)
+    exists[country_idx, year_idx] = True
+
+    columns = [col for col in methods if col in data]
+    tasks = []
+    for col in columns:
+        values = np.full(exists.shape, np.nan)
+        values[country_idx, year_idx] = data[col].to_numpy(dtype=float)
+        tasks.append((values, exists, years, methods[col], col in edge_fill_cols))
+
+    if workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            filled = list(pool.map(fill_indicator, *zip(*tasks)))
+    else:
+        filled = [fill_indicator(*task) for task in tasks]
+
+    data = data.copy()
+    for col, values in zip(columns, filled):
+        data[col] = values[country_idx, year_idx]
+    return data
@@ -0,0 +1,266 @@
+"""
+Joins the cleaned WDI panel with the GDP sources and streams the result into the database.
+
+Replaces `merge_data.ipynb`. The GDP sources are read in chunks into a hash
+table keyed by (alpha-2 code, year); the first source listed wins where they
+overlap. The WDI panel (data/cleanWDI.csv, written by `raw_data.preprocess`) is
+then streamed through it chunk by chunk: every WDI row with a GDP value is
+joined, cast like the importer's columnar parser and, if complete (the data
+table has no nullable columns), upserted through `database.importer.write_chunks`.
+The joined rows can also be appended to a CSV in the importer's format, gaps
+included, for the cleaning step. Only the GDP table and one chunk are held in
+memory.
+
+GDP sources can be in any of the layouts under data_gdp/:
+    gdp_data.csv   long World Bank export: Country Name, ISO2_code (alpha-3 codes), Time, GDP
+    GDP.csv        wide World Bank export: Country Name, Country Code (alpha-3), one column per year
+    cleaned.csv    country, country_code (alpha-2), year, gdp, ...
+
+Usage:
+    python -m raw_data.merge
+    python -m raw_data.merge --gdp data_gdp/GDP.csv data_gdp/cleaned.csv --output data/wdi_gdp_data.csv
+    python cli.py merge --no-import --output data/wdi_gdp_data.csv
+"""
+import argparse
+import collections
+import dataclasses
+import logging
+import pathlib
+from typing import Iterator
+
+import pandas as pd
+import sqlalchemy
+
+import database
+import tracing
+from database import codes, importer
+
+RAW_DIR = pathlib.Path(__file__).parent
+DEFAULT_WDI = (RAW_DIR / ".." / "data" / "cleanWDI.csv").resolve()
+DEFAULT_GDP = [(RAW_DIR / ".." / "data_gdp" / "gdp_data.csv").resolve()]
+DEFAULT_CHUNK_SIZE = 5000
+
+# cleanWDI.csv columns -> importer CSV headers (see `importer.HEADER_MAP`).
+WDI_COLUMNS = {
+    "Country Name": "name",
+    "Country Code": "alpha_2",
+    "Time": "year",
+    "Population, total [SP.POP.TOTL]": "population_WDI",
+    "Life expectancy at birth, total (years) [SP.DYN.LE00.IN]": "life_expectancy",
+    "Net migration [SM.POP.NETM]": "net_migration",
+    "Individuals using the Internet (% of population) [IT.NET.USER.ZS]": "internet_users_pct",
+    "Human capital index (HCI) (scale 0-1) [HD.HCI.OVRL]": "human_capital_index",
+    "School enrollment, secondary (gross), gender parity index (GPI) [SE.ENR.SECO.FM.ZS]": "school_enroll_secondary_gpi",
+    "Urban population (% of total population) [SP.URB.TOTL.IN.ZS]": "urban_population_pct",
+    "Mortality rate, infant (per 1,000 live births) [SP.DYN.IMRT.IN]": "infant_mortality_rate",
+    "Population, female (% of total population) [SP.POP.TOTL.FE.ZS]": "female_population_pct",
+    "Population, male (% of total population) [SP.POP.TOTL.MA.ZS]": "male_population_pct",
+}
+OUTPUT_COLUMNS = ["name"] + list(importer.HEADER_MAP)
+
+
+@dataclasses.dataclass
+class SourceStats:
+    """Join statistics of one GDP source."""
+    path: pathlib.Path
+    rows: int = 0
+    missing_gdp: int = 0
+    # Codes (alpha-3, or alpha-2 for cleaned.csv) that name no country, e.g. World Bank aggregates.
+    unresolved: set[str] = dataclasses.field(default_factory=set)
+    shadowed: int = 0           # keys already given by an earlier source or row
+    keys: int = 0
+    matched: int = 0            # keys joined to a WDI row
+
+    @property
+    def unmatched(self) -> int:
+        return self.keys - self.matched
+
+
+@dataclasses.dataclass
+class MergeStats:
+    sources: list[SourceStats]
+    wdi_rows: int = 0
+    matched: int = 0
+    unmatched: collections.Counter = dataclasses.field(default_factory=collections.Counter)  # country -> WDI rows without GDP
+    joined_countries: set[str] = dataclasses.field(default_factory=set)
+    name_mismatches: set[tuple[str, str, str]] = dataclasses.field(default_factory=set)  # (code, WDI name, GDP name)
+    unknown_country: collections.Counter = dataclasses.field(default_factory=collections.Counter)  # code -> rows
+    incomplete: collections.Counter = dataclasses.field(default_factory=collections.Counter)  # code -> rows
+
+    def summary(self) -> str:
+        missing = sorted(set(self.unmatched) - self.joined_countries)
+        lines = [f"WDI: {self.wdi_rows} rows, {self.matched} joined, {sum(self.unmatched.values())} without GDP "
+                 f"in {len(self.unmatched)} countries; no GDP at all for {len(missing)}: {', '.join(missing) or '-'}"]
+        for source in self.sources:
+            lines.append(f"{source.path.name}: {source.rows} rows, {source.keys} keys with GDP, {source.matched} joined, "
+                         f"{source.unmatched} unmatched, {source.missing_gdp} without GDP, "
+                         f"{source.shadowed} duplicate or shadowed by earlier sources, {len(source.unresolved)} unresolved codes")
+        if self.name_mismatches:
+            lines.append(f"Names differing between WDI and GDP: "
+                         f"{', '.join(f'{code} ({wdi} / {gdp})' for code, wdi, gdp in sorted(self.name_mismatches))}")
+        if self.unknown_country:
+            lines.append(f"Not imported, not in the country table: "
+                         f"{', '.join(f'{code} ({rows})' for code, rows in sorted(self.unknown_country.items()))}")
+        if self.incomplete:
+            lines.append(f"Not imported, missing values: {sum(self.incomplete.values())} rows "
+                         f"in {len(self.incomplete)} countries")
+        return "\n".join(lines)
+
+
+def _read_csv_chunks(path: pathlib.Path, chunk_size: int, **kwargs) -> Iterator[pd.DataFrame]:
+    # Only empty cells are missing; "NA" is Namibia's alpha-2 code.
+    return pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[""], chunksize=chunk_size,
+                       encoding="utf-8-sig", **kwargs)
+
+
+def read_gdp_source(path: pathlib.Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Chunks of a GDP source as (name, alpha_2, year, GDP) frames, whatever its layout; codes as alpha-2."""
+    header = pd.read_csv(path, nrows=0, encoding="utf-8-sig").columns
+    for chunk in _read_csv_chunks(path, chunk_size):
+        if "Time" in header:
+            frame = pd.DataFrame({"name": chunk["Country Name"], "code": chunk["ISO2_code"],
+                                  "year": chunk["Time"], "GDP": chunk["GDP"]})
+        elif "country_code" in header:
+            frame = pd.DataFrame({"name": chunk["country"], "code": chunk["country_code"],
+                                  "year": chunk["year"], "GDP": chunk["gdp"]})
+        else:
+            frame = chunk.melt(id_vars=["Country Name", "Country Code"], var_name="year", value_name="GDP")
+            frame = frame.rename(columns={"Country Name": "name", "Country Code": "code"})
+        alpha_2 = frame["code"] if "country_code" in header else codes.resolve_alpha2(frame["code"])
+        year = pd.to_numeric(frame["year"], errors="coerce")
+        yield pd.DataFrame({"name": frame["name"], "code": frame["code"], "alpha_2": alpha_2,
+                            "year": year.astype("Int64"), "GDP": frame["GDP"]})
+
+
+def build_gdp_table(paths: list[pathlib.Path], chunk_size: int = DEFAULT_CHUNK_SIZE) -> tuple[pd.DataFrame, list[SourceStats]]:
+    """
+    Hash table of GDP by (alpha_2, year): a frame with name, GDP and the position
+    of its source, holding only keys with a GDP value. Earlier sources win.
+    """
+    parts, sources = [], []
+    for position, path in enumerate(paths):
+        stats = SourceStats(path)
+        for chunk in read_gdp_source(path, chunk_size):
+            stats.rows += len(chunk)
+            unresolved = chunk["alpha_2"].isna() | (chunk["alpha_2"] == codes.UNKNOWN_ALPHA_2)
+            stats.unresolved.update(chunk.loc[unresolved, "code"].dropna())
+            missing = chunk["GDP"].isna() | chunk["year"].isna()
+            stats.missing_gdp += int((missing & ~unresolved).sum())
+            chunk = chunk[~unresolved & ~missing]
+            parts.append(chunk[["name", "GDP"]].assign(source=position)
+                         .set_axis(pd.MultiIndex.from_frame(chunk[["alpha_2", "year"]])))
+        sources.append(stats)
+
+    if not parts:
+        return pd.DataFrame(columns=["name", "GDP", "source"]), sources
+    table = pd.concat(parts)
+    duplicate = table.index.duplicated(keep="first")
+    for position, count in table.loc[duplicate, "source"].value_counts().items():
+        sources[position].shadowed = int(count)
+    table = table[~duplicate]
+    for position, count in table["source"].value_counts().items():
+        sources[position].keys = int(count)
+    return table, sources
+
+
+def merged_chunks(wdi_path: pathlib.Path, gdp: pd.DataFrame, stats: MergeStats,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Chunks of the joined panel with the importer's CSV headers (`OUTPUT_COLUMNS`), values still as text."""
+    for chunk in _read_csv_chunks(wdi_path, chunk_size, usecols=list(WDI_COLUMNS)):
+        chunk = chunk.rename(columns=WDI_COLUMNS)
+        chunk = chunk[chunk["alpha_2"].notna() & (chunk["alpha_2"] != codes.UNKNOWN_ALPHA_2)]
+        stats.wdi_rows += len(chunk)
+        keys = pd.MultiIndex.from_arrays([chunk["alpha_2"], pd.to_numeric(chunk["year"]).astype("Int64")])
+        joined = gdp.reindex(keys)
+        found = joined["GDP"].notna().to_numpy()
+
+        stats.matched += int(found.sum())
+        stats.unmatched.update(chunk.loc[~found, "alpha_2"])
+        stats.joined_countries.update(chunk.loc[found, "alpha_2"])
+        for position, count in joined.loc[found, "source"].astype(int).value_counts().items():
+            stats.sources[position].matched += count
+        names = chunk.loc[found, ["alpha_2", "name"]].assign(gdp_name=joined.loc[found, "name"].to_numpy())
+        differ = names[names["name"] != names["gdp_name"]].drop_duplicates()
+        stats.name_mismatches.update(differ.itertuples(index=False, name=None))
+
+        chunk = chunk[found].assign(GDP=joined.loc[found, "GDP"].to_numpy())
+        yield chunk[OUTPUT_COLUMNS]
+
+
+def to_records(chunk: pd.DataFrame, valid_country_codes: set, stats: MergeStats) -> list[dict]:
+    """
+    `DataEntry` row dicts of a merged chunk, cast as `importer.bulk_import_data` casts
+    CSV columns. Every column of the data table is NOT NULL, so rows with a missing
+    value are left out (and counted); filling them is the cleaning step's job.
+    """
+    known = chunk["alpha_2"].isin(valid_country_codes)
+    stats.unknown_country.update(chunk.loc[~known, "alpha_2"])
+    chunk = chunk[known]
+    # Key columns are taken as they are: "NA" (Namibia) would be cast to a missing value.
+    entries = pd.DataFrame({"country_code": chunk["alpha_2"], "year": chunk["year"].astype(int)})
+    for csv_header, attr in importer.HEADER_MAP.items():
+        if attr not in ("country_code", "year"):
+            entries[attr], _ = importer.cast_column(chunk[csv_header], importer.TYPE_MAP[attr])
+    complete = entries.notna().all(axis=1)
+    stats.incomplete.update(chunk.loc[~complete, "alpha_2"])
+    return importer.to_records(entries[complete])
+
+
+@tracing.traced("merge.merge")
+def merge(wdi_path: pathlib.Path = DEFAULT_WDI, gdp_paths: list[pathlib.Path] = DEFAULT_GDP,
+          output_path: pathlib.Path | None = None, import_rows: bool = True,
+          chunk_size: int = DEFAULT_CHUNK_SIZE, bind: sqlalchemy.Engine | None = None) -> MergeStats | None:
+    """
+    Joins `wdi_path` with the GDP sources on (alpha-2 code, year), keeping WDI rows
+    that have a GDP value. The rows are upserted into the data table when
+    `import_rows` and written to `output_path` if given. Returns None if the
+    import failed (and was rolled back).
+    """
+    with tracing.span("merge.build_gdp_table", sources=len(gdp_paths)):
+        gdp, sources = build_gdp_table(gdp_paths, chunk_size)
+    stats = MergeStats(sources)
+    logging.info(f"GDP table: {len(gdp)} (country, year) keys from {len(gdp_paths)} sources.")
+
+    valid_country_codes = importer.fetch_country_codes(bind) if import_rows else None
+    if import_rows and valid_country_codes is None:
+        return None
+
+    def chunks() -> Iterator[list[dict]]:
+        for position, chunk in enumerate(merged_chunks(wdi_path, gdp, stats, chunk_size)):
+            if output_path is not None:
+                chunk.to_csv(output_path, mode="w" if position == 0 else "a", header=position == 0, index=False,
+                             lineterminator="\n")
+            if import_rows:
+                yield to_records(chunk, valid_country_codes, stats)
+
+    if import_rows:
+        if importer.write_chunks(chunks(), bind) is None:
+            return None
+    else:
+        collections.deque(chunks(), maxlen=0)
+    return stats
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Join the cleaned WDI panel with the GDP sources and import the result.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--wdi", type=pathlib.Path, default=DEFAULT_WDI, help="Cleaned WDI panel (CSV).")
+    parser.add_argument("--gdp", type=pathlib.Path, nargs="+", default=DEFAULT_GDP,
+                        help="GDP sources in priority order.")
+    parser.add_argument("--output", type=pathlib.Path, help="Also write the merged panel as an importable CSV.")
+    parser.add_argument("--no-import", action="store_true", help="Don't write to the database.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per chunk read and written.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if not args.no_import:
+        database.create_schema()
+    stats = merge(args.wdi, args.gdp, args.output, not args.no_import, args.chunk_size)
+    if stats is not None:
+        print(stats.summary())
+
+
+if __name__ == "__main__":
+    main()
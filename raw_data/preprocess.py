@@ -1,47 +1,34 @@
-import pandas as pd
-from scipy.interpolate import PchipInterpolator
-from database.utils import code_based_get
+"""
+Cleans the raw WDI extract and fills its gaps into data/cleanWDI.csv.
+
+Runs are incremental: a manifest next to the output (cleanWDI.manifest.json)
+stores a hash of every country's raw rows, and only countries whose hash
+changed (or that were added or removed) are interpolated again and patched
+into the existing output. Countries are filled independently, so the patched
+file is identical to a full run. Without a manifest or output, or after the
+interpolation settings changed, everything is reprocessed.
+
+Usage:
+    python -m raw_data.preprocess
+    python -m raw_data.preprocess --full
+    python cli.py preprocess --workers 4
+"""
+import argparse
+import collections
+import csv
+import dataclasses
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+
+import tracing
+
+RAW_DIR = pathlib.Path(__file__).parent
+DEFAULT_INPUT = RAW_DIR / "ff9f9047-7a2a-4f98-a0a5-192c04cbc195_Data.csv"
+DEFAULT_OUTPUT = RAW_DIR / ".." / "data" / "cleanWDI.csv"
 
-
-def interpolate_series(s, years, method="pchip"):
-    notna = s.dropna()
-    if len(notna) < 2:
-        return s
-    x, y = years[notna.index], notna.values
-
-    if method == "pchip":
-        interp = PchipInterpolator(x, y, extrapolate=False)  # important!
-        s.loc[s.index] = interp(years)  # align to years
-        return s
-    elif method == "linear":
-        return s.interpolate(method="linear", limit_area="inside")
-    return s
-
-def clean_and_tag(df):
-    df.drop("Time Code", axis=1, inplace=True)
-    df.dropna(subset=["Country Code"], inplace=True)
-    df["Country Code"] = df["Country Code"].apply(lambda x: code_based_get(x).alpha_2)
-    df.drop(data[data["Country Code"] == "XXX"].index, inplace=True)
-    return df
-
-
-# === Load & clean ===
-with open("ff9f9047-7a2a-4f98-a0a5-192c04cbc195_Data.csv") as csvfile:
-    data = pd.read_csv(csvfile)
-
-data = clean_and_tag(data)
-
-d_binds: dict[str, type] = {"Country Name": str, "Country Code": str, "Time": int}
-for col in data.columns:
-    if d_binds.get(col, None) is None:
-        d_binds[col] = float
-
-data = data.astype(d_binds)
-
-# Make sure Time is sorted & usable as index for interpolation
-data.sort_values(["Country Code", "Time"], inplace=True)
-
-# === Apply interpolation per country & column ===
 # Smooth indicators (use PCHIP)
 smooth_cols = [
     "Fertility rate, total (births per woman) [SP.DYN.TFRT.IN]",
@@ -72,26 +59,195 @@ edge_fill_cols = [
     "Human capital index (HCI) (scale 0-1) [HD.HCI.OVRL]",
 ]
 
-def fill_group(g):
-    g = g.reset_index(drop=True)
-    years = g["Time"].values
+# Number of worker processes for the interpolation engine (1 = in-process).
+INTERPOLATION_WORKERS = 1
+
+
+def clean_and_tag(df):
+    from database.codes import resolve_alpha2
+
+    df.drop("Time Code", axis=1, inplace=True)
+    df.dropna(subset=["Country Code"], inplace=True)
+    df["Country Code"] = resolve_alpha2(df["Country Code"])
+    df.drop(df[df["Country Code"] == "XXX"].index, inplace=True)
+    return df
+
 
-    for col in smooth_cols:
-        if col in g:
-            g[col] = interpolate_series(g[col], years, method="pchip")
-            if col in edge_fill_cols:
-                g[col] = g[col].ffill().bfill()
+def load_raw(input_path: pathlib.Path = DEFAULT_INPUT):
+    """The raw extract cleaned, tagged with alpha-2 codes, cast and sorted by country and year."""
+    import pandas as pd
 
-    for col in jagged_cols:
-        if col in g:
-            g[col] = interpolate_series(g[col], years, method="linear")
-            # leave edges NA for jagged indicators
-    return g
+    # === Load & clean ===
+    with tracing.span("preprocess.read_csv"), open(input_path) as csvfile:
+        data = pd.read_csv(csvfile)
 
+    with tracing.span("preprocess.clean_and_tag"):
+        data = clean_and_tag(data)
 
-data = data.groupby("Country Code").apply(fill_group)
-data = data.astype({"Net migration [SM.POP.NETM]": int})
+    d_binds: dict[str, type] = {"Country Name": str, "Country Code": str, "Time": int}
+    for col in data.columns:
+        if d_binds.get(col, None) is None:
+            d_binds[col] = float
 
-# === Save cleaned dataset ===
-with open("../data/cleanWDI.csv", "w") as csvfile:
-    data.to_csv(csvfile, index=False, lineterminator="\n")
+    with tracing.span("preprocess.cast"):
+        data = data.astype(d_binds)
+
+    # Make sure Time is sorted & usable as index for interpolation
+    with tracing.span("preprocess.sort"):
+        data.sort_values(["Country Code", "Time"], inplace=True)
+    return data
+
+
+def interpolate(data, workers: int = INTERPOLATION_WORKERS):
+    """Fills the gaps of every country in `data`; countries are filled independently of each other."""
+    from raw_data.interpolation import fill_panel
+
+    # === Apply interpolation per country & column ===
+    methods = {col: "pchip" for col in smooth_cols}
+    methods.update({col: "linear" for col in jagged_cols})  # leave edges NA for jagged indicators
+    with tracing.span("preprocess.interpolate", rows=len(data), columns=len(methods)):
+        data = fill_panel(data, methods, edge_fill_cols, workers=workers)
+    return data.astype({"Net migration [SM.POP.NETM]": int})
+
+
+# --- Incremental runs ---
+
+# Bump when the cleaning or interpolation logic changes, so the next run reprocesses everything.
+MANIFEST_FORMAT = 1
+
+
+@dataclasses.dataclass
+class PreprocessReport:
+    """What a run did: `full` reprocessing, or only the `changed` countries."""
+    full: bool
+    reason: str = ""
+    changed: list[str] = dataclasses.field(default_factory=list)
+    removed: list[str] = dataclasses.field(default_factory=list)
+    skipped: list[str] = dataclasses.field(default_factory=list)
+
+    def summary(self) -> str:
+        if self.full:
+            return f"Full reprocessing of {len(self.changed)} countries ({self.reason})."
+        changed = ", ".join(self.changed) if self.changed else "none"
+        removed = f", removed: {', '.join(self.removed)}" if self.removed else ""
+        return f"Reprocessed {len(self.changed)} countries ({changed}){removed}; skipped {len(self.skipped)} unchanged."
+
+
+def default_manifest(output_path: pathlib.Path) -> pathlib.Path:
+    return output_path.with_name(output_path.stem + ".manifest.json")
+
+
+def settings_hash() -> str:
+    """Hash of everything besides the raw rows that shapes the output."""
+    payload = {"format": MANIFEST_FORMAT, "smooth": smooth_cols, "jagged": jagged_cols, "edge_fill": edge_fill_cols}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def country_hashes(data) -> dict[str, str]:
+    """Content hash of each country's block of cleaned raw rows (values, column names and order)."""
+    import pandas as pd
+
+    header = "\x1f".join(data.columns).encode()
+    hashes = {}
+    for code, block in data.groupby("Country Code", sort=True):
+        digest = hashlib.sha256(header)
+        digest.update(pd.util.hash_pandas_object(block, index=False).to_numpy().tobytes())
+        hashes[code] = digest.hexdigest()
+    return hashes
+
+
+def _write_atomic(path: pathlib.Path, text: str):
+    fd, staging = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "w", newline="") as f:
+        f.write(text)
+    os.replace(staging, path)
+
+
+def patch_csv(output_path: pathlib.Path, fresh, replaced: set[str]):
+    """
+    Rewrites the cleaned CSV with the rows of the `replaced` countries swapped for
+    `fresh` (which may hold fewer countries, for removed ones). Lines of the other
+    countries are copied verbatim, and countries stay in code order.
+    """
+    header, *fresh_lines = fresh.to_csv(index=False, lineterminator="\n").splitlines(keepends=True)
+    code_field = next(csv.reader([header])).index("Country Code")
+    groups = collections.defaultdict(list)
+    with open(output_path, newline="") as csvfile:
+        if next(csvfile) != header:
+            raise ValueError(f"The columns of {output_path} changed")
+        for line in csvfile:
+            code = next(csv.reader([line]))[code_field]
+            if code not in replaced:
+                groups[code].append(line)
+    for line in fresh_lines:
+        groups[next(csv.reader([line]))[code_field]].append(line)
+    _write_atomic(output_path, header + "".join("".join(groups[code]) for code in sorted(groups)))
+
+
+def preprocess(input_path: pathlib.Path = DEFAULT_INPUT, output_path: pathlib.Path = DEFAULT_OUTPUT,
+               workers: int = INTERPOLATION_WORKERS, incremental: bool = True,
+               manifest_path: pathlib.Path | None = None) -> PreprocessReport:
+    """
+    Writes the cleaned, gap-filled extract to `output_path`. Incrementally, only
+    countries whose raw rows changed since the manifest was written are
+    reprocessed and patched into the existing output; everything is reprocessed
+    without a usable manifest or output.
+    """
+    manifest_path = manifest_path or default_manifest(output_path)
+    data = load_raw(input_path)
+    with tracing.span("preprocess.hash"):
+        hashes = country_hashes(data)
+    settings = settings_hash()
+
+    reason = "requested"
+    if incremental:
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else None
+        if not output_path.exists():
+            reason = "no previous output"
+        elif manifest is None:
+            reason = "no manifest"
+        elif manifest["settings"] != settings:
+            reason = "settings changed"
+        else:
+            previous = manifest["countries"]
+            report = PreprocessReport(
+                full=False,
+                changed=[code for code, digest in hashes.items() if previous.get(code) != digest],
+                removed=sorted(set(previous) - set(hashes)),
+                skipped=[code for code, digest in hashes.items() if previous.get(code) == digest],
+            )
+            if report.changed or report.removed:
+                fresh = interpolate(data[data["Country Code"].isin(report.changed)], workers)
+                with tracing.span("preprocess.patch_csv", countries=len(report.changed) + len(report.removed)):
+                    patch_csv(output_path, fresh, set(report.changed) | set(report.removed))
+                _write_atomic(manifest_path, json.dumps({"settings": settings, "countries": hashes}, indent=1))
+            return report
+
+    data = interpolate(data, workers)
+    # === Save cleaned dataset ===
+    with tracing.span("preprocess.write_csv"), open(output_path, "w") as csvfile:
+        data.to_csv(csvfile, index=False, lineterminator="\n")
+    _write_atomic(manifest_path, json.dumps({"settings": settings, "countries": hashes}, indent=1))
+    return PreprocessReport(full=True, reason=reason, changed=list(hashes))
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Clean the raw WDI extract and fill its gaps.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--input", type=pathlib.Path, default=DEFAULT_INPUT, help="Raw WDI extract (CSV).")
+    parser.add_argument("--output", type=pathlib.Path, default=DEFAULT_OUTPUT, help="Cleaned CSV to write.")
+    parser.add_argument("--workers", type=int, default=INTERPOLATION_WORKERS,
+                        help="Worker processes for the interpolation engine (1 = in-process).")
+    parser.add_argument("--full", action="store_true",
+                        help="Reprocess every country instead of only those changed since the last run.")
+    parser.add_argument("--manifest", type=pathlib.Path,
+                        help="Per-country hash manifest (default: next to the output, *.manifest.json).")
+    args = parser.parse_args(argv)
+    report = preprocess(args.input, args.output, args.workers, incremental=not args.full, manifest_path=args.manifest)
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Statement counts of the loader profiles in `database.loading`."""
+import pytest
+import sqlalchemy
+from sqlalchemy import orm
+from sqlalchemy.pool import StaticPool
+
+import database
+from database import models
+from database.loading import count_statements, loader_query
+
+COUNTRIES = [("FI", "Finland", 64.0, 26.0), ("SE", "Sweden", 62.0, 15.0), ("NA", "Namibia", -22.0, 17.0)]
+YEARS = range(2010, 2016)
+
+
+@pytest.fixture
+def bind() -> sqlalchemy.Engine:
+    engine = sqlalchemy.create_engine("sqlite://", poolclass=StaticPool)
+    database.create_schema(engine)
+    with orm.Session(engine) as session:
+        for code, name, lat, lng in COUNTRIES:
+            session.add(models.Country(country_code=code, name=name, lat=lat, lng=lng))
+            session.add_all(models.DataEntry(
+                country_code=code, year=year, gdp=40000.0 + year, population=5_000_000, female=50.5, male=49.5,
+                life_expectancy=81.0, migration=10_000, infant_mortality=2.0, internet=90.0, hci=0.8,
+                enrollment=1.0, urban_pop=85.0,
+            ) for year in YEARS)
+        session.commit()
+    yield engine
+    engine.dispose()
+
+
+@pytest.mark.parametrize("profile, kwargs, expected", [
+    ("countries_only", {}, 1),
+    ("panel_only", {}, 1),
+    ("panel_with_country", {}, 1),
+    ("country_with_last_n_years", {"n": 2}, 2),
+])
+def test_profile_statement_counts(bind, profile, kwargs, expected):
+    with orm.Session(bind) as session, count_statements(bind) as statements:
+        rows = session.scalars(loader_query(profile, **kwargs)).unique().all()
+        # Touch what the profile promises to load; none of it may cost another statement.
+        if profile == "panel_with_country":
+            assert {entry.country.name for entry in rows} == {name for _, name, _, _ in COUNTRIES}
+        if profile == "country_with_last_n_years":
+            assert all(sorted(entry.year for entry in country.records) == [2014, 2015] for country in rows)
+    assert rows
+    assert statements[0] == expected
+
+
+def test_countries_only_raises_on_records(bind):
+    with orm.Session(bind) as session:
+        country = session.scalars(loader_query("countries_only")).first()
+        with pytest.raises(sqlalchemy.exc.InvalidRequestError):
+            country.records
+
+
+def test_panel_only_raises_on_country(bind):
+    with orm.Session(bind) as session:
+        entry = session.scalars(loader_query("panel_only")).first()
+        with pytest.raises(sqlalchemy.exc.InvalidRequestError):
+            entry.country
@@ -0,0 +1,59 @@
+"""The SQL feature views in `database.views` against the pandas feature store."""
+import numpy as np
+import pandas as pd
+import pytest
+import sqlalchemy
+from sqlalchemy import orm
+from sqlalchemy.pool import StaticPool
+
+import database
+from database import models
+from database.views import read_features
+from forecasting.features import compute_features
+
+FEATURES = [
+    "migration_lagged", "migration_lag2", "migration_growth", "migration_diff", "internet_growth",
+    "population_rollmean3", "population_rollstd3", "hci_rollstd2",
+]
+# FI has a gap (2012) and zero migration; SE starts at zero internet use; NA has too few rows for the windows.
+PANEL = {
+    "FI": {2009: 0, 2010: 0, 2011: 500, 2013: -200, 2014: 0, 2015: 300},
+    "SE": {2008: 1000, 2009: 2000, 2010: 0, 2011: 0, 2012: 1500},
+    "NA": {2014: 0, 2015: 10},
+}
+
+
+@pytest.fixture
+def bind() -> sqlalchemy.Engine:
+    engine = sqlalchemy.create_engine("sqlite://", poolclass=StaticPool)
+    database.create_schema(engine)
+    with orm.Session(engine) as session:
+        for code, migration in PANEL.items():
+            session.add(models.Country(country_code=code, name=code, lat=0.0, lng=0.0))
+            session.add_all(models.DataEntry(
+                country_code=code, year=year, gdp=30000.0 + year, population=5_000_000 + 1000 * (year % 7),
+                female=50.5, male=49.5, life_expectancy=81.0, migration=value, infant_mortality=2.0,
+                internet=0.0 if year < 2010 else 10.0 * (year - 2009), hci=0.8, enrollment=1.0, urban_pop=85.0,
+            ) for year, value in migration.items())
+        session.commit()
+    yield engine
+    engine.dispose()
+
+
+def test_read_features_matches_compute_features(bind):
+    sql = read_features(FEATURES, bind=bind)
+    with bind.connect() as connection:
+        panel = pd.read_sql_query(sqlalchemy.select(models.DataEntry.__table__), connection)
+    panel = panel.sort_values(["country_code", "year"], ignore_index=True)
+    expected = compute_features(panel, FEATURES)
+
+    assert list(sql["country_code"]) == list(panel["country_code"])
+    assert list(sql["year"]) == list(panel["year"])
+    for name in FEATURES:
+        assert not np.isinf(expected[name]).any(), name
+        np.testing.assert_allclose(sql[name], expected[name].to_numpy(), rtol=1e-9, equal_nan=True, err_msg=name)
+
+
+def test_growth_from_zero_is_missing(bind):
+    sql = read_features(["migration_growth"], countries=["FI"], years=(2011, 2011), bind=bind)
+    assert np.isnan(sql["migration_growth"]).all()
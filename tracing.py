@@ -0,0 +1,175 @@
+"""
+Lightweight stage-level tracing.
+
+Code marks its stages with `span("name")` blocks or the `@traced()` decorator.
+While tracing is disabled (the default) a span is a shared no-op context
+manager, so instrumented code pays one function call and one branch.
+
+When enabled, every span records wall time, CPU time (process-wide), the peak
+resident set size at exit and, with `memory=True`, the highest amount of
+tracemalloc-traced memory reached during the span. Spans nest per thread. `write` saves a
+JSON trace and a Chrome trace (open it in chrome://tracing or Perfetto).
+
+Enable from code with `tracing.enable("run.trace.json")`, or for any script by
+setting the environment variable:
+
+    DSA_TRACE=run.trace.json python -m raw_data.preprocess
+    DSA_TRACE_MEMORY=1 DSA_TRACE=run.trace.json python modelexp.py
+
+The trace is written when the process exits.
+"""
+import atexit
+import contextlib
+import functools
+import json
+import os
+import pathlib
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_state = {"enabled": False, "memory": False, "path": None, "origin": 0, "spans": []}
+_local = threading.local()
+_lock = threading.Lock()
+_NULL_SPAN = contextlib.nullcontext()
+
+
+def _peak_rss_bytes() -> int | None:
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def enabled() -> bool:
+    return _state["enabled"]
+
+
+def enable(path: str | pathlib.Path | None = None, memory: bool = False):
+    """
+    Starts recording spans. With a `path` the trace is written there at exit;
+    `memory` also tracks allocations with tracemalloc (slows Python code down noticeably).
+    """
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _state.update(enabled=True, memory=memory, origin=time.perf_counter_ns(), spans=[])
+    if path is not None and _state["path"] is None:
+        atexit.register(lambda: write(_state["path"]))
+    _state["path"] = pathlib.Path(path) if path is not None else _state["path"]
+
+
+def disable():
+    _state["enabled"] = False
+    if _state["memory"] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def spans() -> list[dict]:
+    """Recorded spans in completion order."""
+    with _lock:
+        return list(_state["spans"])
+
+
+class _Span:
+    __slots__ = ("name", "args", "start", "cpu_start", "alloc_peak")
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+        self.alloc_peak = 0
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        if _state["memory"]:
+            # tracemalloc keeps a single peak, so bank the enclosing span's peak before resetting it.
+            if stack:
+                stack[-1].alloc_peak = max(stack[-1].alloc_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        stack.append(self)
+        self.cpu_start = time.process_time_ns()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        cpu = time.process_time_ns() - self.cpu_start
+        stack = _local.stack
+        stack.pop()
+        record = {
+            "name": self.name,
+            "start_ms": (self.start - _state["origin"]) / 1e6,
+            "wall_ms": (end - self.start) / 1e6,
+            "cpu_ms": cpu / 1e6,
+            "peak_rss_bytes": _peak_rss_bytes(),
+            "depth": len(stack),
+            "thread": threading.get_ident(),
+            "pid": os.getpid(),
+        }
+        if _state["memory"]:
+            self.alloc_peak = max(self.alloc_peak, tracemalloc.get_traced_memory()[1])
+            record["alloc_peak_bytes"] = self.alloc_peak
+            if stack:
+                stack[-1].alloc_peak = max(stack[-1].alloc_peak, self.alloc_peak)
+        if self.args:
+            record["args"] = self.args
+        with _lock:
+            _state["spans"].append(record)
+        return False
+
+
+def span(name: str, **args):
+    """Context manager timing the enclosed block as `name`; `args` are stored with the span."""
+    if not _state["enabled"]:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def traced(name: str | None = None):
+    """Decorator wrapping every call of the function in a span (named after the function by default)."""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state["enabled"]:
+                return func(*args, **kwargs)
+            with _Span(span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def chrome_trace(records: list[dict]) -> dict:
+    """Converts span records to the Chrome trace event format (complete "X" events, microseconds)."""
+    events = []
+    for record in records:
+        args = {key: record[key] for key in ("cpu_ms", "peak_rss_bytes", "alloc_peak_bytes") if key in record}
+        args.update(record.get("args", {}))
+        events.append({
+            "name": record["name"], "ph": "X", "cat": record["name"].split(".")[0],
+            "ts": record["start_ms"] * 1000, "dur": record["wall_ms"] * 1000,
+            "pid": record["pid"], "tid": record["thread"], "args": args,
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def write(path: str | pathlib.Path):
+    """Writes the JSON trace to `path` and the Chrome trace next to it (`*.chrome.json`)."""
+    path = pathlib.Path(path)
+    records = sorted(spans(), key=lambda record: record["start_ms"])
+    path.write_text(json.dumps({"spans": records}, indent=1, default=str), encoding="utf-8")
+    path.with_name(path.name.removesuffix(".json") + ".chrome.json").write_text(
+        json.dumps(chrome_trace(records), default=str), encoding="utf-8")
+
+
+if os.environ.get("DSA_TRACE"):
+    enable(os.environ["DSA_TRACE"], memory=bool(os.environ.get("DSA_TRACE_MEMORY")))